@@ -0,0 +1,111 @@
+# benchmark_startup.py
+"""
+Startup benchmark for SEFS.
+
+Measures, each in a fresh interpreter so nothing is already imported:
+- import time of the main entry modules
+- latency of the first search (includes loading the embedding model),
+  the next search with a different query, and a repeated query
+
+Usage:
+    python benchmark_startup.py [--query TEXT] [--runs N] [--record FILE]
+
+--record appends the results as one JSON line, to track them over time.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+MODULES = [
+    "core.db_api",
+    "engine.semantic_engine",
+    "engine.search_engine",
+    "engine.event_engine",
+    "engine.visualization_engine",
+    "main",
+]
+
+
+_IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+_QUERY_SCRIPT = """
+import time, json
+started = time.perf_counter()
+from engine.search_engine import search_passages
+imported = time.perf_counter()
+search_passages({query!r})
+first = time.perf_counter()
+search_passages({query!r} + " notes")
+second = time.perf_counter()
+search_passages({query!r})
+repeated = time.perf_counter()
+print(json.dumps({{
+    "import": imported - started,
+    "first_query": first - imported,
+    "second_query": second - first,
+    "repeated_query": repeated - second,
+}}))
+"""
+
+
+def _run(script):
+    """
+    Run a script in a fresh interpreter; returns its last line of output.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def time_imports(runs):
+    """
+    Best-of-runs import time per module, in seconds.
+    """
+    return {
+        module: min(float(_run(_IMPORT_SCRIPT.format(module=module))) for _ in range(runs))
+        for module in MODULES
+    }
+
+
+def time_queries(query):
+    return json.loads(_run(_QUERY_SCRIPT.format(query=query)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure SEFS import and first-query latency.")
+    parser.add_argument("--query", default="project report")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--record", help="append results as a JSON line to this file")
+    args = parser.parse_args()
+
+    print("⏱ Import time (fresh interpreter, best of %d):" % args.runs)
+    imports = time_imports(args.runs)
+    for module, seconds in imports.items():
+        print(f"   {module:<30} {seconds * 1000:9.1f} ms")
+
+    print("⏱ Search latency (fresh interpreter):")
+    queries = time_queries(args.query)
+    for step, seconds in queries.items():
+        print(f"   {step:<30} {seconds * 1000:9.1f} ms")
+
+    if args.record:
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), "imports": imports, "search": queries}) + "\n")
+        print(f"📝 Recorded → {args.record}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import threading
+import numpy as np
+
+
+# Inverted lists hold unit-length vectors in half precision for the coarse
+# scan; exact float32 vectors are only fetched for the rerank stage.
+LIST_DTYPE = np.float16
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _spherical_kmeans(sample, nlist, iterations=10, seed=42):
+    """
+    k-means on unit vectors using cosine similarity. Returns unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=nlist)
+
+        # Re-seed empty lists from random points so every list stays usable
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+# ---------------- INVERTED LIST ----------------
+
+class _InvertedList:
+    """
+    Growable (file_ids, vectors) pair with O(1) swap-remove.
+    """
+
+    def __init__(self, dim, file_ids=None, vectors=None):
+        self.file_ids = list(file_ids) if file_ids is not None else []
+        count = len(self.file_ids)
+        self.vectors = np.zeros((max(8, count), dim), dtype=LIST_DTYPE)
+        if count:
+            self.vectors[:count] = vectors
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def view(self):
+        return self.vectors[:len(self.file_ids)]
+
+    def add(self, file_id, vector):
+        n = len(self.file_ids)
+        if n == len(self.vectors):
+            grown = np.zeros((2 * n, self.vectors.shape[1]), dtype=LIST_DTYPE)
+            grown[:n] = self.vectors
+            self.vectors = grown
+        self.vectors[n] = vector
+        self.file_ids.append(file_id)
+        return n
+
+    def remove(self, position):
+        """
+        Remove the entry at position; returns the file_id that moved into it.
+        """
+        last = len(self.file_ids) - 1
+        moved = None
+        if position != last:
+            self.vectors[position] = self.vectors[last]
+            self.file_ids[position] = self.file_ids[last]
+            moved = self.file_ids[position]
+        self.file_ids.pop()
+        return moved
+
+
+# ---------------- IVF INDEX ----------------
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over cosine similarity.
+
+    Vectors are bucketed by their nearest of `nlist` k-means centroids. A query
+    scans only the `nprobe` closest buckets (the recall/latency knob: higher
+    nprobe = better recall, slower search), keeps the best
+    top_k * rerank_factor candidates, and reranks them with exact float32
+    vectors from `fetch_vectors(file_ids)` when one is given.
+    """
+
+    def __init__(self, nprobe=8, rerank_factor=4):
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
+        self.centroids = None
+        self.lists = []
+        self._where = {}            # file_id -> (list index, position)
+        self._lock = threading.RLock()
+        self.updates_since_save = 0
+        self.fingerprint = None     # state of the stored vectors at the last save/load
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    # ---------------- BUILD ----------------
+
+    def train(self, reader, nlist=None, sample_size=None, chunk_rows=4096):
+        """
+        Fit centroids on a sample of the reader's vectors, then index all of them.
+        reader.iter_chunks(chunk_rows) must yield (file_ids, vectors).
+        """
+        total = len(reader)
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(total)))
+        nlist = min(nlist, total)
+        if sample_size is None:
+            sample_size = min(total, 64 * nlist)
+
+        rng = np.random.default_rng(42)
+        keep = sample_size / total
+        sample = []
+        for _, vectors in reader.iter_chunks(chunk_rows):
+            picked = vectors[rng.random(len(vectors)) < keep]
+            if len(picked):
+                sample.append(_normalize(picked))
+        sample = np.concatenate(sample) if sample else np.zeros((0, 0), dtype=np.float32)
+
+        if len(sample) < nlist:
+            # Sampling came up short on a tiny corpus; use everything
+            sample = np.concatenate([_normalize(v) for _, v in reader.iter_chunks(chunk_rows)])
+
+        centroids = _spherical_kmeans(sample, nlist)
+
+        with self._lock:
+            self.centroids = centroids
+            self.lists = [_InvertedList(centroids.shape[1]) for _ in range(nlist)]
+            self._where = {}
+
+            for file_ids, vectors in reader.iter_chunks(chunk_rows):
+                self._add_many(file_ids, _normalize(vectors))
+
+            self.updates_since_save = len(self._where)
+
+    def _add_many(self, file_ids, normalized):
+        assignment = np.argmax(normalized @ self.centroids.T, axis=1)
+        for file_id, vector, list_idx in zip(file_ids, normalized, assignment):
+            position = self.lists[list_idx].add(file_id, vector)
+            self._where[file_id] = (int(list_idx), position)
+
+    # ---------------- UPDATE ----------------
+
+    def add(self, file_id, vector):
+        """
+        Insert or replace one vector. No-op until the index is trained.
+        """
+        with self._lock:
+            if not self.is_trained:
+                return
+            self._remove(file_id)
+            self._add_many([file_id], _normalize(vector))
+            self.updates_since_save += 1
+
+    def remove(self, file_id):
+        with self._lock:
+            if self._remove(file_id):
+                self.updates_since_save += 1
+
+    def rekey(self, old_id, new_id):
+        """
+        Hand old_id's entry to new_id in place (a renamed file); whatever
+        new_id held before is dropped.
+        """
+        with self._lock:
+            if old_id == new_id:
+                return
+            changed = self._remove(new_id)
+
+            location = self._where.pop(old_id, None)
+            if location is not None:
+                list_idx, position = location
+                self.lists[list_idx].file_ids[position] = new_id
+                self._where[new_id] = location
+                changed = True
+
+            if changed:
+                self.updates_since_save += 1
+
+    def _remove(self, file_id):
+        location = self._where.pop(file_id, None)
+        if location is None:
+            return False
+
+        list_idx, position = location
+        moved = self.lists[list_idx].remove(position)
+        if moved is not None:
+            self._where[moved] = (list_idx, position)
+        return True
+
+    # ---------------- SEARCH ----------------
+
+    def search(self, query, top_k=5, nprobe=None, fetch_vectors=None):
+        """
+        Return [(file_id, similarity), ...] best first.
+        """
+        query = _normalize(query)[0]
+        nprobe = nprobe or self.nprobe
+
+        with self._lock:
+            if not self.is_trained or not self._where:
+                return []
+
+            centroid_scores = self.centroids @ query
+            nprobe = min(nprobe, len(self.lists))
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+            candidate_ids = []
+            blocks = []
+            for list_idx in probe:
+                inverted = self.lists[list_idx]
+                if len(inverted):
+                    candidate_ids.extend(inverted.file_ids)
+                    blocks.append(inverted.view().astype(np.float32) @ query)
+
+        if not blocks:
+            return []
+
+        scores = np.concatenate(blocks)
+
+        keep = min(len(scores), top_k * max(1, self.rerank_factor))
+        best = np.argpartition(-scores, keep - 1)[:keep]
+        candidates = [candidate_ids[i] for i in best]
+        candidate_scores = scores[best]
+
+        # Exact rerank against the stored float32 vectors
+        if fetch_vectors is not None:
+            exact = fetch_vectors(candidates)
+            found = [i for i, fid in enumerate(candidates) if fid in exact]
+            if found:
+                candidates = [candidates[i] for i in found]
+                candidate_scores = _normalize([exact[fid] for fid in candidates]) @ query
+
+        order = np.argsort(-candidate_scores, kind="stable")[:top_k]
+        return [(candidates[i], float(candidate_scores[i])) for i in order]
+
+    # ---------------- PERSISTENCE ----------------
+
+    def save(self, path, fingerprint=None):
+        """
+        Write the index to an .npz file (atomically replaced). fingerprint
+        identifies the stored vectors the index reflects; load() returns it.
+        """
+        with self._lock:
+            if not self.is_trained:
+                return
+
+            sizes = np.array([len(inverted) for inverted in self.lists], dtype=np.int64)
+            dim = self.centroids.shape[1]
+            vectors = (
+                np.concatenate([inverted.view() for inverted in self.lists])
+                if len(self._where) else np.zeros((0, dim), dtype=LIST_DTYPE)
+            )
+            file_ids = np.array(
+                [fid for inverted in self.lists for fid in inverted.file_ids], dtype="U64"
+            )
+
+            tmp_path = path + ".tmp.npz"
+            np.savez(
+                tmp_path,
+                centroids=self.centroids,
+                sizes=sizes,
+                vectors=vectors,
+                file_ids=file_ids,
+                fingerprint=np.array(fingerprint or "")
+            )
+            os.replace(tmp_path, path)
+            self.updates_since_save = 0
+            self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, path, nprobe=8, rerank_factor=4):
+        index = cls(nprobe=nprobe, rerank_factor=rerank_factor)
+
+        with np.load(path) as data:
+            index.centroids = data["centroids"]
+            sizes = data["sizes"]
+            vectors = data["vectors"]
+            file_ids = data["file_ids"].tolist()
+            # Files saved before fingerprints existed never match
+            if "fingerprint" in data.files:
+                index.fingerprint = data["fingerprint"].item() or None
+
+        dim = index.centroids.shape[1]
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+        for list_idx in range(len(sizes)):
+            start, end = offsets[list_idx], offsets[list_idx + 1]
+            inverted = _InvertedList(dim, file_ids[start:end], vectors[start:end])
+            index.lists.append(inverted)
+            for position, fid in enumerate(inverted.file_ids):
+                index._where[fid] = (list_idx, position)
+
+        return index
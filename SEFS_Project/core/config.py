@@ -1,3 +1,164 @@
 ROOT_FOLDER = r"C:\SEFS_Root"
 DATABASE_PATH = r"C:\Users\murar\SEFS_Project\sefs_metadata.db"
 SUPPORTED_TYPES = [".pdf", ".txt"]
+
+# Content fingerprint: "blake2b", "xxhash" (needs the xxhash package,
+# falls back to blake2b) or "md5" (the original format)
+HASH_ALGORITHM = "blake2b"
+HASH_CHUNK_SIZE = 1024 * 1024           # bytes read per hash update
+
+# SQLite connections (one per thread, WAL mode)
+DB_BUSY_TIMEOUT = 10.0                  # seconds to wait for another writer
+DB_CACHE_SIZE_KB = 65536                # page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024        # bytes of the database file memory-mapped
+BULK_BATCH_SIZE = 2000                  # rows per executemany/transaction in bulk writes
+
+# Sentence-transformers model
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# How embeddings are computed (see engine/semantic_engine.py):
+#   "sentence-transformers" - the PyTorch model above
+#   "onnx-int8"             - the same model exported to ONNX with int8 weights,
+#                             run by onnxruntime (exported to ONNX_MODEL_DIR on first use;
+#                             pip install -r requirements-onnx.txt)
+#   "hashing"               - deterministic feature hashing, for tests and benchmarks
+EMBEDDING_BACKEND = "sentence-transformers"
+ONNX_MODEL_DIR = DATABASE_PATH.rsplit(".", 1)[0] + "_onnx"
+HASHING_DIM = 384
+
+# Recorded with every stored vector and keys the content-hash embedding cache;
+# vectors from another model id are re-embedded
+EMBEDDING_MODEL_ID = {
+    "sentence-transformers": EMBEDDING_MODEL,
+    "onnx-int8": EMBEDDING_MODEL + ":onnx-int8",
+    "hashing": f"hashing-{HASHING_DIM}",
+}[EMBEDDING_BACKEND]
+
+# Storage dtype for embedding/centroid BLOBs: "float32" or "float16"
+EMBEDDING_DTYPE = "float32"
+
+# Where embeddings are kept for scanning:
+#   "memory" - loaded from SQLite into one in-process matrix
+#   "mmap"   - append-only memory-mapped segments next to the database
+VECTOR_BACKEND = "memory"
+VECTOR_STORE_DIR = DATABASE_PATH.rsplit(".", 1)[0] + "_vectors"
+VECTOR_SEGMENT_ROWS = 65536
+# Compact the mmap store in the background once this fraction is tombstoned
+VECTOR_COMPACTION_RATIO = 0.25
+
+# Approximate nearest-neighbour index (IVF) for search and cluster assignment
+ANN_INDEX_PATH = DATABASE_PATH.rsplit(".", 1)[0] + "_ann.npz"
+ANN_MIN_VECTORS = 10000     # below this a linear scan is fast enough
+ANN_NPROBE = 8              # lists scanned per query: higher = better recall, slower
+ANN_RERANK_FACTOR = 4       # exact rerank of top_k * factor candidates
+ANN_SAVE_EVERY = 1000       # persist after this many inserts/deletes
+
+# Load the embedding model in a background thread at startup instead of on
+# the first query
+MODEL_WARMUP = True
+
+# Embedding batcher: encode up to EMBED_BATCH_SIZE texts per model call,
+# waiting at most EMBED_MAX_WAIT seconds for a batch to fill
+EMBED_BATCH_SIZE = 32
+EMBED_MAX_WAIT = 0.05
+
+# Shared embedding service (python -m engine.embedding_service): processes
+# use it when it is running instead of loading their own copy of the model
+EMBED_SERVICE = True
+EMBED_SOCKET_PATH = DATABASE_PATH.rsplit(".", 1)[0] + "_embed.sock"
+EMBED_SERVICE_TIMEOUT = 60.0            # seconds to wait for one request
+
+# Watchdog event queue: events for one path within EVENT_DEBOUNCE seconds
+# coalesce into one run; the full rebuild waits REBUILD_DEBOUNCE after the last
+EVENT_DEBOUNCE = 0.5
+EVENT_WORKERS = 2
+REBUILD_DEBOUNCE = 2.0
+
+# Bootstrap pipeline: hashing threads, text-extraction processes
+# (None = one per CPU core) and the size of each queue between stages
+BOOTSTRAP_HASH_WORKERS = 4
+BOOTSTRAP_EXTRACT_WORKERS = None
+BOOTSTRAP_QUEUE_SIZE = 256
+
+# Long documents are embedded as overlapping windows of PASSAGE_WORDS words
+# (the model truncates longer input); the document vector is their mean.
+# Files with more windows keep PASSAGE_MAX_PER_FILE spread evenly over the text
+PASSAGE_WORDS = 150
+PASSAGE_OVERLAP = 30
+PASSAGE_MAX_PER_FILE = 256
+# Search scores the passages of the best top_k * factor documents
+PASSAGE_SEARCH_FACTOR = 4
+
+# Hybrid search: up to SEARCH_LEXICAL_CANDIDATES full-text (BM25) matches are
+# fused with vector ranks by reciprocal rank fusion, 1 / (SEARCH_RRF_K + rank)
+SEARCH_LEXICAL_CANDIDATES = 100
+SEARCH_RRF_K = 60
+SEARCH_NAME_WEIGHT = 5.0    # BM25 weight of a file-name match relative to body text
+
+# Search caches: normalized query text → embedding, and
+# (query, top_k, index version) → results; LRU with a time-to-live in seconds
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 3600
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE_TTL = 300
+
+# Live semantic graph (engine/graph_publisher.py): rebuilds publish JSON deltas
+# to GRAPH_OUTPUT_DIR at most once per GRAPH_MIN_INTERVAL seconds, with a full
+# snapshot every GRAPH_SNAPSHOT_EVERY deltas. The page there is served on
+# GRAPH_PORT and polls for new versions every GRAPH_POLL_SECONDS
+GRAPH_OUTPUT_DIR = "visualization/graph"
+GRAPH_THRESHOLD = 0.6
+GRAPH_MIN_INTERVAL = 10.0
+GRAPH_SNAPSHOT_EVERY = 50
+GRAPH_PORT = 8765
+GRAPH_POLL_SECONDS = 5
+GRAPH_OPEN_BROWSER = True   # open the page once at startup
+
+# Galaxy views (engine/visualization_engine.py): "html" inlines every node in
+# a plotly/pyvis page; "webgl" writes typed-array binaries read by a WebGL
+# page in GALAXY_OUTPUT_DIR (inside GRAPH_OUTPUT_DIR, so the graph server
+# serves it); "auto" switches to webgl at GALAXY_WEBGL_MIN_FILES files.
+# With more than GALAXY_LOD_POINTS files in view, the page draws one marker
+# per cluster instead of one per file
+GALAXY_MODE = "auto"
+GALAXY_WEBGL_MIN_FILES = 5000
+GALAXY_OUTPUT_DIR = GRAPH_OUTPUT_DIR + "/galaxy"
+GALAXY_LOD_POINTS = 20000
+
+# Folder sync (os_sync/folder_manager.py): only files outside their cluster's
+# folder move, MOVE_BATCH_SIZE per transaction; watchdog events caused by
+# these moves are ignored for up to MOVE_EVENT_GRACE seconds
+MOVE_BATCH_SIZE = 500
+MOVE_EVENT_GRACE = 10.0
+
+# Galaxy layout (engine/layout_engine.py): a 2-D projection fitted once and
+# stored in the database with every file's coordinates; new files are
+# projected without refitting. Refit on demand:
+#     python -m engine.layout_engine --refit
+#   "pca"           - IncrementalPCA over all embeddings
+#   "landmark-tsne" - t-SNE on LAYOUT_LANDMARKS sampled files; every file is
+#                     placed from its LAYOUT_LANDMARK_NEIGHBORS most similar
+#                     landmarks, weighted by exp(similarity / LAYOUT_TEMPERATURE)
+LAYOUT_METHOD = "pca"
+LAYOUT_LANDMARKS = 2000
+LAYOUT_LANDMARK_NEIGHBORS = 10
+LAYOUT_TEMPERATURE = 0.05
+
+# Per-file text artifact saved at ingest (naming, search snippets, tooltips):
+# the ARTIFACT_TOP_TERMS most frequent terms and a summary of the opening text
+ARTIFACT_TOP_TERMS = 50
+ARTIFACT_SUMMARY_CHARS = 280
+
+# PDF extraction: stop after PDF_MAX_PAGES pages or PDF_MAX_CHARS characters.
+# With PDF_TIMEOUT (seconds) set, a file that runs over is quarantined. The
+# file is opened and parsed in child processes that are killed at the
+# deadline, PDF_PAGES_PER_TASK pages per task in up to PDF_WORKERS processes.
+# Bootstrap workers parse in-process and are killed by their pool once a file
+# has run EXTRACT_KILL_GRACE seconds past PDF_TIMEOUT.
+# None extracts in-process without a time limit
+PDF_MAX_PAGES = 500
+PDF_MAX_CHARS = 1_000_000
+PDF_TIMEOUT = 60
+PDF_WORKERS = 2
+PDF_PAGES_PER_TASK = 50
+EXTRACT_KILL_GRACE = 5.0
@@ -1,13 +1,207 @@
+import atexit
 import sqlite3
-from core.config import DATABASE_PATH
+import threading
+from contextlib import contextmanager
+from core.config import (
+    DATABASE_PATH,
+    EMBEDDING_DTYPE,
+    EMBEDDING_MODEL,
+    DB_BUSY_TIMEOUT,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE
+)
+from core.vector_format import ensure_vector_columns, count_legacy_vectors, migrate_database
+
+
+# ---------------- CONNECTION POOL ----------------
+
+# One long-lived connection per thread; sqlite3 connections must not be
+# shared between threads that use them concurrently
+_local = threading.local()
+_connections = {}               # thread -> its connection
+_connections_lock = threading.Lock()
+
+# Bumped after every committed transaction(); lets caches tell whether
+# anything was written since they computed a result
+_write_version = [0]
+_write_version_lock = threading.Lock()
+
+
+def _open_connection():
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=DB_BUSY_TIMEOUT,
+        isolation_level=None,       # transactions are opened by transaction()
+        check_same_thread=False     # so connections of finished threads can be closed
+    )
+
+    # WAL lets readers run while one writer commits; NORMAL sync is durable
+    # across application crashes and only fsyncs at checkpoints
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+
+    with _connections_lock:
+        for thread in [t for t in _connections if not t.is_alive()]:
+            _connections.pop(thread).close()
+        _connections[threading.current_thread()] = conn
+
+    return conn
 
 
 def get_connection():
     """
-    Creates and returns a database connection.
-    Ensures database file exists.
+    Returns this thread's cached database connection (opened on first use).
+    Statements outside transaction() autocommit. Callers must not close it.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _open_connection()
+        _local.depth = 0
+        _local.on_commit = []
+        _local.on_rollback = []
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: every write inside the block is committed once at the end,
+    or rolled back if it raises. Nested blocks join the outermost one.
+
+    The outermost block takes the database write lock up front
+    (BEGIN IMMEDIATE), so a writer always acquires it before any in-process
+    lock (cluster state, vector store) and two writers cannot deadlock.
+    """
+    conn = get_connection()
+    outermost = _local.depth == 0
+
+    if outermost:
+        conn.execute("BEGIN IMMEDIATE")
+    _local.depth += 1
+
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if outermost:
+            undo, _local.on_rollback, _local.on_commit = _local.on_rollback, [], []
+            # Still holding the write lock, so no other writer sees the undone state
+            _run_callbacks(reversed(undo))
+            conn.rollback()
+        raise
+
+    _local.depth -= 1
+    if outermost:
+        conn.commit()
+        done, _local.on_commit, _local.on_rollback = _local.on_commit, [], []
+        _run_callbacks(done)
+        with _write_version_lock:
+            _write_version[0] += 1
+
+
+def _run_callbacks(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"[ERROR] Transaction callback failed: {e}")
+
+
+def on_commit(callback):
+    """
+    Run callback() once the enclosing outermost transaction() commits, and
+    never if it rolls back; runs it immediately outside a transaction.
+    For process-wide state that mirrors the database (the in-memory matrix,
+    the ANN index). Callbacks must not write to the database.
+    """
+    get_connection()
+    if _local.depth:
+        _local.on_commit.append(callback)
+    else:
+        callback()
+
+
+def on_rollback(callback):
+    """
+    Run callback() if the enclosing outermost transaction() rolls back, in
+    reverse order of registration and before the write lock is released.
+    Undoes changes made outside the database inside the transaction (the
+    memory-mapped vector store). Does nothing outside a transaction.
+    """
+    get_connection()
+    if _local.depth:
+        _local.on_rollback.append(callback)
+
+
+def write_version():
+    """
+    Number of transactions committed by this process. Read it before
+    computing a cached result: any write committed afterwards changes it.
+    """
+    with _write_version_lock:
+        return _write_version[0]
+
+
+def close_connections():
+    with _connections_lock:
+        for conn in _connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+
+
+atexit.register(close_connections)
+
+
+# ---------------- SCHEMA ----------------
+
+def ensure_file_columns(conn):
+    """
+    Add the stat signature columns (size, mtime_ns, inode) to FILES tables
+    created before content hashing could be skipped.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(FILES)")}
+    for column in ("size", "mtime_ns", "inode"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE FILES ADD COLUMN {column} INTEGER")
+
+
+def ensure_model_columns(conn):
+    """
+    Add the model_id column to vector tables created before embedding
+    backends existed. Their vectors all came from EMBEDDING_MODEL.
+    """
+    for table in ("SEMANTICS", "PASSAGES"):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "model_id" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN model_id TEXT")
+            conn.execute(f"UPDATE {table} SET model_id=? WHERE model_id IS NULL", (EMBEDDING_MODEL,))
+
+
+def ensure_text_index(conn):
+    """
+    Create the FTS5 full-text index over file names and extracted text.
+    Returns False when this SQLite build has no FTS5 (lexical search is
+    then skipped).
     """
-    return sqlite3.connect(DATABASE_PATH)
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS FILE_TEXT USING fts5(
+            file_id UNINDEXED,
+            name,
+            body,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """)
+        return True
+    except sqlite3.OperationalError as e:
+        print(f"⚠ Full-text index unavailable: {e}")
+        return False
 
 
 def initialize_database():
@@ -24,7 +218,10 @@ def initialize_database():
         content_hash TEXT,
         created_at REAL,
         last_modified REAL,
-        status TEXT
+        status TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        inode INTEGER
     )
     """)
 
@@ -36,7 +233,11 @@ def initialize_database():
         cluster_id TEXT,
         keywords TEXT,
         summary TEXT,
-        updated_at REAL
+        updated_at REAL,
+        dim INTEGER,
+        dtype TEXT,
+        row_id INTEGER,
+        model_id TEXT
     )
     """)
 
@@ -46,7 +247,9 @@ def initialize_database():
         cluster_id TEXT PRIMARY KEY,
         label TEXT,
         centroid BLOB,
-        created_at REAL
+        created_at REAL,
+        dim INTEGER,
+        dtype TEXT
     )
     """)
 
@@ -59,6 +262,112 @@ def initialize_database():
     )
     """)
 
+    # EMBEDDING CACHE (content hash + model → vector)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS EMBEDDING_CACHE (
+        content_hash TEXT,
+        model_id TEXT,
+        embedding BLOB,
+        dim INTEGER,
+        dtype TEXT,
+        created_at REAL,
+        PRIMARY KEY (content_hash, model_id)
+    )
+    """)
+
+    # PASSAGES (content hash → overlapping text windows and their vectors)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS PASSAGES (
+        content_hash TEXT,
+        passage_no INTEGER,
+        start_char INTEGER,
+        end_char INTEGER,
+        text TEXT,
+        embedding BLOB,
+        dim INTEGER,
+        dtype TEXT,
+        model_id TEXT,
+        PRIMARY KEY (content_hash, passage_no)
+    )
+    """)
+
+    # TEXT ARTIFACTS (content hash → top terms, summary, text length)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS TEXT_ARTIFACTS (
+        content_hash TEXT PRIMARY KEY,
+        terms TEXT,
+        summary TEXT,
+        text_length INTEGER,
+        created_at REAL
+    )
+    """)
+
+    # QUARANTINE (content that timed out during extraction; never retried)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS QUARANTINE (
+        content_hash TEXT PRIMARY KEY,
+        path TEXT,
+        reason TEXT,
+        quarantined_at REAL
+    )
+    """)
+
+    # LAYOUTS (fitted 2-D projection of the embeddings; the latest row is current)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS LAYOUTS (
+        layout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT,
+        model_id TEXT,
+        dim INTEGER,
+        params BLOB,
+        file_count INTEGER,
+        fitted_at REAL
+    )
+    """)
+
+    # FILE LAYOUT (per-file 2-D coordinates under a layout)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS FILE_LAYOUT (
+        file_id TEXT PRIMARY KEY,
+        layout_id INTEGER,
+        x REAL,
+        y REAL,
+        projected_at REAL
+    )
+    """)
+
+    # SEMANTIC FOLDERS (cluster folders folder sync has moved files into)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SEMANTIC_FOLDERS (
+        path TEXT PRIMARY KEY,
+        created_at REAL
+    )
+    """)
+
+    # VECTOR VERSION (one row, bumped by every transaction that changes stored vectors)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS VECTOR_VERSION (
+        version INTEGER
+    )
+    """)
+    cursor.execute("INSERT INTO VECTOR_VERSION (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM VECTOR_VERSION)")
+
+    # Lookups by cluster (folder sync, cluster deletion) and by content hash
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_cluster_map_cluster_id ON FILE_CLUSTER_MAP(cluster_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON FILES(content_hash)")
+
     conn.commit()
-    conn.close()
+
+    ensure_file_columns(conn)
+    ensure_model_columns(conn)
+    ensure_text_index(conn)
+
+    # Databases created before the typed vector format: add columns, convert pickles
+    ensure_vector_columns(conn)
+    legacy = count_legacy_vectors(conn)
+
+    if legacy:
+        print(f"🔁 Migrating {legacy} pickled vectors to {EMBEDDING_DTYPE}...")
+        migrate_database(DATABASE_PATH, dtype=EMBEDDING_DTYPE)
+
     print("Database initialized successfully.")
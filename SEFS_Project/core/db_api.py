@@ -1,14 +1,57 @@
+import os
+import json
+import atexit
 import hashlib
 import time
-import pickle
-import sqlite3
-from core.config import DATABASE_PATH
+import threading
+import numpy as np
+from core.config import (
+    DATABASE_PATH,
+    EMBEDDING_DTYPE,
+    EMBEDDING_MODEL_ID,
+    VECTOR_BACKEND,
+    VECTOR_STORE_DIR,
+    VECTOR_SEGMENT_ROWS,
+    VECTOR_COMPACTION_RATIO,
+    ANN_INDEX_PATH,
+    ANN_MIN_VECTORS,
+    ANN_NPROBE,
+    ANN_RERANK_FACTOR,
+    ANN_SAVE_EVERY,
+    BULK_BATCH_SIZE,
+    SEARCH_NAME_WEIGHT,
+    HASH_ALGORITHM,
+    HASH_CHUNK_SIZE
+)
+from core.database import (
+    get_connection,
+    transaction,
+    on_commit,
+    on_rollback,
+    write_version,
+    ensure_file_columns,
+    ensure_model_columns,
+    ensure_text_index
+)
+from core.ann_index import IVFIndex
+from core.embedding_store import EmbeddingStore, EmbeddingSnapshot
+from core.vector_store import VectorStore
+from core.vector_format import (
+    encode_vector,
+    decode_vector,
+    ensure_vector_columns,
+    count_legacy_vectors,
+    migrate_database
+)
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
-# ---------------- CONNECTION ----------------
 
-def get_connection():
-    return sqlite3.connect(DATABASE_PATH)
+# xxhash is optional; without it the fast path falls back to BLAKE2b
+_hash_algorithm = "blake2b" if HASH_ALGORITHM == "xxhash" and xxhash is None else HASH_ALGORITHM
 
 
 # ---------------- INITIALIZE DATABASE ----------------
@@ -27,7 +70,10 @@ def initialize_database():
         content_hash TEXT,
         created_at REAL,
         last_modified REAL,
-        status TEXT
+        status TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        inode INTEGER
     )
     """)
 
@@ -37,6 +83,10 @@ def initialize_database():
         file_id TEXT PRIMARY KEY,
         embedding BLOB,
         updated_at REAL,
+        dim INTEGER,
+        dtype TEXT,
+        row_id INTEGER,
+        model_id TEXT,
         FOREIGN KEY(file_id) REFERENCES FILES(file_id)
     )
     """)
@@ -47,7 +97,9 @@ def initialize_database():
         cluster_id TEXT PRIMARY KEY,
         label TEXT,
         centroid BLOB,
-        created_at REAL
+        created_at REAL,
+        dim INTEGER,
+        dtype TEXT
     )
     """)
 
@@ -62,154 +114,1379 @@ def initialize_database():
     )
     """)
 
+    # EMBEDDING CACHE (content hash + model → vector)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS EMBEDDING_CACHE (
+        content_hash TEXT,
+        model_id TEXT,
+        embedding BLOB,
+        dim INTEGER,
+        dtype TEXT,
+        created_at REAL,
+        PRIMARY KEY (content_hash, model_id)
+    )
+    """)
+
+    # PASSAGES (content hash → overlapping text windows and their vectors)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS PASSAGES (
+        content_hash TEXT,
+        passage_no INTEGER,
+        start_char INTEGER,
+        end_char INTEGER,
+        text TEXT,
+        embedding BLOB,
+        dim INTEGER,
+        dtype TEXT,
+        model_id TEXT,
+        PRIMARY KEY (content_hash, passage_no)
+    )
+    """)
+
+    # TEXT ARTIFACTS (content hash → top terms, summary, text length)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS TEXT_ARTIFACTS (
+        content_hash TEXT PRIMARY KEY,
+        terms TEXT,
+        summary TEXT,
+        text_length INTEGER,
+        created_at REAL
+    )
+    """)
+
+    # QUARANTINE (content that timed out during extraction; never retried)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS QUARANTINE (
+        content_hash TEXT PRIMARY KEY,
+        path TEXT,
+        reason TEXT,
+        quarantined_at REAL
+    )
+    """)
+
+    # LAYOUTS (fitted 2-D projection of the embeddings; the latest row is current)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS LAYOUTS (
+        layout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT,
+        model_id TEXT,
+        dim INTEGER,
+        params BLOB,
+        file_count INTEGER,
+        fitted_at REAL
+    )
+    """)
+
+    # FILE LAYOUT (per-file 2-D coordinates under a layout)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS FILE_LAYOUT (
+        file_id TEXT PRIMARY KEY,
+        layout_id INTEGER,
+        x REAL,
+        y REAL,
+        projected_at REAL
+    )
+    """)
+
+    # SEMANTIC FOLDERS (cluster folders folder sync has moved files into)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS SEMANTIC_FOLDERS (
+        path TEXT PRIMARY KEY,
+        created_at REAL
+    )
+    """)
+
+    # VECTOR VERSION (one row, bumped by every transaction that changes stored vectors)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS VECTOR_VERSION (
+        version INTEGER
+    )
+    """)
+    cur.execute("INSERT INTO VECTOR_VERSION (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM VECTOR_VERSION)")
+
+    # Lookups by cluster (folder sync, cluster deletion) and by content hash
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_file_cluster_map_cluster_id ON FILE_CLUSTER_MAP(cluster_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON FILES(content_hash)")
+
     conn.commit()
-    conn.close()
+
+    ensure_file_columns(conn)
+    ensure_model_columns(conn)
+    ensure_text_index(conn)
+    _text_index.clear()
+
+    # Databases created before the typed vector format: add columns, convert pickles
+    ensure_vector_columns(conn)
+    legacy = count_legacy_vectors(conn)
+
+    if legacy:
+        print(f"🔁 Migrating {legacy} pickled vectors to {EMBEDDING_DTYPE}...")
+        migrate_database(DATABASE_PATH, dtype=EMBEDDING_DTYPE)
+
     print("Database initialized successfully.")
 
 
+# ---------------- BATCHING ----------------
+
+def _batched(iterable, size):
+    """
+    Yield lists of at most size items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 # ---------------- FILE IDENTITY ----------------
 
 def generate_file_id(file_path):
     return hashlib.md5(file_path.encode()).hexdigest()
 
 
-def compute_file_hash(file_path):
+def _new_hasher(algorithm):
+    if algorithm == "xxhash":
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=20)
+    return hashlib.new(algorithm)
+
+
+def hash_algorithm_of(content_hash):
+    """
+    Algorithm a stored hash was made with; unprefixed hashes are MD5.
+    """
+    if ":" in content_hash:
+        return content_hash.split(":", 1)[0]
+    return "md5"
+
+
+def compute_file_hash(file_path, algorithm=None):
+    """
+    Stream the file through the configured digest in HASH_CHUNK_SIZE
+    blocks, so large files are never loaded whole. Non-MD5 hashes are
+    prefixed with the algorithm name ("blake2b:<hex>").
+    """
+    algorithm = algorithm or _hash_algorithm
+    if algorithm == "xxhash" and xxhash is None:
+        return None
+
+    hasher = _new_hasher(algorithm)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+    except OSError:
+        return None
+
+    digest = hasher.hexdigest()
+    return digest if algorithm == "md5" else f"{algorithm}:{digest}"
+
+
+def file_signature(file_path):
+    """
+    Cheap change detector: (size, mtime_ns, inode), or None if stat fails.
+    """
     try:
-        with open(file_path, "rb") as f:
-            return hashlib.md5(f.read()).hexdigest()
-    except:
+        st = os.stat(file_path)
+    except OSError:
         return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
 
 
 # ---------------- FILE REGISTRATION ----------------
 
-def register_or_update_file(file_path):
-    file_id = generate_file_id(file_path)
-    file_hash = compute_file_hash(file_path)
-    timestamp = time.time()
+def register_or_update_file(file_path, file_hash=None, signature=None):
+    return register_files_bulk([(file_path, file_hash, signature)])[0]
+
+
+def register_files_bulk(entries, batch_size=BULK_BATCH_SIZE):
+    """
+    Register many files, batch_size rows per executemany/transaction.
+    entries yields (file_path, file_hash, signature): signature is the
+    file_signature() taken before file_hash was computed, so the next
+    check_file can skip hashing. A None hash is computed from the file
+    (stat first). Existing rows are updated in place, keeping created_at.
+    Returns the file ids in input order.
+    """
+    file_ids = []
+
+    for batch in _batched(entries, batch_size):
+        timestamp = time.time()
+        rows = []
+
+        for file_path, file_hash, signature in batch:
+            if file_hash is None:
+                signature = file_signature(file_path)
+                file_hash = compute_file_hash(file_path)
+            size, mtime_ns, inode = signature if signature else (None, None, None)
+            file_id = generate_file_id(file_path)
 
+            rows.append((
+                file_id,
+                file_path,
+                file_path.split("\\")[-1],
+                file_path.split(".")[-1],
+                file_hash,
+                timestamp,
+                timestamp,
+                size,
+                mtime_ns,
+                inode
+            ))
+            file_ids.append(file_id)
+
+        with transaction() as conn:
+            conn.executemany("""
+            INSERT INTO FILES
+            (file_id, path, name, type, content_hash, created_at, last_modified, status, size, mtime_ns, inode)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'active', ?, ?, ?)
+            ON CONFLICT(file_id) DO UPDATE SET
+                path=excluded.path,
+                name=excluded.name,
+                type=excluded.type,
+                content_hash=excluded.content_hash,
+                last_modified=excluded.last_modified,
+                status=excluded.status,
+                size=excluded.size,
+                mtime_ns=excluded.mtime_ns,
+                inode=excluded.inode
+            """, rows)
+
+    return file_ids
+
+
+def get_file_fingerprint(file_path):
+    """
+    (content_hash, stat signature or None) of an indexed file, or None if
+    the file has no stored embedding from the current EMBEDDING_MODEL_ID.
+    """
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("""
-    INSERT OR REPLACE INTO FILES
-    (file_id, path, name, type, content_hash, created_at, last_modified, status)
-    VALUES (?, ?, ?, ?, ?, ?, ?, 'active')
-    """, (
-        file_id,
-        file_path,
-        file_path.split("\\")[-1],
-        file_path.split(".")[-1],
-        file_hash,
-        timestamp,
-        timestamp
-    ))
+    SELECT f.content_hash, f.size, f.mtime_ns, f.inode
+    FROM FILES f
+    JOIN SEMANTICS s ON f.file_id = s.file_id
+    WHERE f.file_id=? AND f.path=? AND s.model_id=?
+    """, (generate_file_id(file_path), file_path, EMBEDDING_MODEL_ID))
 
-    conn.commit()
-    conn.close()
-    return file_id
+    row = cur.fetchone()
+    if row is None or row[0] is None:
+        return None
+
+    content_hash, size, mtime_ns, inode = row
+    signature = (size, mtime_ns, inode) if size is not None else None
+    return content_hash, signature
+
+
+def update_file_fingerprint(file_path, content_hash, signature):
+    """
+    Record a verified hash and the stat signature observed before hashing.
+    """
+    size, mtime_ns, inode = signature if signature else (None, None, None)
+
+    with transaction() as conn:
+        conn.execute("""
+        UPDATE FILES SET content_hash=?, size=?, mtime_ns=?, inode=?
+        WHERE file_id=?
+        """, (content_hash, size, mtime_ns, inode, generate_file_id(file_path)))
 
 
 # ---------------- DELETE ----------------
 
 def delete_file_record(file_path):
     file_id = generate_file_id(file_path)
-    conn = get_connection()
-    cur = conn.cursor()
 
-    cur.execute("DELETE FROM FILES WHERE file_id=?", (file_id,))
-    cur.execute("DELETE FROM SEMANTICS WHERE file_id=?", (file_id,))
-    cur.execute("DELETE FROM FILE_CLUSTER_MAP WHERE file_id=?", (file_id,))
+    if VECTOR_BACKEND == "mmap":
+        _delete_file_record_mmap(file_id)
+        return
 
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+
+        cur.execute("DELETE FROM FILES WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM SEMANTICS WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM FILE_CLUSTER_MAP WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM FILE_LAYOUT WHERE file_id=?", (file_id,))
+        remove_file_text(file_id)
+        _bump_vector_version(conn)
+
+        on_commit(lambda: _forget_vectors([file_id]))
+
+
+def _delete_file_record_mmap(file_id):
+    store = get_vector_store()
+
+    with transaction() as conn, store.lock:
+        cur = conn.cursor()
+
+        cur.execute("SELECT row_id FROM SEMANTICS WHERE file_id=?", (file_id,))
+        row = cur.fetchone()
+
+        cur.execute("DELETE FROM FILES WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM SEMANTICS WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM FILE_CLUSTER_MAP WHERE file_id=?", (file_id,))
+        cur.execute("DELETE FROM FILE_LAYOUT WHERE file_id=?", (file_id,))
+        remove_file_text(file_id)
+
+        if row:
+            _delete_vector_rows(store, [row[0]])
+        _bump_vector_version(conn)
+
+        on_commit(lambda: _forget_vectors([file_id]))
+        # Compaction holds the database write lock before the store lock, like every writer
+        on_commit(lambda: store.compact_in_background(_remap_vector_rows, VECTOR_COMPACTION_RATIO, context=transaction))
+
+
+def _delete_vector_rows(store, row_ids):
+    """
+    Tombstone rows of the memory-mapped store inside a transaction; they
+    come back if it rolls back. The caller holds store.lock.
+    """
+    for row_id in row_ids:
+        store.delete(row_id)
+    on_rollback(lambda: [store.restore(row_id) for row_id in row_ids])
+
+
+def _append_vector_rows(store, file_ids, vectors):
+    """
+    Append to the memory-mapped store inside a transaction; the rows are
+    tombstoned again if it rolls back. The caller holds store.lock.
+    """
+    row_ids = store.append_many(file_ids, vectors)
+    on_rollback(lambda: [store.delete(row_id) for row_id in row_ids])
+    return row_ids
+
+
+def _bump_vector_version(conn):
+    """
+    Record a change to the stored vectors in the caller's transaction;
+    a saved ANN index is only reused while the version it saw is current.
+    """
+    conn.execute("UPDATE VECTOR_VERSION SET version = version + 1")
+
+
+def _forget_vectors(file_ids):
+    """
+    Drop files from the in-memory matrix and the ANN index (after commit).
+    The matrix is copied at most once for the whole list.
+    """
+    file_ids = list(file_ids)
+    embedding_store.remove_many(file_ids)
+    _update_ann_index_many([(file_id, None) for file_id in file_ids])
+
+
+# ---------------- MOVES ----------------
+
+def rename_file_records(moves):
+    """
+    Re-key indexed files after they were moved. File ids are derived from
+    paths, so every file_id-keyed row (and vector) moves to the id of the
+    new path; content-keyed data (passages, artifacts, embedding cache) is
+    untouched and nothing is re-embedded. moves yields (old_path, new_path).
+    Returns the number of files re-keyed.
+    """
+    pairs = [(generate_file_id(old_path), generate_file_id(new_path), new_path) for old_path, new_path in moves]
+    if not pairs:
+        return 0
+
+    # Only the mmap store has to re-append vectors under the new ids
+    vectors = get_embeddings_by_id([old_id for old_id, _, _ in pairs]) if VECTOR_BACKEND == "mmap" else {}
+    moved = []
+
+    with transaction() as conn:
+        for old_id, new_id, new_path in pairs:
+            # Anything still stored under the destination's id is stale
+            if VECTOR_BACKEND == "mmap":
+                store = get_vector_store()
+                with store.lock:
+                    row = conn.execute("SELECT row_id FROM SEMANTICS WHERE file_id=?", (new_id,)).fetchone()
+                    if row:
+                        _delete_vector_rows(store, [row[0]])
+            for table in ("FILES", "SEMANTICS", "FILE_CLUSTER_MAP", "FILE_LAYOUT"):
+                conn.execute(f"DELETE FROM {table} WHERE file_id=?", (new_id,))
+
+            cur = conn.execute(
+                "UPDATE FILES SET file_id=?, path=?, name=? WHERE file_id=?",
+                (new_id, new_path, new_path.split("\\")[-1], old_id)
+            )
+            if not cur.rowcount:
+                continue
+
+            for table in ("SEMANTICS", "FILE_CLUSTER_MAP", "FILE_LAYOUT"):
+                conn.execute(f"UPDATE {table} SET file_id=? WHERE file_id=?", (new_id, old_id))
+
+            if _text_index_ready():
+                conn.execute("DELETE FROM FILE_TEXT WHERE file_id=?", (new_id,))
+                conn.execute(
+                    "UPDATE FILE_TEXT SET file_id=?, name=? WHERE file_id=?",
+                    (new_id, os.path.basename(new_path.replace("\\", "/")), old_id)
+                )
+
+            moved.append((old_id, new_id, new_path))
+
+        # The mmap store keeps the file id next to each vector: re-append under the new id
+        if VECTOR_BACKEND == "mmap":
+            store = get_vector_store()
+            appended = [(old_id, new_id) for old_id, new_id, _ in moved if old_id in vectors]
+            if appended:
+                with store.lock:
+                    placeholders = ",".join("?" * len(appended))
+                    _delete_vector_rows(store, [
+                        row_id for (row_id,) in conn.execute(
+                            f"SELECT row_id FROM SEMANTICS WHERE file_id IN ({placeholders})",
+                            [new_id for _, new_id in appended]
+                        ).fetchall()
+                    ])
+
+                    row_ids = _append_vector_rows(
+                        store,
+                        [new_id for _, new_id in appended],
+                        [vectors[old_id] for old_id, _ in appended]
+                    )
+                    conn.executemany(
+                        "UPDATE SEMANTICS SET row_id=? WHERE file_id=?",
+                        [(row_id, new_id) for row_id, (_, new_id) in zip(row_ids, appended)]
+                    )
+
+        _bump_vector_version(conn)
+
+        def update_vectors():
+            # Rows are relabeled where they are; destination ids are dropped
+            # even when the source had no vector, as their rows were deleted
+            embedding_store.rekey_many(pairs)
+            _rekey_ann_index(pairs)
+
+        on_commit(update_vectors)
+
+    return len(moved)
 
 
 # ---------------- SEMANTIC STORAGE ----------------
 
 def store_semantic_data(file_id, embedding):
+    store_embeddings_bulk([(file_id, embedding)])
+
+
+def store_embeddings_bulk(items, batch_size=BULK_BATCH_SIZE):
+    """
+    Store many (file_id, embedding) pairs, batch_size rows per transaction.
+    Files should be registered first: unregistered ones are stored but not
+    visible through the in-memory matrix (get_all_embeddings) until reload.
+    """
+    for batch in _batched(items, batch_size):
+        # A file repeated within the batch keeps its last embedding
+        batch = list(dict(batch).items())
+
+        if VECTOR_BACKEND == "mmap":
+            with transaction():
+                _store_embeddings_mmap(batch)
+                on_commit(lambda batch=batch: _update_ann_index_many(batch))
+            continue
+
+        rows = []
+        for file_id, embedding in batch:
+            blob, dim, dtype = encode_vector(embedding, EMBEDDING_DTYPE)
+            rows.append((file_id, blob, dim, dtype, EMBEDDING_MODEL_ID, time.time()))
+
+        with transaction() as conn:
+            conn.executemany("""
+            INSERT OR REPLACE INTO SEMANTICS
+            (file_id, embedding, dim, dtype, model_id, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            _bump_vector_version(conn)
+
+            paths = get_file_paths([file_id for file_id, _ in batch])
+            registered = [(file_id, embedding) for file_id, embedding in batch if file_id in paths]
+
+            # Outer transactions (save_file_embedding, bootstrap batches) may
+            # still roll back: the matrix and index only follow what commits
+            def update_vectors(registered=registered, paths=paths):
+                embedding_store.upsert_many(
+                    (file_id, paths[file_id], embedding) for file_id, embedding in registered
+                )
+                _update_ann_index_many(registered)
+
+            on_commit(update_vectors)
+
+
+def _store_embeddings_mmap(batch, batch_size=900):
+    """
+    Append the vectors to the memory-mapped store and record their row
+    indexes; the SEMANTICS blobs stay NULL. Replaced vectors are tombstoned.
+    """
+    store = get_vector_store()
+    file_ids = [file_id for file_id, _ in batch]
+
+    with transaction() as conn, store.lock:
+        replaced = []
+        for start in range(0, len(file_ids), batch_size):
+            chunk = file_ids[start:start + batch_size]
+            placeholders = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                f"SELECT row_id FROM SEMANTICS WHERE file_id IN ({placeholders})", chunk
+            )
+            replaced.extend(row_id for (row_id,) in cur.fetchall())
+        _delete_vector_rows(store, replaced)
+
+        row_ids = _append_vector_rows(store, file_ids, [embedding for _, embedding in batch])
+
+        timestamp = time.time()
+        conn.executemany("""
+        INSERT OR REPLACE INTO SEMANTICS
+        (file_id, embedding, dim, dtype, model_id, row_id, updated_at)
+        VALUES (?, NULL, ?, ?, ?, ?, ?)
+        """, [
+            (file_id, store.dim, EMBEDDING_DTYPE, EMBEDDING_MODEL_ID, row_id, timestamp)
+            for file_id, row_id in zip(file_ids, row_ids)
+        ])
+        _bump_vector_version(conn)
+
+
+def save_file_embedding(path, embedding, cluster_id, file_hash=None, signature=None):
+    with transaction():
+        file_id = register_or_update_file(path, file_hash, signature)
+        store_semantic_data(file_id, embedding)
+        assign_file_to_cluster(file_id, cluster_id)
+
+
+# ---------------- EMBEDDING CACHE ----------------
+
+def get_cached_embedding(content_hash, model_id):
+    """
+    Vector previously computed for identical content with the same model, or None.
+    """
+    if content_hash is None:
+        return None
+
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("""
-    INSERT OR REPLACE INTO SEMANTICS
-    (file_id, embedding, updated_at)
-    VALUES (?, ?, ?)
-    """, (
-        file_id,
-        pickle.dumps(embedding),
-        time.time()
-    ))
+    SELECT embedding, dim, dtype FROM EMBEDDING_CACHE
+    WHERE content_hash=? AND model_id=?
+    """, (content_hash, model_id))
+
+    row = cur.fetchone()
+    return decode_vector(*row) if row else None
+
+
+def cache_embedding(content_hash, model_id, embedding):
+    if content_hash is None or embedding is None:
+        return
+
+    blob, dim, dtype = encode_vector(embedding, EMBEDDING_DTYPE)
+
+    with transaction() as conn:
+        conn.execute("""
+        INSERT OR REPLACE INTO EMBEDDING_CACHE
+        (content_hash, model_id, embedding, dim, dtype, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (content_hash, model_id, blob, dim, dtype, time.time()))
+
+
+# ---------------- PASSAGES ----------------
+
+def store_passages_bulk(items, batch_size=BULK_BATCH_SIZE):
+    """
+    Save (content_hash, passages) pairs, passages being
+    [(start_char, end_char, text, vector)] from semantic_engine.embed_document.
+    Replaces any passages stored for that content before.
+    """
+    for batch in _batched(items, batch_size):
+        batch = [(content_hash, passages) for content_hash, passages in batch if content_hash is not None]
+        if not batch:
+            continue
+
+        rows = []
+        for content_hash, passages in batch:
+            for passage_no, (start, end, text, vector) in enumerate(passages):
+                blob, dim, dtype = encode_vector(vector, EMBEDDING_DTYPE)
+                rows.append((content_hash, passage_no, start, end, text, blob, dim, dtype, EMBEDDING_MODEL_ID))
+
+        with transaction() as conn:
+            conn.executemany(
+                "DELETE FROM PASSAGES WHERE content_hash=?",
+                [(content_hash,) for content_hash, _ in batch]
+            )
+            conn.executemany("""
+            INSERT INTO PASSAGES
+            (content_hash, passage_no, start_char, end_char, text, embedding, dim, dtype, model_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+
+def get_file_passages(file_ids, batch_size=900):
+    """
+    Passages of the files' current content.
+    Returns {file_id: (texts, vectors)} with vectors as one float32 matrix.
+    """
+    file_ids = list(file_ids)
+    cur = get_connection().cursor()
+    found = {}
+
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"""
+        SELECT f.file_id, p.text, p.embedding, p.dim, p.dtype
+        FROM FILES f
+        JOIN PASSAGES p ON p.content_hash = f.content_hash
+        WHERE f.file_id IN ({placeholders}) AND p.model_id=?
+        ORDER BY f.file_id, p.passage_no
+        """, batch + [EMBEDDING_MODEL_ID])
+
+        for file_id, text, blob, dim, dtype in cur.fetchall():
+            texts, vectors = found.setdefault(file_id, ([], []))
+            texts.append(text)
+            vectors.append(decode_vector(blob, dim, dtype))
+
+    return {
+        file_id: (texts, np.asarray(vectors, dtype=np.float32))
+        for file_id, (texts, vectors) in found.items()
+    }
+
+
+# ---------------- TEXT ARTIFACTS ----------------
+
+def store_text_artifact(content_hash, artifact):
+    store_text_artifacts_bulk([(content_hash, artifact)])
+
+
+def store_text_artifacts_bulk(items, batch_size=BULK_BATCH_SIZE):
+    """
+    Save (content_hash, artifact) pairs from content_engine.build_text_artifact.
+    """
+    now = time.time()
+
+    for batch in _batched(items, batch_size):
+        rows = [
+            (content_hash, json.dumps(artifact["terms"]), artifact["summary"], artifact["length"], now)
+            for content_hash, artifact in batch
+            if content_hash is not None and artifact is not None
+        ]
+        if not rows:
+            continue
+
+        with transaction() as conn:
+            conn.executemany("""
+            INSERT OR REPLACE INTO TEXT_ARTIFACTS
+            (content_hash, terms, summary, text_length, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """, rows)
+
+
+def _decode_artifact(terms, summary, text_length):
+    return {"terms": json.loads(terms), "summary": summary, "length": text_length}
+
+
+def get_text_artifacts(file_ids, batch_size=900):
+    """
+    Artifacts of the files' current content. Returns {file_id: artifact};
+    files indexed before artifacts existed are missing.
+    """
+    file_ids = list(file_ids)
+    cur = get_connection().cursor()
+    artifacts = {}
+
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"""
+        SELECT f.file_id, a.terms, a.summary, a.text_length
+        FROM FILES f
+        JOIN TEXT_ARTIFACTS a ON a.content_hash = f.content_hash
+        WHERE f.file_id IN ({placeholders})
+        """, batch)
+        for file_id, *row in cur.fetchall():
+            artifacts[file_id] = _decode_artifact(*row)
+
+    return artifacts
 
-    conn.commit()
-    conn.close()
 
+def get_cluster_artifacts(cluster_id, limit=None):
+    """
+    Artifacts of up to `limit` files in a cluster.
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+    SELECT a.terms, a.summary, a.text_length
+    FROM FILE_CLUSTER_MAP m
+    JOIN FILES f ON f.file_id = m.file_id
+    JOIN TEXT_ARTIFACTS a ON a.content_hash = f.content_hash
+    WHERE m.cluster_id=?
+    LIMIT ?
+    """, (cluster_id, -1 if limit is None else limit))
+
+    return [_decode_artifact(*row) for row in cur.fetchall()]
+
+
+def get_files_missing_text():
+    """
+    Indexed files whose content has no artifact yet or that are missing from
+    the full-text index. Returns [(file_id, path, content_hash, needs_artifact,
+    needs_text_index)].
+    """
+    indexed = "f.file_id IN (SELECT file_id FROM FILE_TEXT)" if _text_index_ready() else "1"
+
+    cur = get_connection().cursor()
+    cur.execute(f"""
+    SELECT f.file_id, f.path, f.content_hash,
+           a.content_hash IS NULL, NOT ({indexed})
+    FROM FILES f
+    LEFT JOIN TEXT_ARTIFACTS a ON a.content_hash = f.content_hash
+    WHERE f.content_hash IS NOT NULL
+    AND (a.content_hash IS NULL OR NOT ({indexed}))
+    AND f.content_hash NOT IN (SELECT content_hash FROM QUARANTINE)
+    """)
+    return [(file_id, path, content_hash, bool(a), bool(t)) for file_id, path, content_hash, a, t in cur.fetchall()]
+
+
+# ---------------- FULL-TEXT INDEX ----------------
+
+_text_index = {}
+
+
+def _text_index_ready():
+    """
+    True when the FILE_TEXT FTS5 table exists (checked once per process).
+    """
+    if "ready" not in _text_index:
+        cur = get_connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE name='FILE_TEXT'"
+        )
+        _text_index["ready"] = cur.fetchone() is not None
+    return _text_index["ready"]
+
+
+def index_file_texts(entries):
+    """
+    (Re)index (file_id, path, content_hash, text) entries in FILE_TEXT.
+    With text None (embedding reused from identical content), the body is
+    copied from another file with the same content. Returns the file ids
+    left unindexed because no such file was indexed.
+    """
+    unindexed = []
+    if not _text_index_ready():
+        return unindexed
+
+    with transaction() as conn:
+        for file_id, path, content_hash, text in entries:
+            name = os.path.basename(path.replace("\\", "/"))
+            conn.execute("DELETE FROM FILE_TEXT WHERE file_id=?", (file_id,))
+
+            if text is None:
+                row = conn.execute("""
+                SELECT body FROM FILE_TEXT WHERE file_id IN
+                (SELECT file_id FROM FILES WHERE content_hash=? AND file_id != ?)
+                LIMIT 1
+                """, (content_hash, file_id)).fetchone()
+                if row is None:
+                    unindexed.append(file_id)
+                    continue
+                text = row[0]
+
+            conn.execute(
+                "INSERT INTO FILE_TEXT (file_id, name, body) VALUES (?, ?, ?)",
+                (file_id, name, text)
+            )
+
+    return unindexed
+
+
+def remove_file_text(file_id):
+    if not _text_index_ready():
+        return
+
+    with transaction() as conn:
+        conn.execute("DELETE FROM FILE_TEXT WHERE file_id=?", (file_id,))
+
+
+def _match_expression(query):
+    """
+    FTS5 query matching any of the query's words, each quoted so that
+    punctuation and FTS operators in user input are taken literally.
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def lexical_search(query, limit=100):
+    """
+    Best BM25 matches for the query's words in file names and text.
+    Returns [(file_id, bm25)] best first (lower bm25 = better match).
+    """
+    expression = _match_expression(query)
+    if not expression or not _text_index_ready():
+        return []
+
+    cur = get_connection().cursor()
+    cur.execute("""
+    SELECT file_id, bm25(FILE_TEXT, 0.0, ?, 1.0) AS score
+    FROM FILE_TEXT
+    WHERE FILE_TEXT MATCH ?
+    ORDER BY score
+    LIMIT ?
+    """, (SEARCH_NAME_WEIGHT, expression, limit))
+    return cur.fetchall()
+
+
+# ---------------- QUARANTINE ----------------
+
+def quarantine_file(content_hash, path, reason):
+    """
+    Stop processing this content; it is skipped until the row is removed.
+    """
+    if content_hash is None:
+        return
+
+    with transaction() as conn:
+        conn.execute("""
+        INSERT OR REPLACE INTO QUARANTINE (content_hash, path, reason, quarantined_at)
+        VALUES (?, ?, ?, ?)
+        """, (content_hash, path, reason, time.time()))
+
+
+def is_quarantined(content_hash):
+    if content_hash is None:
+        return False
+
+    cur = get_connection().cursor()
+    cur.execute("SELECT 1 FROM QUARANTINE WHERE content_hash=?", (content_hash,))
+    return cur.fetchone() is not None
+
+
+# ---------------- SEMANTIC FOLDERS ----------------
+
+def add_semantic_folders(paths):
+    """
+    Record folders that folder sync moved files into. Only recorded
+    folders are removed again once they are empty.
+    """
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO SEMANTIC_FOLDERS (path, created_at) VALUES (?, ?)",
+            [(path, now) for path in paths]
+        )
+
+
+def get_semantic_folders(paths, batch_size=900):
+    """
+    The subset of paths that are recorded semantic folders.
+    """
+    paths = list(paths)
+    cur = get_connection().cursor()
+    found = set()
+
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"SELECT path FROM SEMANTIC_FOLDERS WHERE path IN ({placeholders})", batch)
+        found.update(path for (path,) in cur.fetchall())
+
+    return found
 
-def save_file_embedding(path, embedding, cluster_id):
-    file_id = register_or_update_file(path)
-    store_semantic_data(file_id, embedding)
-    assign_file_to_cluster(file_id, cluster_id)
+
+def remove_semantic_folders(paths):
+    with transaction() as conn:
+        conn.executemany("DELETE FROM SEMANTIC_FOLDERS WHERE path=?", [(path,) for path in paths])
+
+
+# ---------------- LAYOUT ----------------
+
+def get_current_layout():
+    """
+    The latest fitted layout as (layout_id, method, model_id, dim, params),
+    or None.
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+    SELECT layout_id, method, model_id, dim, params
+    FROM LAYOUTS ORDER BY layout_id DESC LIMIT 1
+    """)
+    return cur.fetchone()
+
+
+def store_layout(method, dim, params, file_count):
+    """
+    Record a newly fitted layout (params is an opaque blob). Returns its id.
+    """
+    with transaction() as conn:
+        cur = conn.execute("""
+        INSERT INTO LAYOUTS (method, model_id, dim, params, file_count, fitted_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (method, EMBEDDING_MODEL_ID, dim, params, file_count, time.time()))
+        return cur.lastrowid
+
+
+def store_layout_coordinates(layout_id, items, batch_size=BULK_BATCH_SIZE):
+    """
+    Save (file_id, x, y) coordinates under a layout.
+    """
+    for batch in _batched(items, batch_size):
+        now = time.time()
+        with transaction() as conn:
+            conn.executemany("""
+            INSERT OR REPLACE INTO FILE_LAYOUT (file_id, layout_id, x, y, projected_at)
+            VALUES (?, ?, ?, ?, ?)
+            """, [(file_id, layout_id, float(x), float(y), now) for file_id, x, y in batch])
+
+
+def delete_layouts_except(layout_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM LAYOUTS WHERE layout_id<>?", (layout_id,))
+        conn.execute("DELETE FROM FILE_LAYOUT WHERE layout_id<>?", (layout_id,))
+
+
+def get_files_needing_layout(layout_id):
+    """
+    Files embedded by the current model with no coordinates under this
+    layout, or whose embedding changed after they were projected.
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+    SELECT s.file_id
+    FROM SEMANTICS s
+    LEFT JOIN FILE_LAYOUT l ON l.file_id = s.file_id AND l.layout_id = ?
+    WHERE s.model_id = ?
+    AND (l.file_id IS NULL OR s.updated_at > l.projected_at)
+    """, (layout_id, EMBEDDING_MODEL_ID))
+    return [row[0] for row in cur.fetchall()]
+
+
+def get_layout_coordinates(layout_id, file_ids=None, batch_size=900):
+    """
+    Returns {file_id: (x, y)} under a layout, for the given files or all.
+    """
+    cur = get_connection().cursor()
+
+    if file_ids is None:
+        cur.execute("SELECT file_id, x, y FROM FILE_LAYOUT WHERE layout_id=?", (layout_id,))
+        return {file_id: (x, y) for file_id, x, y in cur.fetchall()}
+
+    file_ids = list(file_ids)
+    coordinates = {}
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"""
+        SELECT file_id, x, y FROM FILE_LAYOUT
+        WHERE layout_id=? AND file_id IN ({placeholders})
+        """, [layout_id] + batch)
+        for file_id, x, y in cur.fetchall():
+            coordinates[file_id] = (x, y)
+
+    return coordinates
 
 
 # ---------------- CLUSTER MANAGEMENT ----------------
 
 def store_cluster(cluster_id, label, centroid=None):
+    store_clusters_bulk([(cluster_id, label, centroid)])
+
+
+def store_clusters_bulk(items):
+    """
+    Create clusters from (cluster_id, label, centroid or None) if needed.
+    A given centroid replaces the stored one; label and created_at are kept
+    from the first insert.
+    """
+    timestamp = time.time()
+    rows = []
+
+    for cluster_id, label, centroid in items:
+        blob, dim, dtype = (None, None, None)
+        if centroid is not None:
+            blob, dim, dtype = encode_vector(centroid, EMBEDDING_DTYPE)
+        rows.append((cluster_id, label, blob, dim, dtype, timestamp))
+
+    with transaction() as conn:
+        conn.executemany("""
+        INSERT INTO CLUSTERS
+        (cluster_id, label, centroid, dim, dtype, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(cluster_id) DO UPDATE SET
+            centroid = COALESCE(excluded.centroid, centroid),
+            dim = COALESCE(excluded.dim, dim),
+            dtype = COALESCE(excluded.dtype, dtype)
+        """, rows)
+
+
+def assign_file_to_cluster(file_id, cluster_id, confidence=1.0):
+    assign_clusters_bulk([(file_id, cluster_id)], confidence)
+
+
+def assign_clusters_bulk(assignments, confidence=1.0, batch_size=BULK_BATCH_SIZE):
+    """
+    Map many files to clusters; assignments yields (file_id, cluster_id).
+    """
+    for batch in _batched(assignments, batch_size):
+        with transaction() as conn:
+            conn.executemany("""
+            INSERT OR REPLACE INTO FILE_CLUSTER_MAP
+            (file_id, cluster_id, confidence)
+            VALUES (?, ?, ?)
+            """, [(file_id, cluster_id, confidence) for file_id, cluster_id in batch])
+
+
+def delete_cluster(cluster_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM CLUSTERS WHERE cluster_id=?", (cluster_id,))
+        conn.execute("DELETE FROM FILE_CLUSTER_MAP WHERE cluster_id=?", (cluster_id,))
+
+
+def get_cluster_centroids():
+    """
+    Returns [(cluster_id, label, centroid or None, member_count), ...].
+    """
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("""
-    INSERT OR IGNORE INTO CLUSTERS
-    (cluster_id, label, centroid, created_at)
-    VALUES (?, ?, ?, ?)
-    """, (
-        cluster_id,
-        label,
-        pickle.dumps(centroid) if centroid is not None else None,
-        time.time()
-    ))
+    SELECT c.cluster_id, c.label, c.centroid, c.dim, c.dtype, COUNT(m.file_id)
+    FROM CLUSTERS c
+    LEFT JOIN FILE_CLUSTER_MAP m ON c.cluster_id = m.cluster_id
+    GROUP BY c.cluster_id
+    """)
 
-    conn.commit()
-    conn.close()
+    rows = cur.fetchall()
 
+    return [
+        (cluster_id, label, decode_vector(blob, dim, dtype), size)
+        for cluster_id, label, blob, dim, dtype, size in rows
+    ]
 
-def assign_file_to_cluster(file_id, cluster_id, confidence=1.0):
+
+def get_file_cluster(file_id):
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute("""
-    INSERT OR REPLACE INTO FILE_CLUSTER_MAP
-    (file_id, cluster_id, confidence)
-    VALUES (?, ?, ?)
-    """, (file_id, cluster_id, confidence))
+    cur.execute("SELECT cluster_id FROM FILE_CLUSTER_MAP WHERE file_id=?", (file_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
 
-    conn.commit()
-    conn.close()
+
+def get_file_clusters(file_ids, batch_size=900):
+    """
+    Returns {file_id: cluster_id} for the given files that are clustered.
+    """
+    file_ids = list(file_ids)
+    cur = get_connection().cursor()
+    mapping = {}
+
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"SELECT file_id, cluster_id FROM FILE_CLUSTER_MAP WHERE file_id IN ({placeholders})", batch)
+        mapping.update(cur.fetchall())
+
+    return mapping
+
+
+def get_file_cluster_map():
+    """
+    Returns {file_id: cluster_id} for every clustered file.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("SELECT file_id, cluster_id FROM FILE_CLUSTER_MAP")
+    mapping = dict(cur.fetchall())
+    return mapping
 
 
 # ---------------- FETCH EMBEDDINGS ----------------
 
-def get_all_embeddings():
+def _load_embedding_rows():
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("""
-    SELECT f.file_id, f.path, s.embedding
+    SELECT f.file_id, f.path, s.embedding, s.dim, s.dtype
     FROM FILES f
     JOIN SEMANTICS s ON f.file_id = s.file_id
-    """)
+    WHERE s.model_id=?
+    """, (EMBEDDING_MODEL_ID,))
 
     rows = cur.fetchall()
-    conn.close()
 
-    results = []
-    for file_id, path, emb_blob in rows:
-        results.append({
+    for file_id, path, emb_blob, dim, dtype in rows:
+        embedding = decode_vector(emb_blob, dim, dtype)
+        if embedding is None:
+            # Missing or still-pickled row (run `python -m core.vector_format`)
+            continue
+        yield file_id, path, embedding
+
+
+# Process-wide embedding matrix, loaded once and kept in sync by the writers above
+embedding_store = EmbeddingStore(_load_embedding_rows)
+
+
+# Memory-mapped store, opened on first use when VECTOR_BACKEND = "mmap"
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    global _vector_store
+
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = VectorStore(
+                VECTOR_STORE_DIR,
+                dtype=EMBEDDING_DTYPE,
+                segment_rows=VECTOR_SEGMENT_ROWS
+            )
+        return _vector_store
+
+
+def _remap_vector_rows(pairs):
+    """
+    Compaction callback: rewrite SEMANTICS.row_id from old to new positions.
+    Pairs arrive in ascending old order and new <= old, so no update can
+    collide with a row that has not been renumbered yet.
+    """
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE SEMANTICS SET row_id=? WHERE row_id=?",
+            [(new, old) for old, new in pairs]
+        )
+
+
+def open_embedding_reader():
+    """
+    Frozen view over every stored embedding for the configured backend.
+    reader.iter_chunks(chunk_rows) yields (file_ids, vectors) blocks, so
+    callers can scan corpora that do not fit in memory.
+    """
+    if VECTOR_BACKEND == "mmap":
+        return get_vector_store().reader()
+    return embedding_store.snapshot()
+
+
+def count_embeddings():
+    """
+    Number of stored embeddings, without opening a reader.
+    """
+    if VECTOR_BACKEND == "mmap":
+        return get_vector_store().live_count()
+    return len(embedding_store)
+
+
+def get_embeddings_by_id(file_ids, batch_size=900):
+    """
+    Exact stored vectors for the given file ids. Returns {file_id: vector}.
+    """
+    file_ids = list(file_ids)
+    conn = get_connection()
+    cur = conn.cursor()
+    vectors = {}
+
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"""
+        SELECT file_id, embedding, dim, dtype, row_id
+        FROM SEMANTICS WHERE file_id IN ({placeholders})
+        """, batch)
+
+        for file_id, blob, dim, dtype, row_id in cur.fetchall():
+            if blob is not None:
+                vectors[file_id] = decode_vector(blob, dim, dtype)
+            elif row_id is not None:
+                store = get_vector_store()
+                with store.lock:
+                    vector = store.get(row_id)
+                if vector is not None:
+                    vectors[file_id] = vector
+
+    return vectors
+
+
+# ---------------- ANN INDEX ----------------
+
+_ann_index = None
+_ann_lock = threading.RLock()
+
+
+def _vector_fingerprint(total=None):
+    """
+    Identifies the stored vectors: model, persisted write version and count.
+    """
+    row = get_connection().execute("SELECT version FROM VECTOR_VERSION").fetchone()
+    if total is None:
+        total = count_embeddings()
+    return f"{EMBEDDING_MODEL_ID}:{row[0] if row else 0}:{total}"
+
+
+def _save_ann_index(index):
+    index.save(ANN_INDEX_PATH, _vector_fingerprint())
+
+
+def get_ann_index():
+    """
+    Return the IVF index over all embeddings, loading it from ANN_INDEX_PATH
+    or training it on first use. Returns None while the corpus is smaller
+    than ANN_MIN_VECTORS (callers fall back to a linear scan).
+    """
+    global _ann_index
+
+    with _ann_lock:
+        total = count_embeddings()
+        fingerprint = _vector_fingerprint(total)
+
+        if _ann_index is None and os.path.exists(ANN_INDEX_PATH):
+            index = IVFIndex.load(ANN_INDEX_PATH, ANN_NPROBE, ANN_RERANK_FACTOR)
+            # Saved before later vector changes (say, by a run that did not
+            # shut down cleanly): rebuild instead
+            if index.fingerprint == fingerprint:
+                _ann_index = index
+
+        # Retrain once the corpus has outgrown the centroid count (~sqrt(n) lists)
+        if _ann_index is not None and total > 4 * len(_ann_index.lists) ** 2:
+            _ann_index = None
+
+        if _ann_index is None:
+            if total < ANN_MIN_VECTORS:
+                return None
+
+            print(f"🧭 Building ANN index over {total} embeddings...")
+            index = IVFIndex(ANN_NPROBE, ANN_RERANK_FACTOR)
+            index.train(open_embedding_reader())
+            index.save(ANN_INDEX_PATH, fingerprint)
+            _ann_index = index
+
+        return _ann_index
+
+
+def _update_ann_index(file_id, embedding=None):
+    """
+    Keep the ANN index in step with an insert (embedding given) or delete.
+    """
+    with _ann_lock:
+        index = get_ann_index()
+        if index is None:
+            return
+
+        if embedding is None:
+            index.remove(file_id)
+        else:
+            index.add(file_id, embedding)
+
+        if index.updates_since_save >= ANN_SAVE_EVERY:
+            _save_ann_index(index)
+
+
+def _update_ann_index_many(items):
+    """
+    Bulk form of _update_ann_index for (file_id, embedding) pairs;
+    embedding None deletes.
+    """
+    with _ann_lock:
+        index = get_ann_index()
+        if index is None:
+            return
+
+        for file_id, embedding in items:
+            if embedding is None:
+                index.remove(file_id)
+            else:
+                index.add(file_id, embedding)
+
+        if index.updates_since_save >= ANN_SAVE_EVERY:
+            _save_ann_index(index)
+
+
+def _rekey_ann_index(pairs):
+    """
+    Move ANN entries from old to new file ids for (old_id, new_id, _) pairs.
+    """
+    with _ann_lock:
+        index = get_ann_index()
+        if index is None:
+            return
+
+        for old_id, new_id, _ in pairs:
+            index.rekey(old_id, new_id)
+
+        if index.updates_since_save >= ANN_SAVE_EVERY:
+            _save_ann_index(index)
+
+
+def save_ann_index():
+    with _ann_lock:
+        if _ann_index is not None and _ann_index.updates_since_save:
+            _save_ann_index(_ann_index)
+
+
+atexit.register(save_ann_index)
+
+
+def _read_vector_store_snapshot():
+    """
+    Copy every live, registered vector of the memory-mapped store into an
+    EmbeddingSnapshot. Costs a full scan and the whole matrix in memory.
+    """
+    file_ids, blocks = [], []
+    for chunk_ids, vectors in get_vector_store().reader().iter_chunks():
+        file_ids.extend(chunk_ids)
+        blocks.append(vectors)
+
+    paths = get_file_paths(file_ids)
+    keep = [i for i, file_id in enumerate(file_ids) if file_id in paths]
+
+    if blocks:
+        matrix = np.concatenate(blocks)[keep]
+    else:
+        matrix = np.zeros((0, get_vector_store().dim or 0), dtype=np.float32)
+    matrix.flags.writeable = False
+
+    file_ids = [file_ids[i] for i in keep]
+    return EmbeddingSnapshot(write_version(), matrix, file_ids, [paths[file_id] for file_id in file_ids])
+
+
+def get_embedding_snapshot():
+    """
+    Return the current EmbeddingSnapshot (matrix, file_ids, paths, version).
+    Callers must treat the arrays as read-only. With the mmap backend it is
+    read from the vector store on every call; prefer open_embedding_reader.
+    """
+    if VECTOR_BACKEND == "mmap":
+        return _read_vector_store_snapshot()
+    return embedding_store.snapshot()
+
+
+def get_all_embeddings():
+    snapshot = get_embedding_snapshot()
+
+    return [
+        {
             "file_id": file_id,
             "path": path,
-            "embedding": pickle.loads(emb_blob)
-        })
+            "embedding": embedding
+        }
+        for file_id, path, embedding in zip(snapshot.file_ids, snapshot.paths, snapshot.matrix)
+    ]
 
-    return results
+
+def get_index_version():
+    """
+    Changes whenever embeddings, passages or the text index may have changed.
+    """
+    return write_version()
 
 
 # ---------------- QUERY HELPERS ----------------
@@ -226,18 +1503,33 @@ def get_files_in_cluster(cluster_id):
     """, (cluster_id,))
 
     results = [row[0] for row in cur.fetchall()]
-    conn.close()
     return results
 
 
+def get_file_paths(file_ids, batch_size=900):
+    """
+    Look up paths for many file ids at once. Returns {file_id: path}.
+    """
+    file_ids = list(file_ids)
+    conn = get_connection()
+    cur = conn.cursor()
+    paths = {}
+
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start:start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        cur.execute(f"SELECT file_id, path FROM FILES WHERE file_id IN ({placeholders})", batch)
+        paths.update(cur.fetchall())
+
+    return paths
+
+
 def get_file_path_by_id(file_id):
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("SELECT path FROM FILES WHERE file_id=?", (file_id,))
     row = cur.fetchone()
-    conn.close()
-
     return row[0] if row else None
 
 
@@ -248,4 +1540,3 @@ def debug_show_files():
     cur = conn.cursor()
     cur.execute("SELECT file_id, name, path, status FROM FILES")
     print("FILES table:", cur.fetchall())
-    conn.close()
@@ -0,0 +1,273 @@
+import threading
+import numpy as np
+
+
+# ---------------- SNAPSHOT ----------------
+
+class EmbeddingSnapshot:
+    """
+    Immutable view of the embedding store at one version.
+    matrix[i] is the float32 embedding of file_ids[i] / paths[i].
+    """
+
+    __slots__ = ("version", "matrix", "file_ids", "paths")
+
+    def __init__(self, version, matrix, file_ids, paths):
+        self.version = version
+        self.matrix = matrix
+        self.file_ids = file_ids
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def iter_chunks(self, chunk_rows=4096, start_chunk=0):
+        """
+        Yield (file_ids, vectors) blocks, same contract as VectorStoreReader.
+        """
+        for start in range(start_chunk * chunk_rows, len(self.file_ids), chunk_rows):
+            end = start + chunk_rows
+            yield list(self.file_ids[start:end]), self.matrix[start:end]
+
+
+# ---------------- STORE ----------------
+
+class EmbeddingStore:
+    """
+    Process-wide in-memory copy of every stored embedding.
+
+    The matrix is loaded from the database once, on first use, and then kept
+    current by upsert()/remove(). Rows a reader can see are never written
+    again: appends go into spare capacity past the end of the current
+    snapshot, and updates/deletes copy the buffers first, once per batch,
+    when the current snapshot has been handed out. A reader holding a
+    snapshot never sees a torn state. Each change bumps the version.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._snapshot = EmbeddingSnapshot(0, np.zeros((0, 0), dtype=np.float32), (), ())
+        self._version = 0
+        self._reset_buffers(0, 0)
+
+    def _reset_buffers(self, capacity, dim):
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._file_ids = np.empty(capacity, dtype=object)
+        self._paths = np.empty(capacity, dtype=object)
+        self._count = 0
+        self._row_of = {}
+        self._shared = False        # a reader may hold a snapshot of these buffers
+
+    def _publish(self):
+        n = self._count
+        matrix = self._matrix[:n]
+        matrix.flags.writeable = False
+        self._version += 1
+        self._snapshot = EmbeddingSnapshot(
+            self._version,
+            matrix,
+            self._file_ids[:n],
+            self._paths[:n]
+        )
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+
+            rows = list(self._loader())
+            dim = len(rows[0][2]) if rows else 0
+            self._reset_buffers(len(rows), dim)
+
+            for i, (file_id, path, embedding) in enumerate(rows):
+                self._matrix[i] = embedding
+                self._file_ids[i] = file_id
+                self._paths[i] = path
+                self._row_of[file_id] = i
+
+            self._count = len(rows)
+            self._loaded = True
+            self._publish()
+
+    def _copy_buffers(self, capacity, dim):
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        file_ids = np.empty(capacity, dtype=object)
+        paths = np.empty(capacity, dtype=object)
+
+        n = self._count
+        if n:
+            matrix[:n] = self._matrix[:n]
+            file_ids[:n] = self._file_ids[:n]
+            paths[:n] = self._paths[:n]
+
+        self._matrix, self._file_ids, self._paths = matrix, file_ids, paths
+        self._shared = False
+
+    def _make_private(self):
+        """
+        Copy the buffers before rows below the snapshot end are overwritten,
+        unless no reader has been given the current snapshot.
+        """
+        if self._shared:
+            self._copy_buffers(self._matrix.shape[0], self._matrix.shape[1])
+
+    # ---------------- READ ----------------
+
+    def snapshot(self):
+        """
+        Return the current EmbeddingSnapshot, loading the store if needed.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            self._shared = True
+            return self._snapshot
+
+    @property
+    def version(self):
+        self._ensure_loaded()
+        return self._snapshot.version
+
+    def __len__(self):
+        """
+        Number of stored embeddings; unlike snapshot(), hands out no buffers.
+        """
+        self._ensure_loaded()
+        return self._count
+
+    # ---------------- WRITE ----------------
+
+    def upsert(self, file_id, path, embedding):
+        """
+        Insert or replace the embedding for file_id.
+        """
+        self.upsert_many([(file_id, path, embedding)])
+
+    def upsert_many(self, rows):
+        """
+        Insert or replace (file_id, path, embedding) rows, publishing one version.
+        """
+        rows = [
+            (file_id, path, np.asarray(embedding, dtype=np.float32).ravel())
+            for file_id, path, embedding in rows
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            if not self._loaded:
+                # Nothing cached yet; the first reader will load the new rows from the DB
+                return
+
+            dim = self._matrix.shape[1] if self._count else len(rows[0][2])
+            for _, _, embedding in rows:
+                if len(embedding) != dim:
+                    raise ValueError(
+                        f"Embedding dimension {len(embedding)} does not match store dimension {dim}"
+                    )
+
+            added = len({file_id for file_id, _, _ in rows if file_id not in self._row_of})
+            needed = self._count + added
+
+            if needed > self._matrix.shape[0] or self._matrix.shape[1] != dim:
+                self._copy_buffers(max(16, 2 * needed), dim)
+            elif added < len(rows):
+                # Replacing published rows: copy so old snapshots stay intact
+                self._make_private()
+
+            for file_id, path, embedding in rows:
+                row = self._row_of.get(file_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._row_of[file_id] = row
+
+                self._matrix[row] = embedding
+                self._file_ids[row] = file_id
+                self._paths[row] = path
+
+            self._publish()
+
+    def remove(self, file_id):
+        """
+        Drop file_id from the store (no-op if it is not present).
+        """
+        self.remove_many([file_id])
+
+    def remove_many(self, file_ids):
+        """
+        Drop every listed file id that is present, publishing one version.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+
+            rows = [self._row_of.pop(file_id) for file_id in set(file_ids) if file_id in self._row_of]
+            if not rows:
+                return
+
+            self._make_private()
+            self._drop_rows(rows)
+            self._publish()
+
+    def rekey_many(self, moves):
+        """
+        Give the row of each old_id to new_id/new_path in place, for
+        (old_id, new_id, new_path) moves applied in order. A row new_id held
+        before is dropped. Vectors are not copied unless rows are dropped.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+
+            relabeled, dropped = [], []
+            for old_id, new_id, new_path in moves:
+                if new_id != old_id and new_id in self._row_of:
+                    dropped.append(self._row_of.pop(new_id))
+                row = self._row_of.pop(old_id, None)
+                if row is not None:
+                    self._row_of[new_id] = row
+                    relabeled.append((row, new_id, new_path))
+
+            if not relabeled and not dropped:
+                return
+
+            if dropped:
+                self._make_private()
+            elif self._shared:
+                # Only ids and paths change: the matrix can stay shared
+                self._file_ids = self._file_ids.copy()
+                self._paths = self._paths.copy()
+
+            for row, new_id, new_path in relabeled:
+                self._file_ids[row] = new_id
+                self._paths[row] = new_path
+
+            self._drop_rows(dropped)
+            self._publish()
+
+    def _drop_rows(self, rows):
+        """
+        Fill each hole with the last row, highest holes first so a hole is
+        never filled with a row that is itself being removed. The rows must
+        already be gone from _row_of and the buffers private.
+        """
+        for row in sorted(rows, reverse=True):
+            last = self._count - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._file_ids[row] = self._file_ids[last]
+                self._paths[row] = self._paths[last]
+                self._row_of[self._file_ids[row]] = row
+            self._count -= 1
+
+    def invalidate(self):
+        """
+        Forget the cached matrix; the next read reloads it from the database.
+        Use after another process has written to the DB.
+        """
+        with self._lock:
+            self._loaded = False
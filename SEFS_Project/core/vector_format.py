@@ -0,0 +1,143 @@
+import sys
+import pickle
+import sqlite3
+import numpy as np
+
+
+# Stored dtype name -> explicit little-endian numpy dtype
+VECTOR_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+# (table, blob column) pairs that hold vectors; dim/dtype live next to them
+VECTOR_COLUMNS = [
+    ("SEMANTICS", "embedding"),
+    ("CLUSTERS", "centroid"),
+]
+
+
+# ---------------- ENCODE / DECODE ----------------
+
+def encode_vector(vector, dtype="float32"):
+    """
+    Serialize a vector as raw little-endian bytes.
+    Returns (blob, dim, dtype) ready to be written to a BLOB/INTEGER/TEXT triple.
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+
+    array = np.asarray(vector).ravel().astype(VECTOR_DTYPES[dtype], copy=False)
+    return array.tobytes(), int(array.shape[0]), dtype
+
+
+def decode_vector(blob, dim, dtype):
+    """
+    Zero-copy view of a stored vector (read-only, backed by the blob).
+    Returns None for missing vectors and legacy pickled rows (dtype NULL).
+    """
+    if blob is None or dtype is None:
+        return None
+
+    array = np.frombuffer(blob, dtype=VECTOR_DTYPES[dtype])
+    if dim is not None and array.shape[0] != dim:
+        raise ValueError(f"Stored vector has {array.shape[0]} values, schema says {dim}")
+    return array
+
+
+# ---------------- SCHEMA ----------------
+
+def ensure_vector_columns(conn):
+    """
+    Add dim/dtype columns to tables created before the typed format existed.
+    """
+    cur = conn.cursor()
+
+    for table, _ in VECTOR_COLUMNS:
+        columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+        if "dim" not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN dim INTEGER")
+        if "dtype" not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN dtype TEXT")
+        if table == "SEMANTICS" and "row_id" not in columns:
+            # Row index into the memory-mapped vector store (core/vector_store.py)
+            cur.execute("ALTER TABLE SEMANTICS ADD COLUMN row_id INTEGER")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_semantics_row_id ON SEMANTICS(row_id)")
+    conn.commit()
+
+
+def count_legacy_vectors(conn):
+    """
+    Number of vector rows still stored as pickles.
+    """
+    cur = conn.cursor()
+    total = 0
+
+    for table, column in VECTOR_COLUMNS:
+        cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} IS NOT NULL AND dtype IS NULL")
+        total += cur.fetchone()[0]
+
+    return total
+
+
+# ---------------- MIGRATION ----------------
+
+def migrate_database(db_path, dtype="float32", batch_size=1000):
+    """
+    Convert every pickled embedding/centroid in db_path to the typed format.
+    Rows are rewritten in batches inside one transaction; safe to re-run.
+    Only use on databases SEFS itself wrote: legacy rows are unpickled.
+    Returns the number of converted rows.
+    """
+    conn = sqlite3.connect(db_path)
+    ensure_vector_columns(conn)
+
+    cur = conn.cursor()
+    converted = 0
+
+    key_column = {"SEMANTICS": "file_id", "CLUSTERS": "cluster_id"}
+
+    for table, column in VECTOR_COLUMNS:
+        key = key_column[table]
+        cur.execute(f"SELECT {key} FROM {table} WHERE {column} IS NOT NULL AND dtype IS NULL")
+        keys = [row[0] for row in cur.fetchall()]
+
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            cur.execute(f"SELECT {key}, {column} FROM {table} WHERE {key} IN ({placeholders})", batch)
+
+            updates = []
+            for row_key, blob in cur.fetchall():
+                vector = pickle.loads(blob)
+                if vector is None:
+                    updates.append((None, None, None, row_key))
+                    continue
+                updates.append(encode_vector(vector, dtype) + (row_key,))
+
+            cur.executemany(
+                f"UPDATE {table} SET {column}=?, dim=?, dtype=? WHERE {key}=?",
+                updates
+            )
+            converted += len(updates)
+
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+    return converted
+
+
+if __name__ == "__main__":
+    # python -m core.vector_format [db_path ...] [--float16]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    target_dtype = "float16" if "--float16" in sys.argv else "float32"
+
+    if not args:
+        from core.config import DATABASE_PATH
+        args = [DATABASE_PATH]
+
+    for path in args:
+        count = migrate_database(path, dtype=target_dtype)
+        print(f"✅ {path}: converted {count} vectors to {target_dtype}")
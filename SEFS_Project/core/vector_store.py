@@ -0,0 +1,365 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+
+from core.vector_format import VECTOR_DTYPES
+
+
+# file_id is an md5 hex digest; stored next to each row so scans need no SQL
+FILE_ID_DTYPE = np.dtype("S32")
+
+MANIFEST_NAME = "manifest.json"
+SEGMENT_PATTERN = re.compile(r"^g(\d+)_s(\d+)\.(vec|ids|live)\.npy$")
+
+
+# ---------------- READER ----------------
+
+class VectorStoreReader:
+    """
+    Frozen view of the store: row count and tombstones are copied when the
+    reader is opened, so appends/deletes made later are not visible and a
+    scan always sees one consistent state.
+    """
+
+    def __init__(self, segments, live_masks):
+        self._segments = segments          # [(vectors memmap, file_ids memmap)]
+        self._live = live_masks            # [bool array per segment, frozen copy]
+
+    def __len__(self):
+        return int(sum(mask.sum() for mask in self._live))
+
+    def _chunk_bounds(self, chunk_rows):
+        for seg_idx, mask in enumerate(self._live):
+            for start in range(0, len(mask), chunk_rows):
+                yield seg_idx, start, min(start + chunk_rows, len(mask))
+
+    def iter_chunks(self, chunk_rows=4096, start_chunk=0):
+        """
+        Yield (file_ids, vectors) for consecutive blocks of at most chunk_rows
+        rows. Only the live rows of one block are copied into memory at a time.
+        """
+        for n, (seg_idx, start, end) in enumerate(self._chunk_bounds(chunk_rows)):
+            if n < start_chunk:
+                continue
+
+            vectors, file_ids = self._segments[seg_idx]
+            live = self._live[seg_idx][start:end]
+
+            block = np.asarray(vectors[start:end][live], dtype=np.float32)
+            ids = [fid.decode("ascii") for fid in file_ids[start:end][live]]
+            yield ids, block
+
+
+# ---------------- STORE ----------------
+
+class VectorStore:
+    """
+    Append-only, memory-mapped embedding store for corpora larger than RAM.
+
+    Vectors live in fixed-size .npy segments inside `directory`; a vector's
+    global row index (segment * segment_rows + offset) is what SEMANTICS.row_id
+    records. Deleting or replacing a vector only clears its live flag
+    (tombstone); compact() rewrites the live rows into a new generation of
+    segments and reports the old → new row mapping.
+
+    Callers that read row ids from the database and then modify the store
+    must hold `store.lock` across both steps, because compaction renumbers rows.
+    """
+
+    def __init__(self, directory, dtype="float32", segment_rows=65536):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self._compaction_thread = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+        else:
+            self._manifest = {
+                "dim": None,
+                "dtype": dtype,
+                "segment_rows": segment_rows,
+                "next_row": 0,
+                "generation": 0,
+            }
+
+        self._segments = []
+        self._live = []
+        self._open_segments()
+        self._remove_stale_generations()
+
+    # ---------------- FILES ----------------
+
+    def _segment_path(self, generation, seg_idx, kind):
+        return os.path.join(self.directory, f"g{generation:04d}_s{seg_idx:05d}.{kind}.npy")
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, path)
+
+    def _open_segments(self):
+        m = self._manifest
+        if m["dim"] is None:
+            return
+
+        seg_count = -(-m["next_row"] // m["segment_rows"])
+        for seg_idx in range(seg_count):
+            self._segments.append((
+                np.load(self._segment_path(m["generation"], seg_idx, "vec"), mmap_mode="r+"),
+                np.load(self._segment_path(m["generation"], seg_idx, "ids"), mmap_mode="r+"),
+            ))
+            self._live.append(
+                np.load(self._segment_path(m["generation"], seg_idx, "live"), mmap_mode="r+")
+            )
+
+    def _new_segment(self, generation, seg_idx):
+        m = self._manifest
+        rows = m["segment_rows"]
+        open_memmap = np.lib.format.open_memmap
+
+        vectors = open_memmap(
+            self._segment_path(generation, seg_idx, "vec"), mode="w+",
+            dtype=VECTOR_DTYPES[m["dtype"]], shape=(rows, m["dim"])
+        )
+        file_ids = open_memmap(
+            self._segment_path(generation, seg_idx, "ids"), mode="w+",
+            dtype=FILE_ID_DTYPE, shape=(rows,)
+        )
+        live = open_memmap(
+            self._segment_path(generation, seg_idx, "live"), mode="w+",
+            dtype=np.bool_, shape=(rows,)
+        )
+        return (vectors, file_ids), live
+
+    def _remove_stale_generations(self):
+        """
+        Delete segment files left behind by earlier generations.
+        On Windows a file still mapped by a reader cannot be removed yet;
+        it is retried on the next open/compaction.
+        """
+        current = self._manifest["generation"]
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match and int(match.group(1)) != current:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    # ---------------- READ ----------------
+
+    @property
+    def dim(self):
+        return self._manifest["dim"]
+
+    def _locate(self, row_id):
+        rows = self._manifest["segment_rows"]
+        return row_id // rows, row_id % rows
+
+    def get(self, row_id):
+        seg_idx, offset = self._locate(row_id)
+        if not self._live[seg_idx][offset]:
+            return None
+        return np.array(self._segments[seg_idx][0][offset], dtype=np.float32)
+
+    def reader(self):
+        """
+        Open a frozen, chunk-iterable view (see VectorStoreReader).
+        """
+        with self.lock:
+            segments = list(self._segments)
+            live = [np.array(mask, dtype=bool) for mask in self._live]
+            return VectorStoreReader(segments, live)
+
+    def live_count(self):
+        with self.lock:
+            return int(sum(np.count_nonzero(mask) for mask in self._live))
+
+    def garbage_ratio(self):
+        """
+        Fraction of appended rows that are tombstoned.
+        """
+        with self.lock:
+            used = self._manifest["next_row"]
+            if not used:
+                return 0.0
+            return 1.0 - self.live_count() / used
+
+    # ---------------- WRITE ----------------
+
+    def append(self, file_id, vector):
+        """
+        Append one vector and return its row id.
+        """
+        return self.append_many([file_id], [np.asarray(vector).ravel()])[0]
+
+    def append_many(self, file_ids, vectors):
+        """
+        Append vectors[i] for file_ids[i] and return their row ids.
+        Rows are copied a segment slice at a time; the manifest is written once.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(file_ids):
+            return []
+
+        with self.lock:
+            m = self._manifest
+            if m["dim"] is None:
+                m["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != m["dim"]:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match store dimension {m['dim']}")
+
+            first = m["next_row"]
+            done = 0
+
+            while done < len(vectors):
+                seg_idx, offset = self._locate(first + done)
+
+                if seg_idx == len(self._segments):
+                    segment, live = self._new_segment(m["generation"], seg_idx)
+                    self._segments.append(segment)
+                    self._live.append(live)
+
+                take = min(len(vectors) - done, m["segment_rows"] - offset)
+                seg_vectors, seg_ids = self._segments[seg_idx]
+
+                seg_vectors[offset:offset + take] = vectors[done:done + take]
+                seg_ids[offset:offset + take] = [fid.encode("ascii") for fid in file_ids[done:done + take]]
+                self._live[seg_idx][offset:offset + take] = True
+
+                done += take
+
+            m["next_row"] = first + len(vectors)
+            self._write_manifest()
+            return list(range(first, first + len(vectors)))
+
+    def delete(self, row_id):
+        """
+        Tombstone a row. Its space is reclaimed by the next compaction.
+        """
+        if row_id is None:
+            return
+        with self.lock:
+            seg_idx, offset = self._locate(row_id)
+            if seg_idx < len(self._live):
+                self._live[seg_idx][offset] = False
+
+    def restore(self, row_id):
+        """
+        Undo delete() of a row that has not been compacted away since.
+        """
+        if row_id is None:
+            return
+        with self.lock:
+            seg_idx, offset = self._locate(row_id)
+            if seg_idx < len(self._live):
+                self._live[seg_idx][offset] = True
+
+    def flush(self):
+        with self.lock:
+            for (vectors, file_ids), live in zip(self._segments, self._live):
+                vectors.flush()
+                file_ids.flush()
+                live.flush()
+
+    # ---------------- COMPACTION ----------------
+
+    def compact(self, remap=None):
+        """
+        Rewrite live rows into a fresh generation of segments.
+
+        remap(pairs) is called with [(old_row_id, new_row_id), ...] before the
+        new generation is published, so the caller can update SEMANTICS.row_id;
+        if it raises, the old generation stays current.
+        """
+        with self.lock:
+            m = self._manifest
+            if m["dim"] is None:
+                return 0
+
+            self.flush()
+
+            generation = m["generation"] + 1
+            rows = m["segment_rows"]
+            segments, live_masks, pairs = [], [], []
+            new_row = 0
+
+            for seg_idx, ((vectors, file_ids), live) in enumerate(zip(self._segments, self._live)):
+                old_rows = np.flatnonzero(live)
+                offset = 0
+
+                # Live rows of one old segment may straddle two new segments
+                while offset < len(old_rows):
+                    target_seg, target_offset = divmod(new_row, rows)
+                    if target_seg == len(segments):
+                        segment, mask = self._new_segment(generation, target_seg)
+                        segments.append(segment)
+                        live_masks.append(mask)
+
+                    take = min(len(old_rows) - offset, rows - target_offset)
+                    src = old_rows[offset:offset + take]
+                    dst = slice(target_offset, target_offset + take)
+
+                    segments[target_seg][0][dst] = vectors[src]
+                    segments[target_seg][1][dst] = file_ids[src]
+                    live_masks[target_seg][dst] = True
+
+                    pairs.extend(zip(
+                        (seg_idx * rows + src).tolist(),
+                        range(new_row, new_row + take)
+                    ))
+                    new_row += take
+                    offset += take
+
+            for (vectors, file_ids), live in zip(segments, live_masks):
+                vectors.flush()
+                file_ids.flush()
+                live.flush()
+
+            if remap is not None:
+                remap(pairs)
+
+            m["generation"] = generation
+            m["next_row"] = new_row
+            self._segments = segments
+            self._live = live_masks
+            self._write_manifest()
+            self._remove_stale_generations()
+
+            return len(pairs)
+
+    def compact_in_background(self, remap=None, min_garbage_ratio=0.25, context=None):
+        """
+        Start compaction on a daemon thread if enough rows are tombstoned
+        and no compaction is already running.
+
+        context, if given, is a factory for a context manager entered before
+        the store lock is taken (e.g. the database transaction remap writes to).
+        """
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return False
+        if self.garbage_ratio() < min_garbage_ratio:
+            return False
+
+        def run():
+            if context is None:
+                self.compact(remap)
+                return
+            with context():
+                self.compact(remap)
+
+        self._compaction_thread = threading.Thread(
+            target=run,
+            name="sefs-vector-compaction",
+            daemon=True
+        )
+        self._compaction_thread.start()
+        return True
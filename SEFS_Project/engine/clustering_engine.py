@@ -1,87 +1,483 @@
+import re
+import time
 import uuid
+import threading
 import numpy as np
-from sklearn.cluster import AgglomerativeClustering
-from core.db_api import get_all_embeddings, store_cluster, assign_file_to_cluster
+from core.db_api import (
+    transaction,
+    open_embedding_reader,
+    get_embeddings_by_id,
+    on_rollback,
+    store_cluster,
+    store_clusters_bulk,
+    delete_cluster,
+    assign_clusters_bulk,
+    get_cluster_centroids,
+    get_file_cluster,
+    get_file_clusters,
+    get_file_cluster_map
+)
 from engine.semantic_engine import semantic_graph_to_matrix
+from engine.similarity_engine import normalize_rows, SemanticAdjacency
 
 # Threshold to assign new embeddings to existing clusters
 SIMILARITY_THRESHOLD = 0.75
 
+# Average-linkage clustering needs a dense n x n distance matrix. Above this
+# many files cluster_files groups the connected components of the sparse
+# graph instead (5000 files is ~100 MB of float32 distances)
+DENSE_CLUSTERING_MAX_FILES = 5000
+
+# Incremental updates since the last full clustering, as a fraction of the
+# files clustered then, before a full re-clustering is forced
+REBUILD_CHURN_LIMIT = 0.2
+# Growth of the largest cluster's share of all files since the last full run
+REBUILD_IMBALANCE_GROWTH = 0.15
+# Re-cluster at least this often (seconds) while incremental changes exist
+REBUILD_INTERVAL = 3600
+
+
+# ---------------- INCREMENTAL STATE ----------------
+
+class ClusterState:
+    """
+    In-memory mirror of CLUSTERS.centroid used for incremental clustering.
+
+    Each cluster keeps the sum and count of its members' unit-length
+    embeddings; the stored centroid is their mean. Also tracks the drift
+    counters that decide when a full re-clustering is due.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.sums = {}
+        self.sizes = {}
+        self.labels = {}
+        self.last_label_number = 0  # highest "Cluster N" handed out
+        self.changed = {}           # file_id -> cluster_id since the last folder sync
+        self.ops_since_full = 0
+        self.files_at_full = 0
+        self.largest_share_at_full = 0.0
+        self.last_full = time.time()
+
+    def total_files(self):
+        return sum(self.sizes.values())
+
+    def largest_share(self):
+        total = self.total_files()
+        return max(self.sizes.values()) / total if total else 0.0
+
+    def mark_full_rebuild(self):
+        self.changed = {}
+        self.ops_since_full = 0
+        self.files_at_full = self.total_files()
+        self.largest_share_at_full = self.largest_share()
+        self.last_full = time.time()
+
+    def nearest(self, embedding):
+        """
+        Return (cluster_id, similarity) of the closest centroid, or (None, 0).
+        """
+        cluster_ids = [cid for cid, size in self.sizes.items() if size > 0]
+        if not cluster_ids:
+            return None, 0.0
+
+        centroids = normalize_rows(np.array([self.sums[cid] for cid in cluster_ids]))
+        scores = centroids @ normalize_rows(embedding)[0]
+        best = int(np.argmax(scores))
+        return cluster_ids[best], float(scores[best])
+
+    def add(self, cluster_id, unit_vector):
+        if cluster_id not in self.sums:
+            self.sums[cluster_id] = np.zeros_like(unit_vector)
+            self.sizes[cluster_id] = 0
+        self.sums[cluster_id] = self.sums[cluster_id] + unit_vector
+        self.sizes[cluster_id] += 1
+
+    def remove(self, cluster_id, unit_vector):
+        if cluster_id not in self.sums:
+            return
+        self.sizes[cluster_id] -= 1
+        if unit_vector is not None:
+            self.sums[cluster_id] = self.sums[cluster_id] - unit_vector
+
+    def new_label(self):
+        """
+        "Cluster N" numbered above every label in use and every label this
+        process handed out, so a deleted cluster's label is never reused.
+        """
+        in_use = [
+            int(match.group(1)) for match in
+            (re.fullmatch(r"Cluster (\d+)", label or "") for label in self.labels.values())
+            if match
+        ]
+        self.last_label_number = max([self.last_label_number] + in_use) + 1
+        return f"Cluster {self.last_label_number}"
+
+    def centroid(self, cluster_id):
+        if cluster_id not in self.sums:
+            return None
+        return self.sums[cluster_id] / max(1, self.sizes.get(cluster_id, 0))
+
+    def checkpoint(self):
+        """
+        Copy of the incremental state; add() and remove() replace sum arrays
+        rather than modifying them, so shallow copies are enough.
+        """
+        return dict(self.sums), dict(self.sizes), dict(self.labels), dict(self.changed), self.ops_since_full
+
+    def restore(self, checkpoint):
+        self.sums, self.sizes, self.labels, self.changed, self.ops_since_full = checkpoint
+
+
+_state = ClusterState()
+
+
+def _load_state():
+    """
+    Populate the cluster state from the database (once per process).
+    Clusters written before centroids were stored get one computed from
+    their members' embeddings.
+    """
+    if _state.loaded:
+        return
+
+    missing = set()
+    for cluster_id, label, centroid, size in get_cluster_centroids():
+        _state.labels[cluster_id] = label
+        _state.sizes[cluster_id] = size
+        if centroid is not None:
+            _state.sums[cluster_id] = np.asarray(centroid, dtype=np.float32) * size
+        elif size:
+            missing.add(cluster_id)
+
+    if missing:
+        membership = get_file_cluster_map()
+        for file_ids, vectors in open_embedding_reader().iter_chunks():
+            unit = normalize_rows(vectors)
+            for file_id, vector in zip(file_ids, unit):
+                cluster_id = membership.get(file_id)
+                if cluster_id in missing:
+                    _state.sums[cluster_id] = _state.sums.get(cluster_id, 0) + vector
+
+        for cluster_id in missing:
+            if cluster_id in _state.sums:
+                store_cluster(cluster_id, _state.labels[cluster_id], _state.centroid(cluster_id))
+
+    _state.loaded = True
+    _state.mark_full_rebuild()
+
+
+def _restore_on_rollback():
+    """
+    Undo the in-memory changes made from here on if the enclosing
+    transaction rolls back, so the centroids never drift from CLUSTERS.
+    Call inside transaction() with _state.lock held.
+    """
+    checkpoint = _state.checkpoint()
+
+    def restore():
+        with _state.lock:
+            _state.restore(checkpoint)
+    on_rollback(restore)
+
 
 def assign_cluster(new_embedding):
     """
     Assigns a new file embedding to an existing cluster if similar enough,
     otherwise creates a new cluster.
     """
-    existing_files = get_all_embeddings()
+    with transaction(), _state.lock:
+        _load_state()
+        _restore_on_rollback()
 
-    if not existing_files:
-        # No existing files → create first cluster
-        cluster_id = str(uuid.uuid4())
-        store_cluster(cluster_id, "Cluster 1")
+        cluster_id, created = _nearest_or_new(new_embedding)
+        if created:
+            # Seeded with this embedding as its centroid
+            store_cluster(cluster_id, _state.labels[cluster_id], normalize_rows(new_embedding)[0])
         return cluster_id
 
-    best_cluster = None
-    best_score = 0
 
-    for file in existing_files:
-        score = np.dot(new_embedding, file["embedding"]) / (
-            np.linalg.norm(new_embedding) * np.linalg.norm(file["embedding"])
-        )
-
-        if score > best_score:
-            best_score = score
-            best_cluster = file["file_id"]
+def _nearest_or_new(embedding):
+    """
+    (cluster_id, created): the nearest cluster if similar enough, otherwise
+    a new one, which is only added to the in-memory labels.
+    """
+    best_cluster, best_score = _state.nearest(embedding)
 
     if best_score >= SIMILARITY_THRESHOLD:
-        return best_cluster
+        return best_cluster, False
 
-    # Create new cluster
     cluster_id = str(uuid.uuid4())
-    store_cluster(cluster_id, f"Cluster {len(existing_files)+1}")
-    return cluster_id
+    _state.labels[cluster_id] = _state.new_label()
+    return cluster_id, True
+
+
+def update_file_cluster(file_id, embedding):
+    """
+    Incrementally (re)assign one file: take its previous embedding out of its
+    old cluster, assign the new embedding to the nearest centroid and update
+    both centroids. Call before the new embedding is stored.
+    Returns the cluster_id.
+    """
+    with transaction(), _state.lock:
+        _load_state()
+        _restore_on_rollback()
+
+        unit = normalize_rows(embedding)[0]
+        old_cluster = get_file_cluster(file_id)
+
+        if old_cluster is not None:
+            old_vector = get_embeddings_by_id([file_id]).get(file_id)
+            old_unit = normalize_rows(old_vector)[0] if old_vector is not None else None
+            _state.remove(old_cluster, old_unit)
+
+        cluster_id = assign_cluster(unit)
+        _state.add(cluster_id, unit)
+
+        store_cluster(cluster_id, _state.labels.get(cluster_id), _state.centroid(cluster_id))
+        if old_cluster is not None and old_cluster != cluster_id:
+            _persist_or_drop(old_cluster)
+
+        _state.changed[file_id] = cluster_id
+        _state.ops_since_full += 1
+        return cluster_id
+
+
+def update_file_clusters_bulk(items):
+    """
+    Bulk form of update_file_cluster for (file_id, embedding) pairs: previous
+    clusters and embeddings are read with one query each, every file is
+    assigned against the in-memory centroids, and FILE_CLUSTER_MAP and the
+    touched clusters are written with executemany. Call before the new
+    embeddings are stored. Returns the cluster ids in input order.
+    """
+    items = list(items)
+
+    with transaction(), _state.lock:
+        _load_state()
+        _restore_on_rollback()
+
+        file_ids = [file_id for file_id, _ in items]
+        old_clusters = get_file_clusters(file_ids)
+        old_units = {
+            file_id: normalize_rows(vector)[0]
+            for file_id, vector in get_embeddings_by_id(list(old_clusters)).items()
+        }
+
+        units = normalize_rows(np.array([embedding for _, embedding in items], dtype=np.float32))
+        cluster_ids = []
+        touched = set()
+
+        for file_id, unit in zip(file_ids, units):
+            old_cluster = old_clusters.get(file_id)
+            if old_cluster is not None:
+                _state.remove(old_cluster, old_units.get(file_id))
+                touched.add(old_cluster)
+
+            cluster_id, _ = _nearest_or_new(unit)
+            _state.add(cluster_id, unit)
+            touched.add(cluster_id)
+
+            # A file repeated later in the batch moves from this assignment
+            old_clusters[file_id], old_units[file_id] = cluster_id, unit
+            cluster_ids.append(cluster_id)
+
+            _state.changed[file_id] = cluster_id
+            _state.ops_since_full += 1
+
+        emptied = [cluster_id for cluster_id in touched if _state.sizes.get(cluster_id, 0) <= 0]
+        for cluster_id in emptied:
+            _persist_or_drop(cluster_id)
+
+        store_clusters_bulk(
+            (cluster_id, _state.labels.get(cluster_id), _state.centroid(cluster_id))
+            for cluster_id in touched if cluster_id not in emptied
+        )
+        assign_clusters_bulk(zip(file_ids, cluster_ids))
+
+        return cluster_ids
+
+
+def remove_file_from_cluster(file_id):
+    """
+    Take a file out of its cluster before its records are deleted.
+    """
+    with transaction(), _state.lock:
+        _load_state()
+        _restore_on_rollback()
+
+        cluster_id = get_file_cluster(file_id)
+        if cluster_id is None:
+            return
+
+        vector = get_embeddings_by_id([file_id]).get(file_id)
+        _state.remove(cluster_id, normalize_rows(vector)[0] if vector is not None else None)
+        _persist_or_drop(cluster_id)
+
+        _state.changed.pop(file_id, None)
+        _state.ops_since_full += 1
+
+
+def _persist_or_drop(cluster_id):
+    if _state.sizes.get(cluster_id, 0) <= 0:
+        _state.sums.pop(cluster_id, None)
+        _state.sizes.pop(cluster_id, None)
+        _state.labels.pop(cluster_id, None)
+        delete_cluster(cluster_id)
+    else:
+        store_cluster(cluster_id, _state.labels.get(cluster_id), _state.centroid(cluster_id))
+
+
+def needs_full_rebuild():
+    """
+    True when incremental clusters have drifted far enough from the last
+    full clustering (churn, imbalance growth, or schedule) to re-run it.
+    """
+    with _state.lock:
+        _load_state()
+
+        if not _state.ops_since_full:
+            return False
+
+        churn = _state.ops_since_full / max(1, _state.files_at_full)
+        imbalance = _state.largest_share() - _state.largest_share_at_full
+        overdue = time.time() - _state.last_full > REBUILD_INTERVAL
+
+        return churn > REBUILD_CHURN_LIMIT or imbalance > REBUILD_IMBALANCE_GROWTH or overdue
+
+
+def take_changed_assignments():
+    """
+    Return and clear {file_id: cluster_id} for files reassigned since the last call.
+    """
+    with _state.lock:
+        changed, _state.changed = _state.changed, {}
+        return changed
+
+
+# ---------------- FULL CLUSTERING ----------------
+
+def _compute_centroids(file_ids, labels):
+    """
+    Mean unit embedding per label, streamed from the embedding reader.
+    """
+    label_of = dict(zip(file_ids, labels))
+    n_labels = int(max(labels)) + 1
+    sums = None
+    sizes = np.zeros(n_labels, dtype=np.int64)
+
+    for chunk_ids, vectors in open_embedding_reader().iter_chunks():
+        rows = [i for i, fid in enumerate(chunk_ids) if fid in label_of]
+        if not rows:
+            continue
+        unit = normalize_rows(vectors[rows])
+        chunk_labels = np.array([label_of[chunk_ids[i]] for i in rows])
+
+        if sums is None:
+            sums = np.zeros((n_labels, unit.shape[1]), dtype=np.float32)
+        np.add.at(sums, chunk_labels, unit)
+        np.add.at(sizes, chunk_labels, 1)
+
+    return sums, sizes
+
+
+def _graph_components(adjacency, distance_threshold):
+    """
+    Label files by connected component of the edges closer than
+    distance_threshold (single linkage), straight from the CSR graph.
+    """
+    from scipy.sparse.csgraph import connected_components
+
+    graph = adjacency.to_scipy().copy()
+    graph.data[graph.data <= 1 - distance_threshold] = 0
+    graph.eliminate_zeros()
+
+    _, labels = connected_components(graph, directed=False)
+    return labels
 
 
 def cluster_files(adjacency, distance_threshold=0.5):
     """
     Performs Agglomerative Clustering on the semantic graph and updates the database.
+    Also stores each cluster's centroid and resets the incremental state.
+    Graphs of more than DENSE_CLUSTERING_MAX_FILES files are split into
+    connected components instead, without an n x n matrix.
 
-    :param adjacency: adjacency dict from build_semantic_space()
+    :param adjacency: SemanticAdjacency (or adjacency dict) from build_semantic_space()
     :param distance_threshold: threshold for clustering (distance)
     :return: dict {file_id: cluster_id}
     """
     if not adjacency:
         return {}
 
-    # Convert adjacency dict to similarity matrix
-    sim_matrix, file_ids = semantic_graph_to_matrix(adjacency)
-
-    # Agglomerative clustering expects distances
-    distance_matrix = 1 - sim_matrix
+    if isinstance(adjacency, SemanticAdjacency) and len(adjacency) > DENSE_CLUSTERING_MAX_FILES:
+        print(f"🧩 Clustering {len(adjacency)} files by graph components (dense limit {DENSE_CLUSTERING_MAX_FILES})")
+        file_ids = list(adjacency.file_ids)
+        labels = _graph_components(adjacency, distance_threshold)
 
     # Handle single file case
+    elif len(adjacency) == 1:
+        file_ids = list(adjacency)
+        labels = np.zeros(1, dtype=np.int64)
+    else:
+        from sklearn.cluster import AgglomerativeClustering
+
+        # Convert adjacency dict to similarity matrix
+        sim_matrix, file_ids = semantic_graph_to_matrix(adjacency)
+
+        # Agglomerative clustering expects distances
+        distance_matrix = 1 - sim_matrix
+
+        # Run clustering (new scikit-learn uses `metric` instead of `affinity`)
+        clustering = AgglomerativeClustering(
+            n_clusters=None,
+            distance_threshold=distance_threshold,
+            metric="precomputed",  # ✅ replace deprecated affinity
+            linkage="average"
+        )
+        clustering.fit(distance_matrix)
+        labels = clustering.labels_
+
     if len(file_ids) == 1:
-        cluster_uuid = str(uuid.uuid4())
-        store_cluster(cluster_uuid, "Cluster 1")
-        assign_file_to_cluster(file_ids[0], cluster_uuid)
-        return {file_ids[0]: cluster_uuid}
-
-    # Run clustering (new scikit-learn uses `metric` instead of `affinity`)
-    clustering = AgglomerativeClustering(
-        n_clusters=None,
-        distance_threshold=distance_threshold,
-        metric="precomputed",  # ✅ replace deprecated affinity
-        linkage="average"
-    )
-    clustering.fit(distance_matrix)
-
-    # Map files to clusters and store in DB
-    cluster_assignments = {}
-    for file_id, label in zip(file_ids, clustering.labels_):
-        cluster_uuid = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"cluster-{label}"))
-        cluster_name = f"Cluster {label+1}"
-        store_cluster(cluster_uuid, cluster_name)
-        assign_file_to_cluster(file_id, cluster_uuid)
-        cluster_assignments[file_id] = cluster_uuid
+        cluster_uuids = [str(uuid.uuid4())]
+    else:
+        cluster_uuids = [
+            str(uuid.uuid5(uuid.NAMESPACE_DNS, f"cluster-{label}"))
+            for label in range(int(max(labels)) + 1)
+        ]
+
+    sums, sizes = _compute_centroids(file_ids, labels)
+
+    # Database write lock first, then the state lock (see core.database.transaction)
+    with transaction(), _state.lock:
+        _state.loaded = True
+        _state.sums, _state.sizes, _state.labels = {}, {}, {}
+
+        # Store every cluster once, with its centroid
+        for label, cluster_uuid in enumerate(cluster_uuids):
+            cluster_name = "Cluster 1" if len(file_ids) == 1 else f"Cluster {label+1}"
+            centroid = sums[label] / max(1, sizes[label]) if sums is not None else None
+            store_cluster(cluster_uuid, cluster_name, centroid)
+
+            _state.labels[cluster_uuid] = cluster_name
+            _state.sizes[cluster_uuid] = int(sizes[label])
+            if sums is not None:
+                _state.sums[cluster_uuid] = sums[label]
+
+        # Map files to clusters and store in DB
+        cluster_assignments = {
+            file_id: cluster_uuids[label]
+            for file_id, label in zip(file_ids, labels)
+        }
+        assign_clusters_bulk(cluster_assignments.items())
+
+        # Drop clusters left over from earlier runs / incremental splits
+        for cluster_id, _, _, _ in get_cluster_centroids():
+            if cluster_id not in _state.labels:
+                delete_cluster(cluster_id)
+
+        _state.mark_full_rebuild()
 
     return cluster_assignments
@@ -1,5 +1,32 @@
 import os
+import re
+import time
+import multiprocessing
+from collections import Counter
 from PyPDF2 import PdfReader
+from core.config import (
+    PDF_MAX_PAGES,
+    PDF_MAX_CHARS,
+    PDF_TIMEOUT,
+    PDF_PAGES_PER_TASK,
+    PDF_WORKERS,
+    ARTIFACT_TOP_TERMS,
+    ARTIFACT_SUMMARY_CHARS,
+    PASSAGE_WORDS,
+    PASSAGE_OVERLAP,
+    PASSAGE_MAX_PER_FILE
+)
+
+# Terms counted for artifacts: runs of 4+ letters/digits (shorter words are noise)
+_TERM = re.compile(r"[^\W_]{4,}")
+_WORD = re.compile(r"\S+")
+
+
+class ExtractionTimeout(TimeoutError):
+    """
+    Raised when a file takes longer than its extraction time budget.
+    Callers quarantine the file instead of retrying it on every event.
+    """
 
 
 def extract_text(file_path):
@@ -20,6 +47,69 @@ def extract_text(file_path):
     return None
 
 
+def extract_document(file_path):
+    """
+    Extract text and build its artifact in one pass.
+    Returns (text, artifact), or None when there is no text.
+    """
+    text = extract_text(file_path)
+    if not text:
+        return None
+    return text, build_text_artifact(text)
+
+
+# ---------------- TEXT ARTIFACT ----------------
+
+def build_text_artifact(text):
+    """
+    Compact summary of extracted text, stored per content hash so nothing
+    downstream has to read the file again:
+        {"terms": {term: count}, "summary": str, "length": int}
+    """
+    counts = Counter(_TERM.findall(text.lower()))
+
+    summary = " ".join(text[:4 * ARTIFACT_SUMMARY_CHARS].split())
+    if len(summary) > ARTIFACT_SUMMARY_CHARS:
+        summary = summary[:ARTIFACT_SUMMARY_CHARS].rsplit(" ", 1)[0] + "…"
+
+    return {
+        "terms": dict(counts.most_common(ARTIFACT_TOP_TERMS)),
+        "summary": summary,
+        "length": len(text)
+    }
+
+
+# ---------------- PASSAGES ----------------
+
+def split_passages(text, words=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP, max_passages=PASSAGE_MAX_PER_FILE):
+    """
+    Split text into windows of `words` words, each overlapping the previous
+    one by `overlap` words. Returns [(start_char, end_char, passage_text)].
+    When there are more than max_passages windows, an even spread is kept.
+    """
+    spans = [match.span() for match in _WORD.finditer(text)]
+    if not spans:
+        return []
+
+    step = max(1, words - overlap)
+    starts = list(range(0, max(1, len(spans) - overlap), step))
+
+    if max_passages and len(starts) > max_passages:
+        picks = [round(i * (len(starts) - 1) / (max_passages - 1)) for i in range(max_passages)] \
+            if max_passages > 1 else [0]
+        starts = [starts[i] for i in picks]
+
+    passages = []
+    for first in starts:
+        last = min(first + words, len(spans)) - 1
+        start_char, end_char = spans[first][0], spans[last][1]
+        passages.append((start_char, end_char, text[start_char:end_char]))
+
+    return passages
+
+
+# ---------------- TXT ----------------
+
 def extract_text_from_txt(file_path):
     try:
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
@@ -29,18 +119,136 @@ def extract_text_from_txt(file_path):
         return None
 
 
+# ---------------- PDF ----------------
+
+def iter_pdf_pages(reader, start=0, stop=None):
+    """
+    Yield the text of pages [start, stop) one at a time, skipping empty pages.
+    """
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+
+    for index in range(start, stop):
+        content = reader.pages[index].extract_text()
+        if content:
+            yield content
+
+
+def _join_within_budget(pages, max_chars, deadline=None):
+    """
+    Join page texts until max_chars is reached.
+    Returns (text, timed_out); stops early once the deadline passes.
+    """
+    parts = []
+    total = 0
+
+    for content in pages:
+        parts.append(content)
+        total += len(content) + 1
+        if total >= max_chars:
+            break
+        if deadline is not None and time.monotonic() > deadline:
+            return "\n".join(parts)[:max_chars], True
+
+    return "\n".join(parts)[:max_chars], False
+
+
+def _extract_page_range(file_path, start, stop, max_chars, time_left=None):
+    """
+    Worker task: extract pages [start, stop) of one PDF.
+    Returns (text, total page count, timed_out).
+    """
+    deadline = time.monotonic() + time_left if time_left else None
+    reader = PdfReader(file_path)
+    text, timed_out = _join_within_budget(
+        iter_pdf_pages(reader, start, stop), max_chars, deadline
+    )
+    return text, len(reader.pages), timed_out
+
+
+def _in_worker_process():
+    """
+    True inside a worker process (e.g. the bootstrap's ExtractionPool, which
+    kills stuck workers itself): extract in-process there rather than
+    starting processes of its own.
+    """
+    return multiprocessing.parent_process() is not None
+
+
+def _extract_in_pool(file_path, ranges, deadline):
+    """
+    Run _extract_page_range over (start, stop) ranges in parallel child
+    processes. Each call gets its own processes, so a stuck page is
+    terminated with them at the deadline without touching other files.
+    Returns [(text, total page count, timed_out)] in range order.
+    """
+    time_left = deadline - time.monotonic()
+    tasks = [(file_path, start, stop, PDF_MAX_CHARS, time_left) for start, stop in ranges]
+
+    # Leaving the block terminates the processes, stuck or not
+    with multiprocessing.Pool(min(PDF_WORKERS, len(tasks))) as pool:
+        try:
+            results = pool.starmap_async(_extract_page_range, tasks).get(max(0.0, time_left))
+        except multiprocessing.TimeoutError:
+            raise ExtractionTimeout(f"PDF extraction exceeded {PDF_TIMEOUT}s: {file_path}")
+
+    if any(timed_out for _, _, timed_out in results):
+        raise ExtractionTimeout(f"PDF extraction exceeded {PDF_TIMEOUT}s: {file_path}")
+
+    return results
+
+
+def _extract_pdf_with_timeout(file_path):
+    """
+    The whole file must finish within PDF_TIMEOUT seconds.
+
+    Opening the file and every page run in child processes that are killed
+    at the deadline: the first PDF_PAGES_PER_TASK pages in one (which also
+    reports the page count), the rest split across PDF_WORKERS.
+    Inside a worker process the file is extracted in-process, with the
+    deadline checked between pages; the pool that owns the worker enforces
+    the hard limit.
+    """
+    if _in_worker_process():
+        text, _, timed_out = _extract_page_range(file_path, 0, PDF_MAX_PAGES, PDF_MAX_CHARS, PDF_TIMEOUT)
+        if timed_out:
+            raise ExtractionTimeout(f"PDF extraction exceeded {PDF_TIMEOUT}s: {file_path}")
+        return text
+
+    deadline = time.monotonic() + PDF_TIMEOUT
+    first_stop = min(PDF_PAGES_PER_TASK, PDF_MAX_PAGES)
+
+    [(text, page_count, _)] = _extract_in_pool(file_path, [(0, first_stop)], deadline)
+    last_page = min(page_count, PDF_MAX_PAGES)
+
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_TASK, last_page))
+        for start in range(first_stop, last_page, PDF_PAGES_PER_TASK)
+    ]
+    if not ranges or len(text) >= PDF_MAX_CHARS:
+        return text
+
+    rest = _extract_in_pool(file_path, ranges, deadline)
+    return "\n".join(part for part in [text] + [t for t, _, _ in rest] if part)[:PDF_MAX_CHARS]
+
+
 def extract_text_from_pdf(file_path):
+    """
+    Stream pages into one string, stopping at PDF_MAX_PAGES / PDF_MAX_CHARS.
+    With PDF_TIMEOUT set, raises ExtractionTimeout when the file exceeds it.
+    """
     try:
-        reader = PdfReader(file_path)
-        text = ""
-
-        for page in reader.pages:
-            content = page.extract_text()
-            if content:
-                text += content + "\n"
+        if PDF_TIMEOUT:
+            return _extract_pdf_with_timeout(file_path).strip()
 
+        reader = PdfReader(file_path)
+        text, _ = _join_within_budget(
+            iter_pdf_pages(reader, 0, PDF_MAX_PAGES), PDF_MAX_CHARS
+        )
         return text.strip()
 
+    except ExtractionTimeout:
+        raise
+
     except Exception as e:
         print(f"[ERROR] PDF extraction failed: {e}")
         return None
@@ -0,0 +1,284 @@
+# engine/embedding_service.py
+"""
+Local embedding service.
+
+One process loads the embedding model and serves every other SEFS process
+(main, visualization/semantic_map.py, search scripts) over a Unix domain
+socket. Requests from all clients go through one EmbeddingBatcher, so texts
+from different processes are encoded in the same model calls.
+
+Run it with:
+    python -m engine.embedding_service [--socket PATH]
+
+semantic_engine.get_backend() connects to it when it is running and uses
+the in-process model when it is not.
+
+Protocol: every message is a frame (4-byte big-endian length + payload).
+    request   {"texts": [str, ...]}  or  {"info": true}
+    response  {"model_id": str, "dim": int, "count": int}, followed by a
+              frame of count * dim float32 values when count > 0,
+              or {"error": str} (with "rows": [int, ...] when only some
+              texts could not be embedded; no vectors are sent then)
+"""
+
+import os
+import json
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+import numpy as np
+from core.config import (
+    EMBED_SOCKET_PATH,
+    EMBED_SERVICE_TIMEOUT,
+    EMBEDDING_MODEL_ID
+)
+from engine.semantic_engine import EmbeddingBackend, use_local_backend, embed_async
+
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class EmbeddingServiceUnavailable(ConnectionError):
+    """
+    The service is not running or stopped answering; callers fall back to
+    the in-process model.
+    """
+
+
+# ---------------- FRAMES ----------------
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def send_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"frame of {size} bytes exceeds {MAX_FRAME}")
+    return _recv_exact(sock, size)
+
+
+def send_json(sock, message):
+    send_frame(sock, json.dumps(message).encode("utf-8"))
+
+
+def recv_json(sock):
+    return json.loads(recv_frame(sock).decode("utf-8"))
+
+
+# ---------------- CLIENT ----------------
+
+class RemoteBackend(EmbeddingBackend):
+    """
+    EmbeddingBackend that sends texts to the embedding service.
+    Each thread keeps its own connection, so concurrent callers in one
+    process are batched together on the server too.
+    """
+
+    remote = True
+
+    def __init__(self, socket_path=EMBED_SOCKET_PATH, timeout=EMBED_SERVICE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        info = self._request({"info": True})
+        self.model_id = info["model_id"]
+        self.dim = info["dim"]
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _request(self, message):
+        """
+        Send one request; returns the vectors for a texts request, the header otherwise.
+        """
+        try:
+            sock = self._connection()
+            send_json(sock, message)
+            header = recv_json(sock)
+            if "error" in header:
+                raise RuntimeError(f"Embedding service error: {header['error']}")
+            if "texts" not in message:
+                return header
+
+            count, dim = header["count"], header["dim"]
+            if not count:
+                return np.zeros((0, dim), dtype=np.float32)
+            return np.frombuffer(recv_frame(sock), dtype=np.float32).reshape(count, dim)
+
+        except (OSError, ValueError) as e:
+            # Timeouts and broken connections leave the stream out of step
+            self._drop_connection()
+            raise EmbeddingServiceUnavailable(str(e)) from e
+
+    def encode(self, texts, batch_size=None):
+        return self._request({"texts": list(texts)})
+
+
+def connect_embedding_service(socket_path=EMBED_SOCKET_PATH):
+    """
+    RemoteBackend for a running service that serves EMBEDDING_MODEL_ID,
+    or None (no Unix sockets on this platform, nothing listening, or a
+    service running another model).
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+
+    try:
+        backend = RemoteBackend(socket_path)
+    except (EmbeddingServiceUnavailable, RuntimeError):
+        return None
+
+    if backend.model_id != EMBEDDING_MODEL_ID:
+        print(f"⚠ Embedding service serves {backend.model_id}, expected {EMBEDDING_MODEL_ID}; using local model")
+        return None
+
+    print(f"🔌 Using embedding service → {socket_path}")
+    return backend
+
+
+# ---------------- SERVER ----------------
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """
+    One thread per client connection. Texts are queued on the shared
+    batcher, which encodes them alongside other clients' texts.
+    """
+
+    def handle(self):
+        backend = self.server.backend
+
+        while True:
+            try:
+                message = recv_json(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+
+            try:
+                if "texts" not in message:
+                    send_json(self.request, {"model_id": backend.model_id, "dim": backend.dim, "count": 0})
+                    continue
+
+                futures = [embed_async(text) for text in message["texts"]]
+                vectors = np.zeros((len(futures), backend.dim), dtype=np.float32)
+                failed = []
+                for row, future in enumerate(futures):
+                    vector = future.result()
+                    if vector is None:
+                        failed.append(row)
+                    else:
+                        vectors[row] = vector
+
+            except Exception as e:
+                send_json(self.request, {"error": str(e)})
+                continue
+
+            if failed:
+                # Never stand in zero vectors for texts that were not embedded
+                send_json(self.request, {
+                    "error": f"{len(failed)} of {len(futures)} texts could not be embedded",
+                    "rows": failed
+                })
+                continue
+
+            try:
+                send_json(self.request, {"model_id": backend.model_id, "dim": backend.dim, "count": len(vectors)})
+                if len(vectors):
+                    send_frame(self.request, vectors.tobytes())
+            except OSError:
+                return
+
+
+def _socket_in_use(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def create_server(socket_path=EMBED_SOCKET_PATH):
+    """
+    Load the model and bind the socket (readable by this user only).
+    A socket file left behind by a dead server is replaced.
+    """
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        raise RuntimeError("Unix domain sockets are not available on this platform")
+
+    if os.path.exists(socket_path):
+        if _socket_in_use(socket_path):
+            raise RuntimeError(f"Embedding service already running → {socket_path}")
+        os.remove(socket_path)
+
+    backend = use_local_backend()
+    backend.encode(["warm up"])
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(socket_path, _EmbeddingRequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    server.backend = backend
+    return server
+
+
+def serve(socket_path=EMBED_SOCKET_PATH):
+    server = create_server(socket_path)
+    print(f"🔌 Embedding service ({server.backend.model_id}) listening → {socket_path}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping embedding service...")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve SEFS embeddings over a Unix domain socket.")
+    parser.add_argument("--socket", default=EMBED_SOCKET_PATH)
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
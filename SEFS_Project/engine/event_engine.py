@@ -3,17 +3,64 @@ import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
-from core.config import ROOT_FOLDER, SUPPORTED_TYPES
+from core.config import (
+    ROOT_FOLDER,
+    SUPPORTED_TYPES,
+    EMBEDDING_MODEL_ID,
+    BULK_BATCH_SIZE,
+    BOOTSTRAP_HASH_WORKERS,
+    BOOTSTRAP_EXTRACT_WORKERS,
+    BOOTSTRAP_QUEUE_SIZE,
+    PDF_TIMEOUT,
+    EXTRACT_KILL_GRACE,
+    EVENT_DEBOUNCE,
+    EVENT_WORKERS,
+    REBUILD_DEBOUNCE
+)
 from core.db_api import (
-    register_or_update_file,
+    generate_file_id,
+    compute_file_hash,
+    hash_algorithm_of,
+    file_signature,
+    get_file_fingerprint,
+    update_file_fingerprint,
+    get_cached_embedding,
+    cache_embedding,
+    store_passages_bulk,
+    store_text_artifact,
+    store_text_artifacts_bulk,
+    get_files_missing_text,
+    index_file_texts,
+    quarantine_file,
+    is_quarantined,
+    transaction,
     save_file_embedding,
-    delete_file_record
+    delete_file_record,
+    register_files_bulk,
+    store_embeddings_bulk
+)
+
+from engine.content_engine import (
+    extract_text,
+    extract_document,
+    build_text_artifact,
+    ExtractionTimeout
+)
+from engine.semantic_engine import embed_document
+from engine.clustering_engine import (
+    update_file_cluster,
+    update_file_clusters_bulk,
+    remove_file_from_cluster,
+    needs_full_rebuild
 )
+from engine.system_controller import refresh_semantic_system
+from os_sync.folder_manager import is_own_move
+from engine.event_queue import CoalescingEventQueue
+from engine.ingest_pipeline import IngestPipeline, ExtractionPool
 
-from engine.content_engine import extract_text
-from engine.semantic_engine import generate_embedding
-from engine.clustering_engine import assign_cluster
-from engine.system_controller import rebuild_semantic_system
+
+# Hard limit for one file in the bootstrap's extraction processes
+EXTRACT_TIMEOUT = PDF_TIMEOUT + EXTRACT_KILL_GRACE if PDF_TIMEOUT else None
 
 
 # ---------------- FILE TYPE FILTER ----------------
@@ -40,83 +87,278 @@ def wait_for_file_ready(path, retries=5, delay=0.5):
 
 # ---------------- FILE PROCESSING ----------------
 
-def process_file(path):
+# Stat signature taken by check_file before hashing, per path, until the
+# file is registered with it (the next check then skips hashing)
+_checked_signatures = {}
+
+
+def read_file_content(path):
     """
-    Full semantic processing pipeline.
+    Wait until the file is readable and extract its text.
+    Returns None when there is nothing to embed.
     """
 
     if not wait_for_file_ready(path):
         print("→ File not ready")
-        return
+        return None
 
     print(f"→ Extracting content: {path}")
     text = extract_text(path)
 
     if not text:
         print("→ No readable content")
+        return None
+
+    return text
+
+
+def check_file(path):
+    """
+    Decide how much work a file needs, based on its content hash.
+
+    Returns (file_hash, embedding, needs_text):
+    - not readable → (None, None, False)
+    - unchanged since last indexed or quarantined → (hash, None, False);
+      when size, mtime and inode match the indexed file it is not even hashed
+    - identical content already embedded by this model → cached embedding
+    - otherwise → needs_text is True: extract and embed it
+    """
+
+    if not wait_for_file_ready(path):
+        print("→ File not ready")
+        return None, None, False
+
+    # Taken before hashing, so a write racing with the hash changes it again
+    signature = file_signature(path)
+    stored = get_file_fingerprint(path)
+
+    if stored and signature and stored[1] == signature:
+        print("→ Content unchanged, skipping")
+        return stored[0], None, False
+
+    file_hash = compute_file_hash(path)
+    if file_hash is None:
+        print("→ Could not read file")
+        return None, None, False
+
+    if stored and same_content(path, file_hash, stored[0]):
+        # Only the metadata changed; remember it so the next check skips hashing
+        update_file_fingerprint(path, file_hash, signature)
+        print("→ Content unchanged, skipping")
+        return file_hash, None, False
+
+    if is_quarantined(file_hash):
+        print("→ Quarantined, skipping")
+        return file_hash, None, False
+
+    _checked_signatures[path] = signature
+
+    embedding = get_cached_embedding(file_hash, EMBEDDING_MODEL_ID)
+    if embedding is not None:
+        print("→ Reusing embedding of identical content")
+        return file_hash, embedding, False
+
+    return file_hash, None, True
+
+
+def same_content(path, file_hash, stored_hash):
+    """
+    Compare a fresh hash with the indexed one. A file indexed under another
+    digest (e.g. MD5 before HASH_ALGORITHM changed) is re-hashed once with
+    that digest instead of being re-embedded.
+    """
+    if file_hash is None or stored_hash is None:
+        return False
+    if file_hash == stored_hash:
+        return True
+
+    algorithm = hash_algorithm_of(stored_hash)
+    if algorithm == hash_algorithm_of(file_hash):
+        return False
+    return compute_file_hash(path, algorithm) == stored_hash
+
+
+def prepare_file(path):
+    """
+    check_file() plus extraction. Returns (file_hash, embedding, text);
+    text is only set when the file still has to be embedded.
+    """
+
+    file_hash, embedding, needs_text = check_file(path)
+
+    if not needs_text:
+        return file_hash, embedding, None
+
+    try:
+        return file_hash, None, read_file_content(path)
+    except ExtractionTimeout as e:
+        quarantine_extraction(path, file_hash, e)
+        return file_hash, None, None
+
+
+def quarantine_extraction(path, file_hash, error):
+    """
+    Record content whose extraction timed out (ExtractionTimeout, or the
+    TimeoutError of an ExtractionPool that killed its process) so it is not
+    parsed again. Other extraction errors are left to be retried on the next event.
+    """
+    if not isinstance(error, TimeoutError):
         return
 
-    print("→ Generating embedding...")
-    embedding = generate_embedding(text)
+    print(f"→ Quarantined: {error}")
+    quarantine_file(file_hash, path, str(error))
+
+
+def process_file(path, rebuild=True):
+    """
+    Full semantic processing pipeline.
+    """
+
+    file_hash, embedding, text = prepare_file(path)
+
+    if embedding is None:
+        if text is None:
+            _checked_signatures.pop(path, None)
+            return
+
+        print("→ Generating embedding...")
+        embedding, passages = embed_document(text).result()
+        print(f"→ Embedded {len(passages)} passages")
+
+        with transaction():
+            cache_embedding(file_hash, EMBEDDING_MODEL_ID, embedding)
+            store_passages_bulk([(file_hash, passages)])
+            store_text_artifact(file_hash, build_text_artifact(text))
+
+    store_file_embedding(path, embedding, rebuild, file_hash, text)
+
+
+def store_file_embedding(path, embedding, rebuild=True, file_hash=None, text=None):
+    """
+    Register the file, assign its cluster, persist the embedding and index
+    its text (text None = copy it from a file with the same content).
+    """
+
+    signature = _checked_signatures.pop(path, None)
 
     if embedding is None:
         print("→ Embedding failed")
         return
 
-    print("→ Registering file...")
-    file_id = register_or_update_file(path)
+    file_id = generate_file_id(path)
 
-    print("→ Assigning cluster...")
-    cluster_id = assign_cluster(embedding)
+    # Cluster update, registration and embedding commit as one transaction
+    with transaction():
+        print("→ Assigning cluster...")
+        cluster_id = update_file_cluster(file_id, embedding)
 
-    print(f"→ Assigned cluster: {cluster_id}")
+        print(f"→ Assigned cluster: {cluster_id}")
 
-    save_file_embedding(path, embedding, cluster_id)
+        print("→ Registering file...")
+        save_file_embedding(path, embedding, cluster_id, file_hash, signature)
+        unindexed = index_file_texts([(file_id, path, file_hash, text)])
 
     print("→ Metadata stored")
 
-    # ⭐ Rebuild full semantic system
-    rebuild_semantic_system()
+    # Embedding came from the cache but no indexed file shares the content
+    if unindexed:
+        try:
+            index_file_texts([(file_id, path, file_hash, read_file_content(path) or "")])
+        except ExtractionTimeout as e:
+            quarantine_extraction(path, file_hash, e)
 
+    # ⭐ Sync semantic system (full rebuild only when clusters have drifted)
+    if rebuild:
+        refresh_semantic_system()
 
-def remove_file_record(path):
-    delete_file_record(path)
+
+def remove_file_record(path, rebuild=True):
+    with transaction():
+        remove_file_from_cluster(generate_file_id(path))
+        delete_file_record(path)
     print("→ Metadata removed")
 
-    rebuild_semantic_system()
+    if rebuild:
+        refresh_semantic_system()
+
+
+# ---------------- WATCHDOG HANDLER ----------------
+
+REBUILD_KEY = "__rebuild__"
+
+event_queue = CoalescingEventQueue(debounce=EVENT_DEBOUNCE, workers=EVENT_WORKERS)
 
 
-def update_file_path(old_path, new_path):
+def schedule_rebuild():
+    event_queue.submit(REBUILD_KEY, refresh_semantic_system, debounce=REBUILD_DEBOUNCE)
+
+
+def _then_rebuild(task):
     """
-    Rename = delete old + process new
+    Run task, then (re)arm the debounced rebuild so it follows the last change.
     """
-    delete_file_record(old_path)
-    process_file(new_path)
+    def run():
+        task()
+        schedule_rebuild()
+    return run
 
 
-# ---------------- WATCHDOG HANDLER ----------------
-
 class SEFSEventHandler(FileSystemEventHandler):
+    """
+    Watchdog callbacks only enqueue work, keyed by path; processing runs on
+    the event queue's worker threads so the observer thread never blocks.
+    """
+
+    def __init__(self, work_queue=event_queue):
+        super().__init__()
+        self.queue = work_queue
+
+    def _schedule_process(self, path):
+        self.queue.submit(path, _then_rebuild(lambda: process_file(path, rebuild=False)))
+
+    def _schedule_delete(self, path):
+        self.queue.submit(path, _then_rebuild(lambda: remove_file_record(path, rebuild=False)))
+
+    # Events caused by SEFS's own folder sync (already reflected in the
+    # database) are dropped; see os_sync.folder_manager.apply_moves
 
     def on_created(self, event):
         if not event.is_directory and is_supported_file(event.src_path):
+            if is_own_move(dest=event.src_path):
+                return
             print(f"[CREATED] {event.src_path}")
-            process_file(event.src_path)
+            self._schedule_process(event.src_path)
 
     def on_modified(self, event):
         if not event.is_directory and is_supported_file(event.src_path):
+            if is_own_move(dest=event.src_path, consume=False):
+                return
             print(f"[MODIFIED] {event.src_path}")
-            process_file(event.src_path)
+            self._schedule_process(event.src_path)
 
     def on_deleted(self, event):
         if not event.is_directory:
+            if is_own_move(src=event.src_path):
+                return
             print(f"[DELETED] {event.src_path}")
-            remove_file_record(event.src_path)
+            self._schedule_delete(event.src_path)
 
     def on_moved(self, event):
         if not event.is_directory:
+            if is_own_move(src=event.src_path, dest=event.dest_path):
+                return
+            # Rename = delete old + process new, each coalesced with its own path
             print(f"[RENAMED] {event.src_path} → {event.dest_path}")
-            update_file_path(event.src_path, event.dest_path)
+            self._schedule_delete(event.src_path)
+            if is_supported_file(event.dest_path):
+                self._schedule_process(event.dest_path)
+
+
+def get_event_queue_stats():
+    """
+    Queue depth, lag and counters of the live event pipeline.
+    """
+    return event_queue.stats()
 
 
 # ---------------- START MONITORING ----------------
@@ -126,35 +368,171 @@ def start_event_engine():
     observer = Observer()
     observer.schedule(event_handler, ROOT_FOLDER, recursive=True)
 
+    event_queue.start()
     observer.start()
     print("🧠 SEFS monitoring:", ROOT_FOLDER)
 
     try:
         while True:
             time.sleep(1)
+
+            # Scheduled full re-clustering when incremental changes have aged
+            if needs_full_rebuild() and not event_queue.depth():
+                schedule_rebuild()
     except KeyboardInterrupt:
         observer.stop()
 
     observer.join()
+    event_queue.stop()
 
 
 # ---------------- BOOTSTRAP ----------------
 
-def bootstrap_existing_files():
+def store_embeddings_batch(entries):
     """
-    Scan all existing files once at startup.
+    Bulk form of store_file_embedding for (path, file_hash, embedding) entries:
+    the batch is assigned to clusters in one pass over the in-memory
+    centroids, then FILES, SEMANTICS, FILE_CLUSTER_MAP and CLUSTERS are
+    written with executemany in one transaction.
     """
+    entries = [entry for entry in entries if entry[2] is not None]
+    if not entries:
+        return
 
-    print("📂 Scanning existing files...")
+    with transaction():
+        file_ids = [generate_file_id(path) for path, _, _ in entries]
+
+        # Must run before the new embeddings replace the stored ones
+        update_file_clusters_bulk(
+            (file_id, embedding) for file_id, (_, _, embedding) in zip(file_ids, entries)
+        )
 
-    for root, dirs, files in os.walk(ROOT_FOLDER):
+        register_files_bulk(
+            (path, file_hash, _checked_signatures.pop(path, None)) for path, file_hash, _ in entries
+        )
+        store_embeddings_bulk(
+            (file_id, embedding) for file_id, (_, _, embedding) in zip(file_ids, entries)
+        )
+
+    print(f"→ Stored {len(entries)} files")
+
+
+def iter_supported_files(root=ROOT_FOLDER):
+    for root_dir, dirs, files in os.walk(root):
         for file in files:
-            file_path = os.path.join(root, file)
+            file_path = os.path.join(root_dir, file)
+
+            if is_supported_file(file_path):
+                print(f"[BOOTSTRAP] {file_path}")
+                yield file_path
+
+
+def write_bootstrap_batch(entries, new_content):
+    """
+    Writer stage of the bootstrap pipeline: cache freshly computed
+    embeddings, passages and text artifacts, store the batch and index its
+    text, all in one transaction.
+    """
+    with transaction():
+        for file_hash, (_, embedding, _, _) in new_content.items():
+            cache_embedding(file_hash, EMBEDDING_MODEL_ID, embedding)
+        store_passages_bulk(
+            (file_hash, passages) for file_hash, (_, _, passages, _) in new_content.items()
+        )
+        store_text_artifacts_bulk(
+            (file_hash, artifact) for file_hash, (_, _, _, artifact) in new_content.items()
+        )
+        store_embeddings_batch(entries)
+
+        # Copies of content extracted in an earlier batch copy its indexed text
+        index_file_texts(
+            (generate_file_id(path), path, file_hash,
+             new_content[file_hash][0] if file_hash in new_content else None)
+            for path, file_hash, embedding in entries
+            if embedding is not None
+        )
+
+
+def backfill_text_index():
+    """
+    Build text artifacts and full-text index rows for files indexed before
+    those existed, so naming and search never have to read them again.
+    Each distinct content is extracted once.
+    """
+    missing = get_files_missing_text()
+    if not missing:
+        return
+
+    print(f"📝 Indexing text of {len(missing)} previously indexed files...")
+
+    # content hash -> one path to extract it from
+    sources = {}
+    for _, path, file_hash, _, _ in missing:
+        sources.setdefault(file_hash, path)
+
+    extracted = {}
+    pending = list(sources.items())
+    workers = BOOTSTRAP_EXTRACT_WORKERS or os.cpu_count() or 1
+
+    with ExtractionPool(extract_document, workers, EXTRACT_TIMEOUT) as pool:
+        while pending or len(pool):
+            while pending and not pool.full:
+                file_hash, path = pending.pop()
+                pool.submit(file_hash, path)
+
+            for file_hash, path, result, error in pool.wait():
+                if error is not None:
+                    print(f"[ERROR] Extraction failed for {path}: {error}")
+                    quarantine_extraction(path, file_hash, error)
+                    continue
+                # Files without text get an empty artifact so they are not retried
+                extracted[file_hash] = result or ("", build_text_artifact(""))
+
+    needs_artifact = {file_hash for _, _, file_hash, missing_artifact, _ in missing if missing_artifact}
+
+    with transaction():
+        store_text_artifacts_bulk(
+            (file_hash, extracted[file_hash][1])
+            for file_hash in needs_artifact if file_hash in extracted
+        )
+        index_file_texts(
+            (file_id, path, file_hash, extracted[file_hash][0])
+            for file_id, path, file_hash, _, needs_index in missing
+            if needs_index and file_hash in extracted
+        )
 
-            if not is_supported_file(file_path):
-                continue
 
-            print(f"[BOOTSTRAP] {file_path}")
-            process_file(file_path)
+def bootstrap_existing_files():
+    """
+    Scan all existing files once at startup.
+
+    Runs as a staged pipeline (see engine/ingest_pipeline.py) so hashing,
+    PDF parsing, model inference and database writes overlap. Files whose
+    content hash is already indexed are skipped, and duplicates share one
+    embedding. The caller rebuilds clusters once afterwards instead of
+    after every file.
+    """
+
+    print("📂 Scanning existing files...")
 
+    pipeline = IngestPipeline(
+        iter_supported_files(),
+        check=check_file,
+        extract=extract_document,
+        embed=embed_document,
+        write=write_bootstrap_batch,
+        on_error=quarantine_extraction,
+        hash_workers=BOOTSTRAP_HASH_WORKERS,
+        extract_workers=BOOTSTRAP_EXTRACT_WORKERS,
+        queue_size=BOOTSTRAP_QUEUE_SIZE,
+        write_batch=BULK_BATCH_SIZE,
+        extract_timeout=EXTRACT_TIMEOUT
+    )
+    pipeline.run()
+    # Left over only by files that failed before being registered
+    _checked_signatures.clear()
+
+    print(pipeline.report())
+
+    backfill_text_index()
     print("✅ Initial scan complete")
@@ -0,0 +1,148 @@
+import time
+import threading
+
+
+class CoalescingEventQueue:
+    """
+    Debounced work queue between watchdog callbacks and the processing pipeline.
+
+    Work is submitted under a key (normally the file path). Submitting again
+    for a key that has not started yet replaces the pending task and restarts
+    its debounce window, so a burst of on_modified events collapses into one
+    run and modify-then-delete only runs the delete. A key never runs on two
+    workers at once; work submitted while it runs waits for it to finish.
+    """
+
+    def __init__(self, debounce=0.5, workers=2):
+        self.debounce = debounce
+        self.worker_count = workers
+
+        self._pending = {}          # key -> [task, due, first_seen]
+        self._running = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+        self.processed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.last_lag = 0.0
+
+    # ---------------- PRODUCERS ----------------
+
+    def submit(self, key, task, debounce=None):
+        """
+        Schedule task() to run once key has been quiet for the debounce window.
+        """
+        now = time.monotonic()
+        due = now + (self.debounce if debounce is None else debounce)
+
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is not None:
+                # Superseded: keep the first-seen time so lag stays honest
+                entry[0], entry[1] = task, due
+                self.coalesced += 1
+            else:
+                self._pending[key] = [task, due, now]
+            self._cond.notify()
+
+    # ---------------- WORKERS ----------------
+
+    def start(self):
+        with self._cond:
+            self._stopped = False
+        for i in range(self.worker_count):
+            thread = threading.Thread(target=self._work, name=f"sefs-event-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _take_ready(self):
+        """
+        Pop the earliest due task whose key is idle, or return how long to wait.
+        """
+        now = time.monotonic()
+        ready_key = None
+        wait = None
+
+        for key, (_, due, _) in self._pending.items():
+            if key in self._running:
+                continue
+            if due <= now:
+                if ready_key is None or due < self._pending[ready_key][1]:
+                    ready_key = key
+            elif wait is None or due - now < wait:
+                wait = due - now
+
+        if ready_key is None:
+            return None, wait
+
+        task, _, first_seen = self._pending.pop(ready_key)
+        self._running.add(ready_key)
+        self.last_lag = now - first_seen
+        return (ready_key, task), None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    item, wait = self._take_ready()
+                    if item is not None:
+                        break
+                    self._cond.wait(wait)
+
+            key, task = item
+            try:
+                task()
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR] Event task failed for {key}: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(key)
+                    self.processed += 1
+                    self._cond.notify_all()
+
+    # ---------------- METRICS ----------------
+
+    def depth(self):
+        """
+        Tasks waiting (debouncing or ready) plus tasks currently running.
+        """
+        with self._cond:
+            return len(self._pending) + len(self._running)
+
+    def lag(self):
+        """
+        Seconds the oldest waiting event has been queued.
+        """
+        with self._cond:
+            if not self._pending:
+                return 0.0
+            oldest = min(first_seen for _, _, first_seen in self._pending.values())
+            return time.monotonic() - oldest
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+            running = len(self._running)
+        return {
+            "pending": pending,
+            "running": running,
+            "lag": self.lag(),
+            "last_lag": self.last_lag,
+            "processed": self.processed,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
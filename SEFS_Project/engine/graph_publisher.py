@@ -0,0 +1,476 @@
+# engine/graph_publisher.py
+"""
+Live semantic graph.
+
+Rebuilds hand their adjacency (or the files that changed) to the publisher
+instead of rendering HTML. At most once per GRAPH_MIN_INTERVAL seconds it
+diffs the graph against the last published one and writes, under
+GRAPH_OUTPUT_DIR:
+
+    latest.json          {"version": v, "snapshot": s}
+    graph.json           full graph at version s
+    deltas/<v>.json      changes from version v-1 to v
+    index.html           page that loads graph.json, then polls latest.json
+                         and applies the deltas it has not seen
+
+Browsers do not fetch files from file:// pages, so the directory is served
+over HTTP (serve_graph / open_graph_page).
+"""
+
+import os
+import json
+import time
+import shutil
+import threading
+import webbrowser
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from core.config import (
+    GRAPH_OUTPUT_DIR,
+    GRAPH_THRESHOLD,
+    GRAPH_MIN_INTERVAL,
+    GRAPH_SNAPSHOT_EVERY,
+    GRAPH_PORT,
+    GRAPH_POLL_SECONDS
+)
+from core.db_api import (
+    open_embedding_reader,
+    get_embeddings_by_id,
+    get_file_paths,
+    get_file_cluster_map,
+    get_text_artifacts
+)
+from engine.semantic_engine import build_semantic_space, node_tooltip
+from engine.similarity_engine import neighbors_above
+
+
+# Vendored vis-network build (also used by the pyvis pages through lib/)
+VIS_NETWORK_JS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "lib", "vis-9.1.2", "vis-network.min.js"
+)
+
+
+def _edge_key(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+def _write_json(path, data):
+    """
+    Write through a temporary file, so the page never reads half a file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _diff(old, new):
+    """
+    Returns (added, updated, removed) keys between two dicts.
+    """
+    added = [key for key in new if key not in old]
+    updated = [key for key in new if key in old and old[key] != new[key]]
+    removed = [key for key in old if key not in new]
+    return added, updated, removed
+
+
+# ---------------- PUBLISHER ----------------
+
+class GraphPublisher:
+    """
+    Rate-limited writer of graph versions.
+
+    request() only records what changed; the work happens in flush(),
+    immediately when the last publish is older than min_interval and
+    otherwise on a timer at the end of the interval, so a burst of
+    rebuilds produces one version.
+    """
+
+    def __init__(self, output_dir=GRAPH_OUTPUT_DIR, threshold=GRAPH_THRESHOLD,
+                 min_interval=GRAPH_MIN_INTERVAL, snapshot_every=GRAPH_SNAPSHOT_EVERY):
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.snapshot_every = snapshot_every
+
+        self._lock = threading.Lock()           # pending work and timer
+        self._publish_lock = threading.Lock()   # one flush at a time
+        self._pending = False
+        self._pending_adjacency = None
+        self._pending_changed = set()
+        self._timer = None
+        self._last_publish = None
+
+        # Last published graph; None until this process publishes once
+        self.nodes = None                       # file_id -> node dict
+        self.edges = {}                         # (a, b) with a < b -> similarity
+        self.version = 0
+        self.snapshot_version = 0
+
+    # ---------------- SCHEDULING ----------------
+
+    def request(self, adjacency=None, changed=(), force=False):
+        """
+        Queue a publish: a full adjacency from build_semantic_space() and/or
+        the ids of files whose embedding or cluster changed.
+        """
+        with self._lock:
+            if adjacency is not None:
+                self._pending_adjacency = adjacency
+            self._pending_changed.update(changed)
+            self._pending = True
+
+            if not force:
+                if self._timer is not None:
+                    return
+                if self._last_publish is not None:
+                    wait = self._last_publish + self.min_interval - time.monotonic()
+                    if wait > 0:
+                        self._timer = threading.Timer(wait, self.flush)
+                        self._timer.daemon = True
+                        self._timer.start()
+                        return
+
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            adjacency, changed = self._pending_adjacency, self._pending_changed
+            self._pending, self._pending_adjacency, self._pending_changed = False, None, set()
+            self._last_publish = time.monotonic()
+
+        with self._publish_lock:
+            try:
+                self._publish(adjacency, changed)
+            except Exception as e:
+                print(f"[ERROR] Graph publish failed: {e}")
+
+    # ---------------- GRAPH STATE ----------------
+
+    def _node(self, file_id, path, cluster_id, artifact):
+        label = os.path.basename(path) if path else file_id
+        return {
+            "id": file_id,
+            "label": label,
+            "title": node_tooltip(path or label, artifact),
+            "group": cluster_id
+        }
+
+    def _full_graph(self, adjacency, clusters):
+        file_ids = list(adjacency.file_ids)
+        paths = get_file_paths(file_ids)
+        artifacts = get_text_artifacts(file_ids)
+
+        nodes = {
+            fid: self._node(fid, paths.get(fid), clusters.get(fid), artifacts.get(fid))
+            for fid in file_ids
+        }
+        edges = {}
+        for fid, neighbors in adjacency.items():
+            for neighbor_id, sim in neighbors:
+                edges[_edge_key(fid, neighbor_id)] = round(float(sim), 4)
+
+        return nodes, edges
+
+    def _apply_changes(self, nodes, edges, changed, clusters):
+        """
+        Update nodes and edges in place for changed files, files clustered
+        since the last publish and files that are gone. Only those files'
+        neighbours are recomputed, in one scan of the embeddings.
+        """
+        removed = [fid for fid in nodes if fid not in clusters]
+        touched = {fid for fid in changed if fid in clusters}
+        touched.update(fid for fid in clusters if fid not in nodes)
+
+        for fid in removed:
+            del nodes[fid]
+        gone = set(removed) | touched
+        for key in [key for key in edges if key[0] in gone or key[1] in gone]:
+            del edges[key]
+
+        if not touched:
+            return
+
+        vectors = get_embeddings_by_id(touched)
+        paths = get_file_paths(touched)
+        artifacts = get_text_artifacts(touched)
+
+        for fid in touched:
+            nodes[fid] = self._node(fid, paths.get(fid), clusters.get(fid), artifacts.get(fid))
+
+        neighbors = neighbors_above(open_embedding_reader(), vectors, self.threshold)
+        for fid, pairs in neighbors.items():
+            for neighbor_id, sim in pairs:
+                if neighbor_id in clusters:
+                    edges[_edge_key(fid, neighbor_id)] = round(sim, 4)
+
+    # ---------------- OUTPUT ----------------
+
+    def _publish(self, adjacency, changed):
+        clusters = get_file_cluster_map()
+
+        if adjacency is None and self.nodes is None:
+            adjacency = build_semantic_space(self.threshold)
+
+        if adjacency is not None:
+            nodes, edges = self._full_graph(adjacency, clusters)
+        else:
+            nodes, edges = dict(self.nodes), dict(self.edges)
+
+        self._apply_changes(nodes, edges, changed, clusters)
+
+        deltas_dir = os.path.join(self.output_dir, "deltas")
+        os.makedirs(deltas_dir, exist_ok=True)
+
+        if self.nodes is None:
+            self._start(nodes, edges, deltas_dir)
+            return
+
+        added_nodes, updated_nodes, removed_nodes = _diff(self.nodes, nodes)
+        added_edges, updated_edges, removed_edges = _diff(self.edges, edges)
+        if not (added_nodes or updated_nodes or removed_nodes or added_edges or updated_edges or removed_edges):
+            return
+
+        self.version += 1
+        _write_json(os.path.join(deltas_dir, f"{self.version}.json"), {
+            "version": self.version,
+            "nodes": {
+                "add": [nodes[fid] for fid in added_nodes],
+                "update": [nodes[fid] for fid in updated_nodes],
+                "remove": removed_nodes
+            },
+            "edges": {
+                "add": [[a, b, edges[(a, b)]] for a, b in added_edges],
+                "update": [[a, b, edges[(a, b)]] for a, b in updated_edges],
+                "remove": [[a, b] for a, b in removed_edges]
+            }
+        })
+        self.nodes, self.edges = nodes, edges
+
+        if self.version - self.snapshot_version >= self.snapshot_every:
+            self._write_snapshot(deltas_dir)
+        else:
+            self._write_latest()
+
+        print(f"🕸 Graph v{self.version}: +{len(added_nodes)} ~{len(updated_nodes)} -{len(removed_nodes)} files, "
+              f"+{len(added_edges)} ~{len(updated_edges)} -{len(removed_edges)} links")
+
+    def _start(self, nodes, edges, deltas_dir):
+        """
+        First publish in this process: continue the version sequence on
+        disk (so open pages notice) from a fresh snapshot.
+        """
+        try:
+            with open(os.path.join(self.output_dir, "latest.json"), encoding="utf-8") as f:
+                self.version = json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            self.version = 0
+
+        self.version += 1
+        self.nodes, self.edges = nodes, edges
+        self._write_snapshot(deltas_dir)
+        _write_page(self.output_dir)
+
+        print(f"🕸 Graph v{self.version}: {len(nodes)} files, {len(edges)} links → {self.output_dir}")
+
+    def _write_snapshot(self, deltas_dir):
+        _write_json(os.path.join(self.output_dir, "graph.json"), {
+            "version": self.version,
+            "nodes": list(self.nodes.values()),
+            "edges": [[a, b, sim] for (a, b), sim in self.edges.items()]
+        })
+        self.snapshot_version = self.version
+        self._write_latest()
+
+        # Pages older than the snapshot reload it instead of replaying deltas
+        for name in os.listdir(deltas_dir):
+            stem = name.split(".", 1)[0]
+            if stem.isdigit() and int(stem) <= self.version:
+                os.remove(os.path.join(deltas_dir, name))
+
+    def _write_latest(self):
+        _write_json(os.path.join(self.output_dir, "latest.json"), {
+            "version": self.version,
+            "snapshot": self.snapshot_version
+        })
+
+
+_publisher = GraphPublisher()
+
+
+def request_graph_update(adjacency=None, changed=()):
+    """
+    Rate-limited publish; see GraphPublisher.request.
+    """
+    _publisher.request(adjacency, changed)
+
+
+def publish_graph(adjacency=None):
+    """
+    Publish now, ignoring the rate limit.
+    """
+    _publisher.request(adjacency, force=True)
+
+
+# ---------------- PAGE ----------------
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SEFS Semantic Graph</title>
+<script src="vis-network.min.js"></script>
+<style>
+  html, body { margin: 0; height: 100%; background: #111111; color: white; font-family: sans-serif; }
+  #graph { position: absolute; top: 0; bottom: 0; width: 100%; }
+  #status { position: absolute; top: 8px; left: 12px; z-index: 1; font-size: 12px; opacity: 0.7; }
+</style>
+</head>
+<body>
+<div id="status">loading…</div>
+<div id="graph"></div>
+<script>
+const POLL_MS = __POLL_MS__;
+const nodes = new vis.DataSet();
+const edges = new vis.DataSet();
+new vis.Network(document.getElementById("graph"), { nodes, edges }, {
+  nodes: { shape: "dot", size: 10, font: { color: "white" } },
+  edges: { color: { opacity: 0.5 }, scaling: { min: 1, max: 5 } },
+  physics: { stabilization: { iterations: 200 } }
+});
+let version = null;
+
+function edge([a, b, sim]) {
+  return { id: a + "|" + b, from: a, to: b, value: sim, title: "Similarity: " + sim.toFixed(2) };
+}
+
+async function getJSON(path) {
+  const response = await fetch(path, { cache: "no-store" });
+  if (!response.ok) throw new Error(path + ": " + response.status);
+  return response.json();
+}
+
+async function loadSnapshot() {
+  const graph = await getJSON("graph.json");
+  nodes.clear();
+  edges.clear();
+  nodes.add(graph.nodes);
+  edges.add(graph.edges.map(edge));
+  version = graph.version;
+}
+
+function applyDelta(delta) {
+  nodes.remove(delta.nodes.remove);
+  nodes.update(delta.nodes.add.concat(delta.nodes.update));
+  edges.remove(delta.edges.remove.map(([a, b]) => a + "|" + b));
+  edges.update(delta.edges.add.concat(delta.edges.update).map(edge));
+  version = delta.version;
+}
+
+async function poll() {
+  try {
+    const latest = await getJSON("latest.json");
+    if (version === null || version < latest.snapshot || version > latest.version) {
+      await loadSnapshot();
+    }
+    while (version < latest.version) {
+      let delta;
+      try {
+        delta = await getJSON("deltas/" + (version + 1) + ".json");
+      } catch (e) {
+        await loadSnapshot();
+        break;
+      }
+      applyDelta(delta);
+    }
+    document.getElementById("status").textContent =
+      "v" + version + " · " + nodes.length + " files · " + edges.length + " links";
+  } catch (e) {
+    document.getElementById("status").textContent = "offline: " + e.message;
+  }
+  setTimeout(poll, POLL_MS);
+}
+
+poll();
+</script>
+</body>
+</html>
+"""
+
+
+def copy_script(source, output_dir):
+    """
+    Copy a vendored script next to a generated page: pages are served from
+    their own directory and cannot load lib/ or a CDN offline. Skipped when
+    the copy is current. Returns the script's file name.
+    """
+    name = os.path.basename(source)
+    target = os.path.join(output_dir, name)
+
+    src_stat = os.stat(source)
+    try:
+        dst_stat = os.stat(target)
+        if (dst_stat.st_size, dst_stat.st_mtime_ns) == (src_stat.st_size, src_stat.st_mtime_ns):
+            return name
+    except OSError:
+        pass
+
+    shutil.copy2(source, target + ".tmp")
+    os.replace(target + ".tmp", target)
+    return name
+
+
+def _write_page(output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    copy_script(VIS_NETWORK_JS, output_dir)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(_PAGE.replace("__POLL_MS__", str(int(GRAPH_POLL_SECONDS * 1000))))
+
+
+_server = None
+
+
+def serve_graph(output_dir=GRAPH_OUTPUT_DIR, port=GRAPH_PORT, page="index.html"):
+    """
+    Serve the graph directory on localhost in a background thread
+    (once per process). Returns the URL of page, relative to that directory,
+    or None when no port could be opened. If port is taken (say, by another
+    SEFS process) a free port is used instead.
+    """
+    global _server
+    if _server is None:
+        os.makedirs(output_dir, exist_ok=True)
+        _write_page(output_dir)
+
+        class QuietHandler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        handler = functools.partial(QuietHandler, directory=os.path.abspath(output_dir))
+        try:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        except OSError as e:
+            print(f"[ERROR] Graph port {port} unavailable ({e}), using a free port")
+            try:
+                _server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            except OSError as e:
+                print(f"[ERROR] Live graph page not served: {e}")
+                return None
+        threading.Thread(target=_server.serve_forever, name="sefs-graph-server", daemon=True).start()
+
+    return f"http://127.0.0.1:{_server.server_address[1]}/{page}"
+
+
+def open_graph_page():
+    url = serve_graph()
+    if url is None:
+        return None
+    webbrowser.open(url)
+    print(f"🌐 Live semantic graph → {url}")
+    return url
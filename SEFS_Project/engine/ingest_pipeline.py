@@ -0,0 +1,444 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+# ---------------- STAGE METRICS ----------------
+
+class StageStats:
+    """
+    Items a stage finished and the time spent working on them (summed
+    across its workers, so it can exceed wall time). For the embed stage
+    it is the time spent blocked waiting for the model.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, items=1):
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+
+    def report(self, elapsed):
+        rate = self.items / elapsed if elapsed else 0.0
+        return f"{self.name:<8} {self.items:>8} items {rate:>9.1f}/s   busy {self.busy:7.2f}s"
+
+
+# ---------------- EXTRACTION POOL ----------------
+
+def terminate_workers(pool):
+    """
+    Kill a ProcessPoolExecutor's processes, stuck tasks included, and shut
+    it down without waiting for them.
+    """
+    terminate = getattr(pool, "terminate_workers", None)     # Python 3.14+
+    if terminate is not None:
+        terminate()
+    else:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ExtractionPool:
+    """
+    Runs extract(path) in worker processes with a hard wall-clock limit.
+
+    At most one task per worker is in flight, so a task starts when it is
+    submitted. One still running `timeout` seconds later is reported as a
+    TimeoutError and the pool is recycled: every worker process is
+    terminated (the stuck one with them) and the other running tasks are
+    resubmitted to a fresh pool. A worker that dies recycles the pool too.
+    """
+
+    def __init__(self, extract, workers, timeout=None):
+        self.extract = extract
+        self.workers = workers
+        self.timeout = timeout
+        self.recycled = 0
+        self._pool = None
+        self._running = {}          # future -> (key, path, submitted)
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        # Leaving with tasks still running (an error upstream): do not wait on them
+        if self._running:
+            terminate_workers(self._pool)
+        else:
+            self._pool.shutdown()
+        self._running = {}
+
+    def __len__(self):
+        return len(self._running)
+
+    @property
+    def full(self):
+        return len(self._running) >= self.workers
+
+    def submit(self, key, path):
+        self._running[self._pool.submit(self.extract, path)] = (key, path, time.monotonic())
+
+    def wait(self, timeout=0.05):
+        """
+        Wait up to timeout seconds for tasks to finish. Returns
+        [(key, path, result, error)] for every finished or timed-out task;
+        error is None on success.
+        """
+        done = []
+        if not self._running:
+            return done
+
+        finished, _ = wait(list(self._running), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in finished:
+            key, path, _ = self._running.pop(future)
+            try:
+                done.append((key, path, future.result(), None))
+            except BrokenProcessPool as e:
+                broken = True
+                done.append((key, path, None, e))
+            except Exception as e:
+                done.append((key, path, None, e))
+
+        if self.timeout:
+            now = time.monotonic()
+            expired = [
+                future for future, (_, _, submitted) in self._running.items()
+                if now - submitted > self.timeout
+            ]
+            for future in expired:
+                key, path, _ = self._running.pop(future)
+                done.append((key, path, None, TimeoutError(f"Extraction exceeded {self.timeout}s: {path}")))
+            broken = broken or bool(expired)
+
+        if broken:
+            self._recycle()
+
+        return done
+
+    def _recycle(self):
+        terminate_workers(self._pool)
+        self._pool = ProcessPoolExecutor(self.workers)
+        self.recycled += 1
+
+        survivors = list(self._running.values())
+        self._running = {}
+        for key, path, _ in survivors:
+            self.submit(key, path)
+
+
+# ---------------- PIPELINE ----------------
+
+class IngestPipeline:
+    """
+    Staged producer/consumer pipeline for ingesting many files at once:
+
+        scan → hash (threads) → extract (processes) → embed (batched) → write (one thread)
+
+    Stages are joined by bounded queues, so a slow stage blocks the stages
+    feeding it instead of letting work pile up in memory. The stage work is
+    supplied by the caller:
+
+        check(path)           -> (file_hash, cached embedding or None, needs_text);
+                                 file_hash None means the file could not be read
+        extract(path)         -> (text, artifact) or None; runs in a worker
+                                 process, so it must be a picklable
+                                 module-level function
+        embed(text)           -> Future of (embedding, passages)
+        write(entries, new)   -> persist [(path, file_hash, embedding), ...] and
+                                 {file_hash: (text, embedding, passages, artifact)}
+                                 for content extracted in this run
+        on_error(path, file_hash, exc)
+                              -> optional; called when extraction raised, or
+                                 with a TimeoutError when it ran longer than
+                                 extract_timeout seconds (its process is killed)
+
+    Files with identical content are extracted and embedded once; the other
+    copies are written with the same embedding.
+    """
+
+    def __init__(self, paths, check, extract, embed, write, on_error=None,
+                 hash_workers=4, extract_workers=None, queue_size=256, write_batch=2000,
+                 extract_timeout=None):
+        self.paths = paths
+        self.check = check
+        self.extract = extract
+        self.embed = embed
+        self.write = write
+        self.on_error = on_error
+
+        self.hash_workers = hash_workers
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.write_batch = write_batch
+        self.extract_timeout = extract_timeout
+
+        self._hash_q = queue.Queue(queue_size)
+        self._extract_q = queue.Queue(queue_size)
+        self._embed_q = queue.Queue(queue_size)
+        self._write_q = queue.Queue(queue_size)
+
+        # content hash -> other paths waiting for the embedding of that content
+        self._followers = {}
+        self._followers_lock = threading.Lock()
+
+        self.stats = {
+            name: StageStats(name)
+            for name in ("scan", "hash", "extract", "embed", "write")
+        }
+        self.skipped = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self._count_lock = threading.Lock()
+
+    # ---------------- RUN ----------------
+
+    def run(self):
+        """
+        Run every stage to completion. Returns self.stats.
+        """
+        started = time.monotonic()
+
+        stages = [
+            threading.Thread(target=self._scan, name="sefs-ingest-scan"),
+            threading.Thread(target=self._hash_stage, name="sefs-ingest-hash"),
+            threading.Thread(target=self._extract_stage, name="sefs-ingest-extract"),
+            threading.Thread(target=self._embed_stage, name="sefs-ingest-embed"),
+            threading.Thread(target=self._write_stage, name="sefs-ingest-write"),
+        ]
+        for thread in stages:
+            thread.daemon = True
+            thread.start()
+        for thread in stages:
+            thread.join()
+
+        self.elapsed = time.monotonic() - started
+        return self.stats
+
+    def report(self):
+        lines = [f"📊 Ingest: {self.stats['write'].items} files stored, "
+                 f"{self.skipped} unchanged, {self.failed} failed in {self.elapsed:.1f}s"]
+        lines += ["   " + stats.report(self.elapsed) for stats in self.stats.values()]
+        return "\n".join(lines)
+
+    def _count(self, attr, n=1):
+        with self._count_lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    # ---------------- STAGES ----------------
+
+    def _scan(self):
+        stats = self.stats["scan"]
+        last = time.monotonic()
+
+        try:
+            for path in self.paths:
+                now = time.monotonic()
+                stats.record(now - last)
+                self._hash_q.put(path)
+                last = time.monotonic()
+        finally:
+            self._hash_q.put(_DONE)
+
+    def _hash_stage(self):
+        stats = self.stats["hash"]
+
+        def handle(path):
+            started = time.monotonic()
+            try:
+                file_hash, embedding, needs_text = self.check(path)
+            except Exception as e:
+                print(f"[ERROR] Hashing failed for {path}: {e}")
+                self._count("failed")
+                return
+            finally:
+                stats.record(time.monotonic() - started)
+
+            # Without a hash there is no content to share or compare
+            if file_hash is None and (embedding is not None or needs_text):
+                print(f"[ERROR] No content hash for {path}")
+                self._count("failed")
+            elif embedding is not None:
+                self._write_q.put((path, file_hash, embedding, None))
+            elif not needs_text:
+                self._count("failed" if file_hash is None else "skipped")
+            elif self._follow(file_hash, path):
+                self._extract_q.put((path, file_hash))
+
+        # The bounded semaphore keeps at most 2x workers paths in flight,
+        # so scanning cannot run ahead of hashing
+        slots = threading.BoundedSemaphore(2 * self.hash_workers)
+
+        def release(_):
+            slots.release()
+
+        try:
+            with ThreadPoolExecutor(self.hash_workers, thread_name_prefix="sefs-ingest-hash") as pool:
+                while True:
+                    path = self._hash_q.get()
+                    if path is _DONE:
+                        break
+                    slots.acquire()
+                    pool.submit(handle, path).add_done_callback(release)
+        finally:
+            self._extract_q.put(_DONE)
+
+    def _follow(self, file_hash, path):
+        """
+        True if path is the first in-flight copy of its content (the leader).
+        """
+        with self._followers_lock:
+            if file_hash in self._followers:
+                self._followers[file_hash].append(path)
+                return False
+            self._followers[file_hash] = []
+            return True
+
+    def _release_followers(self, file_hash):
+        with self._followers_lock:
+            return self._followers.pop(file_hash, [])
+
+    def _extract_stage(self):
+        stats = self.stats["extract"]
+        input_done = False
+
+        try:
+            with ExtractionPool(self.extract, self.extract_workers, self.extract_timeout) as pool:
+                while not input_done or len(pool):
+                    # One file per worker process, so each one's deadline starts when it runs
+                    while not input_done and not pool.full:
+                        try:
+                            item = self._extract_q.get(timeout=0.05 if len(pool) else None)
+                        except queue.Empty:
+                            break
+                        if item is _DONE:
+                            input_done = True
+                            break
+                        path, file_hash = item
+                        pool.submit((file_hash, time.monotonic()), path)
+
+                    for (file_hash, started), path, extracted, error in pool.wait(0.05):
+                        stats.record(time.monotonic() - started)
+
+                        if error is not None:
+                            print(f"[ERROR] Extraction failed for {path}: {error}")
+                            if self.on_error is not None:
+                                try:
+                                    self.on_error(path, file_hash, error)
+                                except Exception as handler_error:
+                                    print(f"[ERROR] Error handler failed for {path}: {handler_error}")
+
+                        if not extracted:
+                            self._count("failed", 1 + len(self._release_followers(file_hash)))
+                            continue
+
+                        text, artifact = extracted
+                        self._embed_q.put((path, file_hash, text, artifact))
+        finally:
+            self._embed_q.put(_DONE)
+
+    def _embed_stage(self):
+        stats = self.stats["embed"]
+        pending = deque()           # (path, file_hash, text, artifact, future) in submit order
+        input_done = False
+
+        def emit_oldest():
+            path, file_hash, text, artifact, future = pending.popleft()
+            started = time.monotonic()
+            try:
+                embedding, passages = future.result()
+            except Exception as e:
+                print(f"[ERROR] Embedding failed for {path}: {e}")
+                embedding, passages = None, []
+            stats.record(time.monotonic() - started)
+
+            followers = self._release_followers(file_hash)
+            if embedding is None:
+                self._count("failed", 1 + len(followers))
+                return
+
+            self._write_q.put((path, file_hash, embedding, (text, embedding, passages, artifact)))
+            for follower in followers:
+                self._write_q.put((follower, file_hash, embedding, None))
+
+        try:
+            while not input_done or pending:
+                while pending and pending[0][4].done():
+                    emit_oldest()
+
+                if input_done:
+                    if pending:
+                        emit_oldest()
+                    continue
+
+                try:
+                    item = self._embed_q.get(timeout=0.05 if pending else None)
+                except queue.Empty:
+                    continue
+
+                if item is _DONE:
+                    input_done = True
+                    continue
+
+                path, file_hash, text, artifact = item
+                pending.append((path, file_hash, text, artifact, self.embed(text)))
+
+                # Enough texts queued on the model; wait before taking more
+                if len(pending) >= self.queue_size:
+                    emit_oldest()
+        finally:
+            self._write_q.put(_DONE)
+
+    def _write_stage(self):
+        stats = self.stats["write"]
+        entries = []
+        new_content = {}
+
+        def flush():
+            if not entries:
+                return
+            started = time.monotonic()
+            try:
+                self.write(list(entries), dict(new_content))
+                stats.record(time.monotonic() - started, len(entries))
+            except Exception as e:
+                print(f"[ERROR] Writing {len(entries)} files failed: {e}")
+                self._count("failed", len(entries))
+            entries.clear()
+            new_content.clear()
+
+        while True:
+            try:
+                # Flush a partial batch whenever the upstream stages go quiet
+                item = self._write_q.get(timeout=0.5)
+            except queue.Empty:
+                flush()
+                continue
+
+            if item is _DONE:
+                flush()
+                return
+
+            # Only the leader copy of new content carries its text, passages and artifact
+            path, file_hash, embedding, computed = item
+            entries.append((path, file_hash, embedding))
+            if computed is not None:
+                new_content[file_hash] = computed
+
+            if len(entries) >= self.write_batch:
+                flush()
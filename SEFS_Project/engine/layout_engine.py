@@ -0,0 +1,290 @@
+# engine/layout_engine.py
+"""
+2-D layout of the semantic galaxy.
+
+A projection is fitted once over all embeddings and stored in LAYOUTS,
+with every file's coordinates in FILE_LAYOUT. Files embedded later are
+projected with the stored model (no refit); a full refit runs only on
+demand:
+
+    python -m engine.layout_engine [--refit] [--method pca|landmark-tsne]
+
+Coordinates are scaled so most files fall within [-1, 1].
+"""
+
+import io
+import argparse
+import threading
+import numpy as np
+from core.config import (
+    EMBEDDING_MODEL_ID,
+    LAYOUT_METHOD,
+    LAYOUT_LANDMARKS,
+    LAYOUT_LANDMARK_NEIGHBORS,
+    LAYOUT_TEMPERATURE
+)
+from core.db_api import (
+    transaction,
+    open_embedding_reader,
+    get_embeddings_by_id,
+    get_current_layout,
+    store_layout,
+    store_layout_coordinates,
+    delete_layouts_except,
+    get_files_needing_layout,
+    get_layout_coordinates
+)
+from engine.similarity_engine import normalize_rows
+
+
+PROJECT_CHUNK_ROWS = 4096
+
+
+# ---------------- LAYOUT MODEL ----------------
+
+class LayoutModel:
+    """
+    A fitted projection from embedding space to 2-D.
+
+    "pca":           arrays mean, components (2 x dim), scale
+    "landmark-tsne": arrays landmarks (unit vectors), coords (their 2-D
+                     positions), neighbors, temperature
+    """
+
+    def __init__(self, method, arrays):
+        self.method = method
+        self.arrays = arrays
+
+    @property
+    def dim(self):
+        key = "components" if self.method == "pca" else "landmarks"
+        return self.arrays[key].shape[1]
+
+    def project(self, vectors):
+        """
+        2-D coordinates for a (n, dim) block of embeddings.
+        """
+        unit = normalize_rows(vectors)
+
+        if self.method == "pca":
+            return (unit - self.arrays["mean"]) @ self.arrays["components"].T * self.arrays["scale"]
+
+        landmarks, coords = self.arrays["landmarks"], self.arrays["coords"]
+        k = min(int(self.arrays["neighbors"]), len(landmarks))
+
+        sims = unit @ landmarks.T
+        nearest = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        nearest_sims = np.take_along_axis(sims, nearest, axis=1)
+
+        weights = np.exp((nearest_sims - nearest_sims.max(axis=1, keepdims=True)) / float(self.arrays["temperature"]))
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum("nk,nkd->nd", weights, coords[nearest])
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, **self.arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, method, blob):
+        with np.load(io.BytesIO(blob)) as data:
+            return cls(method, {name: data[name] for name in data.files})
+
+
+# ---------------- FITTING ----------------
+
+def _fit_pca(reader):
+    """
+    IncrementalPCA streamed over the reader's chunks.
+    """
+    from sklearn.decomposition import IncrementalPCA
+
+    pca = IncrementalPCA(n_components=2)
+    pending = []
+
+    # partial_fit needs at least n_components rows per call
+    for _, vectors in reader.iter_chunks():
+        pending.append(normalize_rows(vectors))
+        if sum(len(v) for v in pending) >= 2:
+            pca.partial_fit(np.concatenate(pending))
+            pending = []
+
+    # A single leftover row cannot be fitted on its own; it is still projected
+    if sum(len(v) for v in pending) >= 2:
+        pca.partial_fit(np.concatenate(pending))
+
+    spread = np.sqrt(max(float(pca.explained_variance_[0]), 1e-12))
+    return LayoutModel("pca", {
+        "mean": pca.mean_.astype(np.float32),
+        "components": pca.components_.astype(np.float32),
+        "scale": np.float32(1.0 / (3.0 * spread))
+    })
+
+
+def _sample_rows(reader, size, seed=42):
+    """
+    Uniform sample of up to `size` unit vectors in one pass (each row gets a
+    random key; the smallest keys are kept).
+    """
+    rng = np.random.default_rng(seed)
+    keys = np.zeros(0)
+    sample = None
+
+    for _, vectors in reader.iter_chunks():
+        unit = normalize_rows(vectors)
+        keys = np.concatenate([keys, rng.random(len(unit))])
+        sample = unit if sample is None else np.concatenate([sample, unit])
+
+        if len(keys) > size:
+            keep = np.argpartition(keys, size - 1)[:size]
+            keys, sample = keys[keep], sample[keep]
+
+    return sample
+
+
+def _fit_landmarks(reader):
+    """
+    t-SNE on a sample of landmark files; everything else is placed by
+    LayoutModel.project from its most similar landmarks.
+    """
+    from sklearn.manifold import TSNE
+
+    landmarks = _sample_rows(reader, LAYOUT_LANDMARKS)
+
+    tsne = TSNE(
+        n_components=2,
+        init="pca",
+        random_state=42,
+        perplexity=max(1.0, min(30.0, (len(landmarks) - 1) / 3))
+    )
+    coords = tsne.fit_transform(landmarks)
+    coords = (coords - coords.mean(axis=0)) / max(float(np.abs(coords).max()), 1e-12)
+
+    return LayoutModel("landmark-tsne", {
+        "landmarks": landmarks.astype(np.float32),
+        "coords": coords.astype(np.float32),
+        "neighbors": np.int64(LAYOUT_LANDMARK_NEIGHBORS),
+        "temperature": np.float32(LAYOUT_TEMPERATURE)
+    })
+
+
+LAYOUT_METHODS = {
+    "pca": _fit_pca,
+    "landmark-tsne": _fit_landmarks,
+}
+
+
+# Current layout, reloaded when another process stores a newer one
+_current = None
+_current_lock = threading.Lock()
+
+
+def fit_layout(method=LAYOUT_METHOD):
+    """
+    Fit a new layout over every embedding, project all files and replace the
+    previous layout. Returns the layout id, or None with fewer than 2 files.
+    """
+    global _current
+
+    reader = open_embedding_reader()
+    if len(reader) < 2:
+        print("⚠ Not enough files to fit a layout")
+        return None
+
+    print(f"🗺 Fitting {method} layout over {len(reader)} files...")
+    model = LAYOUT_METHODS[method](reader)
+
+    rows = []
+    for file_ids, vectors in reader.iter_chunks(PROJECT_CHUNK_ROWS):
+        rows.extend((fid, x, y) for fid, (x, y) in zip(file_ids, model.project(vectors)))
+
+    # One transaction: readers never see the new layout half-written
+    with transaction():
+        layout_id = store_layout(model.method, model.dim, model.to_bytes(), len(rows))
+        store_layout_coordinates(layout_id, rows)
+        delete_layouts_except(layout_id)
+
+    with _current_lock:
+        _current = (layout_id, model)
+
+    print(f"✅ Layout {layout_id} stored ({len(rows)} files)")
+    return layout_id
+
+
+def _load_current():
+    """
+    (layout_id, LayoutModel) of the stored layout if it matches the current
+    embedding model, else None.
+    """
+    global _current
+
+    row = get_current_layout()
+    if row is None:
+        return None
+
+    layout_id, method, model_id, dim, params = row
+    if model_id != EMBEDDING_MODEL_ID:
+        return None
+
+    with _current_lock:
+        if _current is None or _current[0] != layout_id:
+            _current = (layout_id, LayoutModel.from_bytes(method, params))
+        return _current
+
+
+# ---------------- INCREMENTAL ----------------
+
+def update_layout():
+    """
+    Project files added or re-embedded since they were last placed, using the
+    stored layout. Fits one when none exists yet (or it belongs to another
+    embedding model). Returns the layout id.
+    """
+    current = _load_current()
+    if current is None:
+        return fit_layout()
+
+    layout_id, model = current
+    pending = get_files_needing_layout(layout_id)
+
+    for start in range(0, len(pending), PROJECT_CHUNK_ROWS):
+        vectors = get_embeddings_by_id(pending[start:start + PROJECT_CHUNK_ROWS])
+        if not vectors:
+            continue
+        file_ids = list(vectors)
+        coords = model.project(np.array([vectors[fid] for fid in file_ids]))
+        store_layout_coordinates(layout_id, [(fid, x, y) for fid, (x, y) in zip(file_ids, coords)])
+
+    if pending:
+        print(f"🗺 Projected {len(pending)} files onto layout {layout_id}")
+
+    return layout_id
+
+
+def get_layout(file_ids=None):
+    """
+    Up-to-date coordinates: returns {file_id: (x, y)} for the given files or all.
+    """
+    layout_id = update_layout()
+    if layout_id is None:
+        return {}
+    return get_layout_coordinates(layout_id, file_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or update the SEFS galaxy layout.")
+    parser.add_argument("--refit", action="store_true", help="fit a new layout over all files")
+    parser.add_argument("--method", default=LAYOUT_METHOD, choices=sorted(LAYOUT_METHODS))
+    args = parser.parse_args()
+
+    from core.database import initialize_database
+    initialize_database()
+
+    if args.refit:
+        fit_layout(args.method)
+    else:
+        update_layout()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,33 @@
-import os
-from core.db_api import get_files_in_cluster
-from engine.content_engine import extract_text
+from collections import Counter
+from core.db_api import get_cluster_artifacts
+
+# Member artifacts merged per cluster name
+NAMING_MAX_FILES = 200
 
 
 def generate_cluster_name(cluster_id):
     """
     Generate a human-readable name for a semantic cluster.
     Strategy:
-    - Collect text from files in cluster
-    - Extract most common keywords
-    - Use them as folder name
+    - Merge the term counts saved at ingest for files in the cluster
+    - Use the most common keywords as folder name
+    Files are never read here; see content_engine.build_text_artifact.
     """
 
-    files = get_files_in_cluster(cluster_id)
-
-    if not files:
-        return "Empty Cluster"
-
-    combined_text = ""
-
-    for path in files[:5]:  # limit for performance
-        if os.path.exists(path):
-            text = extract_text(path)
-            if text:
-                combined_text += " " + text.lower()
+    artifacts = get_cluster_artifacts(cluster_id, limit=NAMING_MAX_FILES)
 
-    if not combined_text:
+    if not artifacts:
         return "Uncategorized"
 
-    # Simple keyword frequency
-    words = combined_text.split()
-    freq = {}
+    freq = Counter()
 
-    for w in words:
-        if len(w) < 4:
-            continue
-        freq[w] = freq.get(w, 0) + 1
+    for artifact in artifacts:
+        freq.update(artifact["terms"])
 
     if not freq:
         return "General"
 
-    top_words = sorted(freq, key=freq.get, reverse=True)[:2]
+    top_words = [word for word, _ in freq.most_common(2)]
     name = "_".join(top_words)
 
     return name.capitalize()
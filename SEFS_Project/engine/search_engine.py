@@ -1,7 +1,51 @@
-
 import numpy as np
-from engine.semantic_engine import generate_embedding, cosine_similarity
-from core.db_api import get_all_embeddings
+from core.config import (
+    PASSAGE_SEARCH_FACTOR,
+    SEARCH_LEXICAL_CANDIDATES,
+    SEARCH_RRF_K,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL
+)
+from engine.semantic_engine import generate_embedding
+from engine.lru_cache import LRUCache
+from engine.similarity_engine import linear_top_k, normalize_rows
+from core.db_api import (
+    open_embedding_reader,
+    get_file_paths,
+    get_ann_index,
+    get_embeddings_by_id,
+    get_file_passages,
+    get_text_artifacts,
+    get_index_version,
+    lexical_search
+)
+
+
+# ---------------- CACHES ----------------
+
+# Normalized query text -> query embedding
+_query_embeddings = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+# (normalized query, top_k, index version) -> search_passages() results;
+# any committed write changes the index version, so stale results never match
+_results = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+_results_version = [None]
+
+
+def normalize_query(query):
+    """
+    Cache key for a query: case and whitespace differences are ignored.
+    """
+    return " ".join(query.lower().split())
+
+
+def get_search_cache_stats():
+    return {
+        "query_embeddings": _query_embeddings.get_stats(),
+        "results": _results.get_stats(),
+    }
 
 
 # ---------------- SEMANTIC SEARCH ----------------
@@ -11,43 +55,185 @@ def semantic_search(query, top_k=5):
     Find files most semantically similar to the query.
     Returns ranked list of (file_path, similarity).
     """
+    hits = search_passages(query, top_k)
+    paths = get_file_paths([file_id for file_id, _, _ in hits])
+
+    return [(paths.get(file_id), score) for file_id, score, _ in hits]
+
+
+def search_passages(query, top_k=5):
+    """
+    Hybrid search. Returns ranked [(file_id, similarity, best passage or None)].
+    Repeated queries are answered from the result cache until the index changes.
+    """
+    # Read before searching, so a write committed meanwhile invalidates the entry
+    version = get_index_version()
+    key = (normalize_query(query), top_k, version)
+
+    cached = _results.get(key)
+    if cached is not None:
+        return list(cached)
+
+    results = _search_passages(query, top_k)
+
+    # Drop every entry of older index versions at once instead of letting them age out
+    if _results_version[0] != version:
+        _results.clear()
+        _results_version[0] = version
+    _results.put(key, tuple(results))
 
-    print("🔎 Understanding query...")
-    query_embedding = generate_embedding(query)
+    return results
 
+
+def _search_passages(query, top_k):
+    """
+    Candidates are the best BM25 full-text matches (exact names, identifiers,
+    rare terms), topped up with nearest document vectors when there are
+    fewer than top_k * PASSAGE_SEARCH_FACTOR of them. Only the candidates
+    are scored against the query vector, and the final order fuses the
+    lexical and vector rankings with reciprocal rank fusion.
+    """
+    query_embedding = _embed_query(query)
     if query_embedding is None:
-        print("⚠ Could not understand query")
         return []
 
-    all_files = get_all_embeddings()
+    wanted = top_k * PASSAGE_SEARCH_FACTOR
+    lexical = [file_id for file_id, _ in lexical_search(query, SEARCH_LEXICAL_CANDIDATES)]
 
-    if not all_files:
-        print("⚠ No indexed files found")
+    candidates = list(lexical)
+    if len(candidates) < wanted:
+        seen = set(candidates)
+        candidates += [
+            file_id for file_id, _ in document_hits(query_embedding, wanted)
+            if file_id not in seen
+        ]
+
+    scored = score_candidates(query_embedding, candidates)
+    fused = reciprocal_rank_fusion([lexical, [file_id for file_id, _, _ in scored]])
+
+    by_id = {file_id: (score, passage) for file_id, score, passage in scored}
+    return [
+        (file_id, *by_id.get(file_id, (0.0, None)))
+        for file_id in fused[:top_k]
+    ]
+
+
+def score_candidates(query_embedding, file_ids):
+    """
+    Vector similarity of each candidate, best first, as
+    [(file_id, similarity, best passage or None)]. A document scores as its
+    best passage when that beats the document vector, so a match deep
+    inside a long file is not averaged away.
+    """
+    query_unit = normalize_rows(query_embedding)[0]
+    vectors = get_embeddings_by_id(file_ids)
+    passages = get_file_passages(file_ids)
+
+    scored = []
+    for file_id in file_ids:
+        if file_id not in vectors:
+            continue
+        score = float(normalize_rows(vectors[file_id])[0] @ query_unit)
+        best_passage = None
+
+        if file_id in passages:
+            texts, passage_vectors = passages[file_id]
+            scores = normalize_rows(passage_vectors) @ query_unit
+            best = int(np.argmax(scores))
+            best_passage = texts[best]
+            score = max(score, float(scores[best]))
+
+        scored.append((file_id, score, best_passage))
+
+    scored.sort(key=lambda hit: -hit[1])
+    return scored
+
+
+def reciprocal_rank_fusion(rankings, k=SEARCH_RRF_K):
+    """
+    Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists
+    it appears in. Returns ids best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, file_id in enumerate(ranking, start=1):
+            fused[file_id] = fused.get(file_id, 0.0) + 1.0 / (k + rank)
+
+    return sorted(fused, key=lambda file_id: -fused[file_id])
+
+
+def search_file_ids(query, top_k=5):
+    """
+    Ranked list of (file_id, similarity) for the query, by document vector.
+    """
+    query_embedding = _embed_query(query)
+    if query_embedding is None:
         return []
 
-    results = []
+    return document_hits(query_embedding, top_k)
+
+
+def _embed_query(query):
+    key = normalize_query(query)
+    query_embedding = _query_embeddings.get(key)
 
-    for file in all_files:
-        score = cosine_similarity(query_embedding, file["embedding"])
-        results.append((file["path"], float(score)))
+    if query_embedding is None:
+        print("🔎 Understanding query...")
+        query_embedding = generate_embedding(key)
+
+        if query_embedding is None:
+            print("⚠ Could not understand query")
+            return None
+
+        _query_embeddings.put(key, query_embedding)
+
+    return query_embedding
 
-    # Sort by similarity descending
-    results.sort(key=lambda x: x[1], reverse=True)
 
-    return results[:top_k]
+def document_hits(query_embedding, top_k=5):
+    all_files = open_embedding_reader()
+
+    if not len(all_files):
+        print("⚠ No indexed files found")
+        return []
+
+    # ANN index on large corpora, exact scan otherwise
+    index = get_ann_index()
+    if index is not None:
+        hits = index.search(query_embedding, top_k, fetch_vectors=get_embeddings_by_id)
+    else:
+        hits = linear_top_k(all_files, query_embedding, top_k)
+
+    return hits
 
 
 # ---------------- PRINT RESULTS ----------------
 
 def print_search_results(query, top_k=5):
-    results = semantic_search(query, top_k)
+    hits = search_passages(query, top_k)
 
-    if not results:
+    if not hits:
         print("No relevant files found.")
         return
 
+    # Snippets come from what was stored at ingest, not from the files
+    file_ids = [file_id for file_id, _, _ in hits]
+    paths = get_file_paths(file_ids)
+    artifacts = get_text_artifacts(file_ids)
+
     print("\n📄 Most relevant files:\n")
 
-    for i, (path, score) in enumerate(results, start=1):
-        print(f"{i}. {path}")
+    for i, (file_id, score, passage) in enumerate(hits, start=1):
+        print(f"{i}. {paths.get(file_id)}")
         print(f"   similarity: {score:.3f}")
+
+        artifact = artifacts.get(file_id)
+        if passage:
+            print(f"   …{_shorten(passage)}…")
+        elif artifact and artifact["summary"]:
+            print(f"   {artifact['summary']}")
+
+
+def _shorten(text, limit=240):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0]
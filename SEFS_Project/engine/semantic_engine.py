@@ -1,15 +1,283 @@
 # engine/semantic_engine.py
 
 import os
+import re
+import json
+import queue
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
-import networkx as nx
-from pyvis.network import Network
-from sentence_transformers import SentenceTransformer
-from core.db_api import get_all_embeddings
+from core.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL_ID,
+    ONNX_MODEL_DIR,
+    HASHING_DIM,
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_WAIT,
+    EMBED_SERVICE
+)
+from core.db_api import open_embedding_reader, get_file_paths, get_text_artifacts
+from engine.content_engine import split_passages
+from engine.similarity_engine import (
+    DEFAULT_TILE_SIZE,
+    SemanticAdjacency,
+    normalize_rows,
+    thresholded_neighbors_chunked
+)
+
+
+# ------------------- EMBEDDING BACKENDS -------------------
+class EmbeddingBackend:
+    """
+    Turns texts into vectors. model_id and dim are stored with every vector
+    the backend produces, so vectors of different models are never mixed.
+    """
+
+    model_id = None
+    dim = None
+    remote = False
+
+    def encode(self, texts, batch_size=EMBED_BATCH_SIZE):
+        """
+        Embed a list of texts; returns a float32 array of shape (len(texts), dim).
+        """
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    The PyTorch sentence-transformers model.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.model_id = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=EMBED_BATCH_SIZE):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxInt8Backend(EmbeddingBackend):
+    """
+    The same model exported to ONNX with int8-quantized weights, run by
+    onnxruntime on the CPU. Mean pooling and normalization reproduce the
+    sentence-transformers pipeline. The export is made on first use.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, model_dir=ONNX_MODEL_DIR):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, "model_int8.onnx")
+        if not os.path.exists(model_path):
+            export_onnx_int8(model_name, model_dir)
+
+        with open(os.path.join(model_dir, "sefs_onnx.json"), encoding="utf-8") as f:
+            info = json.load(f)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.max_length = info["max_seq_length"]
+        self.model_id = model_name + ":onnx-int8"
+        self.dim = info["dim"]
+
+    def encode(self, texts, batch_size=EMBED_BATCH_SIZE):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        out = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(normalize_rows(pooled))
+
+        return np.concatenate(out)
+
+
+def export_onnx_int8(model_name=EMBEDDING_MODEL, output_dir=ONNX_MODEL_DIR):
+    """
+    Export the sentence-transformers model's encoder to ONNX and quantize
+    its weights to int8 (dynamic quantization). Needs torch and
+    onnxruntime; only runs once per output_dir.
+    """
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from sentence_transformers import SentenceTransformer
+
+    print(f"📦 Exporting {model_name} to ONNX (int8) → {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    encoder = st_model[0].auto_model.eval()
+    st_model.tokenizer.save_pretrained(output_dir)
+
+    sample = st_model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    float_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(sample[name] for name in input_names),
+            float_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14
+        )
+
+    quantize_dynamic(float_path, os.path.join(output_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(float_path)
+
+    with open(os.path.join(output_dir, "sefs_onnx.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "dim": st_model.get_sentence_embedding_dimension()
+        }, f)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Deterministic feature hashing of lower-cased words into dim signed
+    buckets. No model to load and identical output everywhere, for tests
+    and benchmarks; similarity is only lexical.
+    """
+
+    _TOKEN = re.compile(r"\w+")
+
+    def __init__(self, dim=HASHING_DIM):
+        self.model_id = f"hashing-{dim}"
+        self.dim = dim
+
+    def encode(self, texts, batch_size=EMBED_BATCH_SIZE):
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for token in self._TOKEN.findall(text.lower()):
+                value = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+
+        return normalize_rows(vectors)
+
+
+EMBEDDING_BACKENDS = {
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx-int8": OnnxInt8Backend,
+    "hashing": HashingBackend,
+}
 
 
-# ------------------- LOAD MODEL -------------------
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Created on first use (or by start_warmup), so importing this module, and
+# every worker process that imports it, stays cheap
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Backends whose packages are not in requirements.txt
+BACKEND_REQUIREMENTS = {
+    "onnx-int8": "requirements-onnx.txt",
+}
+
+
+def _create_local_backend():
+    try:
+        backend = EMBEDDING_BACKENDS[EMBEDDING_BACKEND]()
+    except ImportError as e:
+        requirements = BACKEND_REQUIREMENTS.get(EMBEDDING_BACKEND, "requirements.txt")
+        raise ImportError(
+            f'EMBEDDING_BACKEND "{EMBEDDING_BACKEND}" needs the {e.name or "missing"} package: '
+            f"pip install -r {requirements}"
+        ) from e
+    if backend.model_id != EMBEDDING_MODEL_ID:
+        raise ValueError(
+            f"Backend model id {backend.model_id} != EMBEDDING_MODEL_ID {EMBEDDING_MODEL_ID}"
+        )
+    return backend
+
+
+def get_backend():
+    """
+    The shared embedding backend, created on first call: the local embedding
+    service (engine/embedding_service.py) when EMBED_SERVICE is set and it is
+    running, otherwise the in-process backend selected by EMBEDDING_BACKEND.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = None
+                if EMBED_SERVICE:
+                    from engine.embedding_service import connect_embedding_service
+                    backend = connect_embedding_service()
+                _backend = backend or _create_local_backend()
+    return _backend
+
+
+def use_local_backend():
+    """
+    Switch this process to the in-process backend (loading it if needed).
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None or _backend.remote:
+            _backend = _create_local_backend()
+        return _backend
+
+
+def encode_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed texts with the shared backend. If the embedding service stops
+    answering, the process falls back to the in-process model.
+    """
+    backend = get_backend()
+    try:
+        return backend.encode(texts, batch_size=batch_size)
+    except ConnectionError:
+        if not backend.remote:
+            raise
+        print("⚠ Embedding service unavailable; loading local model")
+        return use_local_backend().encode(texts, batch_size=batch_size)
+
+
+def start_warmup():
+    """
+    Load the model and run one encode in a background thread, so the first
+    real query does not pay for it. Returns the thread.
+    """
+    def warm_up():
+        started = time.monotonic()
+        try:
+            encode_texts(["warm up"])
+        except Exception as e:
+            print(f"[ERROR] Model warm-up failed: {e}")
+            return
+        print(f"🔥 Embedding model ready ({time.monotonic() - started:.1f}s)")
+
+    thread = threading.Thread(target=warm_up, name="sefs-model-warmup", daemon=True)
+    thread.start()
+    return thread
 
 
 # ------------------- EMBEDDING FUNCTIONS -------------------
@@ -19,7 +287,132 @@ def generate_embedding(text):
     """
     if not text or len(text.strip()) == 0:
         return None
-    return model.encode(text)
+    return encode_texts([text])[0]
+
+
+# ------------------- EMBEDDING BATCHER -------------------
+class EmbeddingBatcher:
+    """
+    Collects texts from any number of producer threads and encodes them
+    together, so the model sees batches instead of single strings.
+
+    A batch is sent to the model once it holds batch_size texts or max_wait
+    seconds after its first text arrived, whichever comes first. Each
+    submit() returns a Future that resolves to the embedding (or None for
+    empty text, like generate_embedding).
+    """
+
+    def __init__(self, batch_size=EMBED_BATCH_SIZE, max_wait=EMBED_MAX_WAIT):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        future = Future()
+
+        if not text or len(text.strip()) == 0:
+            future.set_result(None)
+            return future
+
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="sefs-embedding-batcher",
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for text, _ in batch]
+
+            try:
+                embeddings = encode_texts(texts, batch_size=self.batch_size)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+_batcher = EmbeddingBatcher()
+
+
+def embed_async(text):
+    """
+    Queue text on the shared batcher; returns a Future of its embedding.
+    """
+    return _batcher.submit(text)
+
+
+def embed_document(text):
+    """
+    Embed a whole document: its overlapping passages (see
+    content_engine.split_passages) go through the shared batcher, and the
+    document vector is the mean of their unit vectors.
+
+    Returns a Future of (document_vector, passages) with passages as
+    [(start_char, end_char, passage_text, vector)], or of (None, []) for
+    text with nothing to embed.
+    """
+    result = Future()
+    passages = split_passages(text) if text else []
+
+    if not passages:
+        result.set_result((None, []))
+        return result
+
+    futures = [_batcher.submit(passage) for _, _, passage in passages]
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            vectors = [future.result() for future in futures]
+        except Exception as e:
+            result.set_exception(e)
+            return
+
+        document_vector = normalize_rows(np.array(vectors)).mean(axis=0)
+        result.set_result((
+            document_vector,
+            [(start, end, passage, vector) for (start, end, passage), vector in zip(passages, vectors)]
+        ))
+
+    for future in futures:
+        future.add_done_callback(done)
+
+    return result
 
 
 def cosine_similarity(vec1, vec2):
@@ -40,56 +433,44 @@ def cosine_similarity(vec1, vec2):
 
 
 # ------------------- SEMANTIC SPACE -------------------
-def build_semantic_space(threshold=0.6):
+def build_semantic_space(threshold=0.6, tile_size=DEFAULT_TILE_SIZE):
     """
-    Build adjacency dictionary of semantic similarity.
+    Build sparse adjacency of semantic similarity.
     Returns:
-        {file_id: [(neighbor_id, similarity), ...]}
+        SemanticAdjacency, readable as {file_id: [(neighbor_id, similarity), ...]}
     """
-    all_files = get_all_embeddings()
-
-    # Remove files without embeddings
-    all_files = [f for f in all_files if f["embedding"] is not None]
-
-    adjacency = {}
-    n = len(all_files)
-
-    for i in range(n):
-        file_i = all_files[i]
-        adjacency[file_i["file_id"]] = []
+    reader = open_embedding_reader()
 
-        for j in range(i + 1, n):  # avoid duplicate comparisons
-            file_j = all_files[j]
+    if not len(reader):
+        return SemanticAdjacency.empty()
 
-            sim = cosine_similarity(
-                file_i["embedding"],
-                file_j["embedding"]
-            )
-
-            if sim >= threshold:
-                adjacency[file_i["file_id"]].append((file_j["file_id"], sim))
-                adjacency.setdefault(file_j["file_id"], []).append((file_i["file_id"], sim))
-
-    return adjacency
+    return thresholded_neighbors_chunked(reader, threshold, tile_size)
 
 
 # ------------------- INTERACTIVE GRAPH -------------------
-def visualize_semantic_graph(threshold=0.6, output_path="visualization/semantic_graph.html"):
+def visualize_semantic_graph(threshold=0.6, output_path="visualization/semantic_graph.html",
+                             adjacency=None, open_browser=False):
     """
-    Create interactive browser graph of semantic relationships.
+    Create interactive browser graph of semantic relationships, on demand.
+    Pass the adjacency from build_semantic_space() to reuse it. The live,
+    incrementally updated graph is engine/graph_publisher.py.
     """
+    import networkx as nx
+    from pyvis.network import Network
+
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    adjacency = build_semantic_space(threshold)
-    all_files = get_all_embeddings()
-    file_info = {f["file_id"]: f["path"] for f in all_files}
+    if adjacency is None:
+        adjacency = build_semantic_space(threshold)
+    file_info = get_file_paths(adjacency.file_ids)
+    artifacts = get_text_artifacts(adjacency.file_ids)
 
     G = nx.Graph()
 
-    # Add nodes
+    # Add nodes (tooltip: path plus the summary saved at ingest)
     for fid, path in file_info.items():
         label = os.path.basename(path)
-        G.add_node(fid, title=path, label=label)
+        G.add_node(fid, title=node_tooltip(path, artifacts.get(fid)), label=label)
 
     # Add edges
     for fid, neighbors in adjacency.items():
@@ -107,9 +488,18 @@ def visualize_semantic_graph(threshold=0.6, output_path="visualization/semantic_
 
     net.from_nx(G)
     net.show_buttons(filter_=["physics"])
-    net.write_html(output_path, open_browser=True)
+    net.write_html(output_path, open_browser=open_browser)
 
-    print(f"Interactive semantic graph opened → {output_path}")
+    print(f"Interactive semantic graph saved → {output_path}")
+
+
+def node_tooltip(title, artifact):
+    """
+    Hover text for a file node: its title, then the stored summary.
+    """
+    if not artifact or not artifact["summary"]:
+        return title
+    return f"{title}\n\n{artifact['summary']}"
 
 
 # ------------------- DEBUG PRINT -------------------
@@ -122,6 +512,9 @@ def print_semantic_graph(threshold=0.6):
 
 # ------------------- MATRIX FOR CLUSTERING -------------------
 def semantic_graph_to_matrix(adjacency):
+    if isinstance(adjacency, SemanticAdjacency):
+        return adjacency.to_dense(), list(adjacency.file_ids)
+
     file_ids = list(adjacency.keys())
     n = len(file_ids)
     sim_matrix = np.zeros((n, n))
@@ -0,0 +1,264 @@
+# engine/similarity_engine.py
+
+from collections.abc import Mapping
+import numpy as np
+
+
+# Rows/columns per tile. One tile holds TILE_SIZE x TILE_SIZE float32 scores,
+# so the default bounds the working set to ~4 MB regardless of corpus size.
+DEFAULT_TILE_SIZE = 1024
+
+
+# ------------------- NORMALIZATION -------------------
+def normalize_rows(matrix):
+    """
+    Return a float32 copy of the matrix with every row scaled to unit length.
+    Zero rows stay zero so they never pass a positive threshold.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ------------------- SPARSE ADJACENCY -------------------
+class SemanticAdjacency(Mapping):
+    """
+    Thresholded similarity graph stored in CSR layout.
+
+    Row i belongs to file_ids[i]; its neighbours are
+    indices[indptr[i]:indptr[i + 1]] with similarities in the same slice of data.
+
+    Still reads like the old {file_id: [(neighbor_id, similarity), ...]} dict,
+    so callers iterating .items() keep working.
+    """
+
+    def __init__(self, file_ids, indptr, indices, data):
+        self.file_ids = list(file_ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self._index = {fid: i for i, fid in enumerate(self.file_ids)}
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            [],
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.float32)
+        )
+
+    def __getitem__(self, file_id):
+        i = self._index[file_id]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return [
+            (self.file_ids[j], float(s))
+            for j, s in zip(self.indices[start:end], self.data[start:end])
+        ]
+
+    def __iter__(self):
+        return iter(self.file_ids)
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    @property
+    def edge_count(self):
+        """
+        Number of undirected edges (each is stored once per endpoint).
+        """
+        return len(self.indices) // 2
+
+    def to_dense(self, dtype=np.float32):
+        """
+        Scatter the stored similarities into an n x n matrix (zeros elsewhere).
+        """
+        n = len(self.file_ids)
+        matrix = np.zeros((n, n), dtype=dtype)
+        rows = np.repeat(np.arange(n), np.diff(self.indptr))
+        matrix[rows, self.indices] = self.data
+        return matrix
+
+    def to_scipy(self):
+        """
+        Return a scipy.sparse.csr_matrix view of the graph.
+        """
+        from scipy.sparse import csr_matrix
+
+        n = len(self.file_ids)
+        return csr_matrix((self.data, self.indices, self.indptr), shape=(n, n))
+
+
+# ------------------- EXACT TOP-K -------------------
+def linear_top_k(reader, query_embedding, top_k=5):
+    """
+    Exact cosine top-k by scanning every chunk of the reader, keeping only the
+    running best top_k. Returns [(file_id, similarity), ...] best first.
+    """
+    query = normalize_rows(query_embedding)[0]
+    best_ids = []
+    best_scores = np.zeros(0, dtype=np.float32)
+
+    for file_ids, vectors in reader.iter_chunks():
+        scores = np.concatenate([best_scores, normalize_rows(vectors) @ query])
+        ids = best_ids + list(file_ids)
+
+        k = min(top_k, len(scores))
+        if not k:
+            continue
+        top = np.argpartition(-scores, k - 1)[:k]
+        best_ids = [ids[i] for i in top]
+        best_scores = scores[top]
+
+    order = np.argsort(-best_scores, kind="stable")
+    return [(best_ids[i], float(best_scores[i])) for i in order]
+
+
+def neighbors_above(reader, queries, threshold=0.6):
+    """
+    Neighbours >= threshold of a few query vectors, in one scan of the reader.
+    queries is {file_id: vector}. Returns {file_id: [(neighbor_id, similarity), ...]};
+    a query is never its own neighbour.
+    """
+    query_ids = list(queries)
+    neighbors = {file_id: [] for file_id in query_ids}
+    if not query_ids:
+        return neighbors
+
+    query = normalize_rows(np.array([queries[file_id] for file_id in query_ids]))
+
+    for file_ids, vectors in reader.iter_chunks():
+        scores = normalize_rows(vectors) @ query.T
+        rows, cols = np.nonzero(scores >= threshold)
+        for r, c in zip(rows, cols):
+            if file_ids[r] != query_ids[c]:
+                neighbors[query_ids[c]].append((file_ids[r], float(scores[r, c])))
+
+    return neighbors
+
+
+# ------------------- TILED NEIGHBOUR SEARCH -------------------
+def _tile_edges(row_block, col_block, i0, j0, threshold, diagonal):
+    """
+    Edges >= threshold between two normalized blocks starting at rows i0 / j0.
+    On a diagonal tile only the strict upper triangle is kept (no self or
+    duplicate pairs).
+    """
+    scores = row_block @ col_block.T
+
+    mask = scores >= threshold
+    if diagonal:
+        mask &= np.triu(np.ones(mask.shape, dtype=bool), k=1)
+
+    r, c = np.nonzero(mask)
+    return r + i0, c + j0, scores[r, c]
+
+
+def _iter_tile_edges(normalized, threshold, tile_size):
+    """
+    Yield (rows, cols, sims) for every pair i < j with similarity >= threshold,
+    one upper-triangle tile at a time.
+    """
+    n = normalized.shape[0]
+
+    for i0 in range(0, n, tile_size):
+        row_block = normalized[i0:i0 + tile_size]
+
+        for j0 in range(i0, n, tile_size):
+            yield _tile_edges(
+                row_block, normalized[j0:j0 + tile_size], i0, j0, threshold, j0 == i0
+            )
+
+
+def _iter_chunk_edges(reader, threshold, tile_size, file_ids):
+    """
+    Same as _iter_tile_edges, but pulls tiles from reader.iter_chunks() so the
+    full matrix is never in memory. Appends node ids to file_ids in order.
+    """
+    i0 = 0
+
+    for bi, (ids_i, block_i) in enumerate(reader.iter_chunks(tile_size)):
+        file_ids.extend(ids_i)
+        row_block = normalize_rows(block_i)
+        j0 = i0
+
+        for bj, (ids_j, block_j) in enumerate(reader.iter_chunks(tile_size, start_chunk=bi)):
+            col_block = row_block if bj == 0 else normalize_rows(block_j)
+            if len(row_block) and len(col_block):
+                yield _tile_edges(row_block, col_block, i0, j0, threshold, bj == 0)
+            j0 += len(ids_j)
+
+        i0 += len(ids_i)
+
+
+def _collect_edges(edges):
+    rows, cols, sims = [], [], []
+    for r, c, s in edges:
+        rows.append(r)
+        cols.append(c)
+        sims.append(s)
+
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+def build_csr(n, rows, cols, sims):
+    """
+    Turn an undirected edge list (each pair once) into symmetric CSR arrays
+    with column indices sorted inside every row.
+    """
+    all_rows = np.concatenate([rows, cols])
+    all_cols = np.concatenate([cols, rows])
+    all_sims = np.concatenate([sims, sims]).astype(np.float32, copy=False)
+
+    order = np.lexsort((all_cols, all_rows))
+    all_rows = all_rows[order]
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(all_rows, minlength=n), out=indptr[1:])
+
+    return indptr, all_cols[order].astype(np.int64, copy=False), all_sims[order]
+
+
+def thresholded_neighbors(file_ids, embeddings, threshold=0.6, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Compute the cosine-similarity graph of all embeddings above threshold.
+
+    Embeddings are normalized once, then compared in tile_size x tile_size
+    matrix products, so peak memory per step is independent of corpus size.
+    Returns a SemanticAdjacency.
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return SemanticAdjacency.empty()
+
+    normalized = normalize_rows(embeddings)
+    n = normalized.shape[0]
+
+    rows, cols, sims = _collect_edges(_iter_tile_edges(normalized, threshold, tile_size))
+
+    indptr, indices, data = build_csr(n, rows, cols, sims)
+    return SemanticAdjacency(file_ids, indptr, indices, data)
+
+
+def thresholded_neighbors_chunked(reader, threshold=0.6, tile_size=DEFAULT_TILE_SIZE):
+    """
+    thresholded_neighbors() over a chunk reader (see core.db_api.open_embedding_reader).
+    Only two tiles of vectors are resident at once, so this works on
+    memory-mapped stores larger than RAM.
+    """
+    file_ids = []
+    rows, cols, sims = _collect_edges(_iter_chunk_edges(reader, threshold, tile_size, file_ids))
+
+    if not file_ids:
+        return SemanticAdjacency.empty()
+
+    indptr, indices, data = build_csr(len(file_ids), rows, cols, sims)
+    return SemanticAdjacency(file_ids, indptr, indices, data)
@@ -1,5 +1,6 @@
-from engine.semantic_engine import build_semantic_space, visualize_semantic_graph
-from engine.clustering_engine import cluster_files
+from engine.semantic_engine import build_semantic_space
+from engine.clustering_engine import cluster_files, needs_full_rebuild, take_changed_assignments
+from engine.graph_publisher import request_graph_update
 from os_sync.folder_manager import create_semantic_folders
 
 
@@ -20,7 +21,33 @@ def rebuild_semantic_system():
     # 3️⃣ Sync OS folders with semantic clusters
     create_semantic_folders(cluster_assignments)
 
-    # 4️⃣ Refresh interactive visualization
-    visualize_semantic_graph(threshold=0.6)
+    # 4️⃣ Publish the same graph to the live page (rate-limited)
+    request_graph_update(adjacency=graph)
+
+    print("✅ SEFS structure synchronized\n")
+
+
+def refresh_semantic_system():
+    """
+    Cheap follow-up to file events. Clusters were already updated
+    incrementally, so only the changed files are synced; a full rebuild
+    runs once drift, imbalance or the schedule says clusters are stale.
+    """
+
+    if needs_full_rebuild():
+        rebuild_semantic_system()
+        return
+
+    changes = take_changed_assignments()
+
+    # Also picks up deleted files, which leave no assignment behind
+    request_graph_update(changed=changes)
+
+    if not changes:
+        return
+
+    print(f"\n🌌 Updating semantic filesystem ({len(changes)} files)...")
+
+    create_semantic_folders(changes)
 
     print("✅ SEFS structure synchronized\n")
@@ -1,48 +1,50 @@
 import os
+import json
+import time
+import webbrowser
 import numpy as np
-import networkx as nx
-from pyvis.network import Network
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-import plotly.express as px
 
-from core.db_api import get_all_embeddings
+from core.config import (
+    GRAPH_OUTPUT_DIR,
+    GALAXY_MODE,
+    GALAXY_WEBGL_MIN_FILES,
+    GALAXY_OUTPUT_DIR,
+    GALAXY_LOD_POINTS
+)
+from core.db_api import get_file_paths, get_text_artifacts, get_file_cluster_map, get_cluster_centroids
+from engine.semantic_engine import node_tooltip
+from engine.layout_engine import get_layout
+from engine.graph_publisher import serve_graph, copy_script
 
 
-def generate_semantic_galaxy(output_path="visualization/semantic_galaxy.html"):
+def generate_semantic_galaxy(output_path="visualization/semantic_galaxy.html", mode=GALAXY_MODE):
     """
     Create a 2D semantic space visualization of all files.
-    Uses PCA to position files based on embedding similarity.
+    Positions come from the stored layout (engine/layout_engine.py); only
+    files added since it was fitted are projected here. Large corpora go
+    to the WebGL view instead (see GALAXY_MODE).
     """
+    import networkx as nx
+    from pyvis.network import Network
 
     print("🌌 Building semantic galaxy...")
 
-    files = get_all_embeddings()
+    layout = get_layout()
 
-    if not files:
-        print("⚠ No embeddings found")
+    if len(layout) < 2:
+        print("⚠ Not enough files to visualize")
         return
 
-    file_ids = []
-    file_names = []
-    embeddings = []
-
-    for f in files:
-        if f["embedding"] is None:
-            continue
-        file_ids.append(f["file_id"])
-        file_names.append(os.path.basename(f["path"]))
-        embeddings.append(np.array(f["embedding"]))
-
-    if len(embeddings) < 2:
-        print("⚠ Not enough files to visualize")
+    if _use_webgl(len(layout), mode):
+        show_galaxy_webgl(layout)
         return
 
-    embeddings = np.array(embeddings)
+    file_ids = list(layout)
+    coords = [layout[fid] for fid in file_ids]
 
-    # ---------- DIMENSION REDUCTION ----------
-    pca = PCA(n_components=2)
-    coords = pca.fit_transform(embeddings)
+    paths = get_file_paths(file_ids)
+    file_names = [os.path.basename(paths.get(fid, fid)) for fid in file_ids]
+    artifacts = get_text_artifacts(file_ids)
 
     # ---------- BUILD GRAPH ----------
     G = nx.Graph()
@@ -52,7 +54,7 @@ def generate_semantic_galaxy(output_path="visualization/semantic_galaxy.html"):
         G.add_node(
             fid,
             label=file_names[i],
-            title=file_names[i],
+            title=node_tooltip(file_names[i], artifacts.get(fid)),
             x=float(x) * 500,
             y=float(y) * 500,
             physics=False
@@ -75,28 +77,33 @@ def generate_semantic_galaxy(output_path="visualization/semantic_galaxy.html"):
 
 
 
-def visualize_semantic_space():
+def visualize_semantic_space(mode=GALAXY_MODE):
     """
-    Reduce high-dimensional embeddings to 2D and plot them.
+    Plot every file at its stored 2D layout position (see
+    engine/layout_engine.py; LAYOUT_METHOD "landmark-tsne" gives a
+    t-SNE-like map without refitting t-SNE on every file).
+    Large corpora go to the WebGL view instead (see GALAXY_MODE).
     """
+    import plotly.express as px
 
     print("🌐 Building semantic galaxy...")
 
-    data = get_all_embeddings()
+    layout = get_layout()
 
-    if not data:
+    if not layout:
         print("⚠ No embeddings found")
         return
 
-    paths = [d["path"] for d in data]
-    embeddings = np.array([d["embedding"] for d in data])
+    if _use_webgl(len(layout), mode):
+        show_galaxy_webgl(layout)
+        return
 
-    # Reduce dimensions to 2D for visualization
-    tsne = TSNE(n_components=2, random_state=42, perplexity=min(5, len(embeddings)-1))
-    reduced = tsne.fit_transform(embeddings)
+    file_ids = list(layout)
+    path_map = get_file_paths(file_ids)
+    paths = [path_map.get(fid, fid) for fid in file_ids]
 
-    x = reduced[:, 0]
-    y = reduced[:, 1]
+    x = [layout[fid][0] for fid in file_ids]
+    y = [layout[fid][1] for fid in file_ids]
 
     fig = px.scatter(
         x=x,
@@ -111,5 +118,261 @@ def visualize_semantic_space():
     print("✨ Galaxy generated: semantic_galaxy.html")
     print("Opening in browser...")
 
-    import webbrowser
-    webbrowser.open("semantic_galaxy.html")
\ No newline at end of file
+    webbrowser.open("semantic_galaxy.html")
+
+# ---------------- WEBGL EXPORT ----------------
+
+def _use_webgl(file_count, mode):
+    return mode == "webgl" or (mode == "auto" and file_count >= GALAXY_WEBGL_MIN_FILES)
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def export_galaxy_webgl(output_dir=GALAXY_OUTPUT_DIR, layout=None):
+    """
+    Write the galaxy as typed arrays for the WebGL page in output_dir:
+        points-<v>.bin   float32 x[n], float32 y[n], int32 cluster[n],
+                         uint32 label_offsets[n + 1]
+        labels-<v>.bin   file names, UTF-8, back to back
+        manifest.json    array offsets and one aggregate (mean position,
+                         size) per cluster for the zoomed-out view
+    The manifest is replaced last, so the page never mixes two exports.
+    Returns the number of files exported.
+    """
+    if layout is None:
+        layout = get_layout()
+    if not layout:
+        print("⚠ No embeddings found")
+        return 0
+
+    file_ids = list(layout)
+    n = len(file_ids)
+    coords = np.array([layout[fid] for fid in file_ids], dtype=np.float32).reshape(n, 2)
+
+    # ---------- CLUSTERS ----------
+    membership = get_file_cluster_map()
+    cluster_labels = {cluster_id: label for cluster_id, label, _, _ in get_cluster_centroids()}
+    cluster_ids = sorted({membership[fid] for fid in file_ids if fid in membership})
+    cluster_index = {cluster_id: i for i, cluster_id in enumerate(cluster_ids)}
+    clusters = np.array([cluster_index.get(membership.get(fid), -1) for fid in file_ids], dtype=np.int32)
+
+    # Unclustered files (-1) are aggregated in the last slot
+    slots = np.where(clusters < 0, len(cluster_ids), clusters)
+    sizes = np.bincount(slots, minlength=len(cluster_ids) + 1)
+    sum_x = np.bincount(slots, weights=coords[:, 0], minlength=len(cluster_ids) + 1)
+    sum_y = np.bincount(slots, weights=coords[:, 1], minlength=len(cluster_ids) + 1)
+
+    aggregates = []
+    for slot, size in enumerate(sizes):
+        if not size:
+            continue
+        label = cluster_labels.get(cluster_ids[slot]) if slot < len(cluster_ids) else "Unclustered"
+        aggregates.append({
+            "index": slot if slot < len(cluster_ids) else -1,
+            "label": label or f"Cluster {slot + 1}",
+            "x": float(sum_x[slot] / size),
+            "y": float(sum_y[slot] / size),
+            "count": int(size)
+        })
+
+    # ---------- LABELS ----------
+    paths = get_file_paths(file_ids)
+    names = [os.path.basename(paths.get(fid, fid)).encode("utf-8") for fid in file_ids]
+    offsets = np.zeros(n + 1, dtype=np.uint32)
+    np.cumsum([len(name) for name in names], out=offsets[1:])
+
+    # ---------- WRITE ----------
+    os.makedirs(output_dir, exist_ok=True)
+    version = time.time_ns() // 1_000_000
+
+    arrays = {}
+    blocks = []
+    position = 0
+    for name, array in (
+        ("x", np.ascontiguousarray(coords[:, 0])),
+        ("y", np.ascontiguousarray(coords[:, 1])),
+        ("cluster", clusters),
+        ("label_offsets", offsets)
+    ):
+        data = array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes()
+        arrays[name] = {"offset": position, "length": len(array), "dtype": array.dtype.name}
+        blocks.append(data)
+        position += len(data)
+
+    points_name, labels_name = f"points-{version}.bin", f"labels-{version}.bin"
+    _write_atomic(os.path.join(output_dir, points_name), b"".join(blocks))
+    _write_atomic(os.path.join(output_dir, labels_name), b"".join(names))
+    _write_atomic(os.path.join(output_dir, "manifest.json"), json.dumps({
+        "version": version,
+        "count": n,
+        "points": points_name,
+        "labels": labels_name,
+        "arrays": arrays,
+        "clusters": aggregates,
+        "cluster_count": len(cluster_ids),
+        "lod_points": GALAXY_LOD_POINTS
+    }).encode("utf-8"))
+
+    copy_script(_plotly_js_path(), output_dir)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(_WEBGL_PAGE)
+
+    # Keep the previous export for pages that read the old manifest
+    for prefix in ("points-", "labels-"):
+        stale = sorted(
+            name for name in os.listdir(output_dir)
+            if name.startswith(prefix) and name.endswith(".bin")
+        )[:-2]
+        for name in stale:
+            os.remove(os.path.join(output_dir, name))
+
+    print(f"✨ WebGL galaxy exported: {n} files, {len(cluster_ids)} clusters → {output_dir}")
+    return n
+
+
+def _plotly_js_path():
+    """
+    plotly.js bundled with the (pinned) plotly package, so the page's
+    version follows requirements.txt and works offline.
+    """
+    import plotly
+
+    path = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"plotly.js not found in the plotly package: {path}")
+    return path
+
+
+def show_galaxy_webgl(layout=None):
+    """
+    Export, serve (with the live graph) and open the WebGL galaxy.
+    """
+    if not export_galaxy_webgl(layout=layout):
+        return
+
+    page = os.path.relpath(GALAXY_OUTPUT_DIR, GRAPH_OUTPUT_DIR).replace(os.sep, "/") + "/index.html"
+    url = serve_graph(page=page)
+    if url is None:
+        return
+    print(f"Opening in browser → {url}")
+    webbrowser.open(url)
+
+
+_WEBGL_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SEFS Semantic Galaxy</title>
+<script src="plotly.min.js"></script>
+<style>
+  html, body { margin: 0; height: 100%; background: #111111; }
+  #galaxy { width: 100%; height: 100%; }
+</style>
+</head>
+<body>
+<div id="galaxy"></div>
+<script>
+const div = document.getElementById("galaxy");
+const decoder = new TextDecoder();
+
+async function load() {
+  const manifest = await (await fetch("manifest.json", { cache: "no-store" })).json();
+  const [points, labels] = await Promise.all([
+    fetch(manifest.points).then(r => r.arrayBuffer()),
+    fetch(manifest.labels).then(r => r.arrayBuffer())
+  ]);
+  const view = (Type, name) => new Type(points, manifest.arrays[name].offset, manifest.arrays[name].length);
+  return {
+    manifest,
+    x: view(Float32Array, "x"),
+    y: view(Float32Array, "y"),
+    cluster: view(Int32Array, "cluster"),
+    offsets: view(Uint32Array, "label_offsets"),
+    labels: new Uint8Array(labels)
+  };
+}
+
+function label(g, i) {
+  return decoder.decode(g.labels.subarray(g.offsets[i], g.offsets[i + 1]));
+}
+
+function inRange(range, x, y) {
+  return !range || (x >= range.x0 && x <= range.x1 && y >= range.y0 && y <= range.y1);
+}
+
+function traces(g, range) {
+  const m = g.manifest;
+  const visible = [];
+  for (let i = 0; i < m.count; i++) {
+    if (inRange(range, g.x[i], g.y[i])) visible.push(i);
+  }
+
+  // Level of detail: too many files in view -> one marker per cluster
+  if (visible.length > m.lod_points) {
+    const shown = m.clusters.filter(c => inRange(range, c.x, c.y));
+    const largest = Math.max(1, ...shown.map(c => c.count));
+    return [{
+      type: "scattergl",
+      mode: "markers",
+      x: shown.map(c => c.x),
+      y: shown.map(c => c.y),
+      text: shown.map(c => c.label + " (" + c.count + " files)"),
+      hoverinfo: "text",
+      marker: {
+        size: shown.map(c => 8 + 40 * Math.sqrt(c.count / largest)),
+        color: shown.map(c => c.index),
+        cmin: -1, cmax: m.cluster_count, colorscale: "Portland", opacity: 0.8
+      }
+    }];
+  }
+
+  const x = new Float32Array(visible.length);
+  const y = new Float32Array(visible.length);
+  const color = new Int32Array(visible.length);
+  const text = new Array(visible.length);
+  visible.forEach((i, k) => {
+    x[k] = g.x[i];
+    y[k] = g.y[i];
+    color[k] = g.cluster[i];
+    text[k] = label(g, i);
+  });
+
+  return [{
+    type: "scattergl",
+    mode: "markers",
+    x, y, text,
+    hoverinfo: "text",
+    marker: { size: 5, color, cmin: -1, cmax: m.cluster_count, colorscale: "Portland" }
+  }];
+}
+
+const layout = {
+  title: { text: "SEFS Semantic Galaxy", font: { color: "white" } },
+  paper_bgcolor: "#111111", plot_bgcolor: "#111111",
+  xaxis: { visible: false }, yaxis: { visible: false, scaleanchor: "x" },
+  hovermode: "closest", uirevision: "galaxy", margin: { l: 0, r: 0, t: 40, b: 0 }
+};
+
+load().then(g => {
+  Plotly.newPlot(div, traces(g, null), layout, { responsive: true, scrollZoom: true });
+
+  let pending = null;
+  div.on("plotly_relayout", event => {
+    clearTimeout(pending);
+    pending = setTimeout(() => {
+      const xa = div._fullLayout.xaxis.range, ya = div._fullLayout.yaxis.range;
+      const range = event["xaxis.autorange"] ? null :
+        { x0: Math.min(...xa), x1: Math.max(...xa), y0: Math.min(...ya), y1: Math.max(...ya) };
+      Plotly.react(div, traces(g, range), layout);
+    }, 150);
+  });
+});
+</script>
+</body>
+</html>
+"""
\ No newline at end of file
@@ -1,23 +1,30 @@
 # main.py
 import time
 
+from core.config import MODEL_WARMUP, GRAPH_OPEN_BROWSER
 from core.database import initialize_database
 from engine.event_engine import start_event_engine, bootstrap_existing_files
 from core.db_api import debug_show_files
 from engine.semantic_engine import (
     build_semantic_space,
     print_semantic_graph,
-    visualize_semantic_graph
+    start_warmup
 )
 from engine.visualization_engine import visualize_semantic_space
 
 from engine.clustering_engine import cluster_files
+from engine.graph_publisher import publish_graph, serve_graph, open_graph_page
 from os_sync.folder_manager import create_semantic_folders
 from engine.search_engine import print_search_results   # ✅ NEW
 
 
 def main():
     print("🌌 Initializing SEFS...")
+
+    # Model loads in the background while the database and bootstrap scan start
+    if MODEL_WARMUP:
+        start_warmup()
+
     initialize_database()
 
     # Scan existing files before live monitoring
@@ -46,7 +53,13 @@ def main():
     print("✅ Files reorganized into semantic folders!")
 
     print("🌐 Launching interactive semantic map...")
-    visualize_semantic_graph(threshold=0.6)
+    publish_graph(graph)
+    if GRAPH_OPEN_BROWSER:
+        open_graph_page()
+    else:
+        url = serve_graph()
+        if url:
+            print(f"🌐 Live semantic graph → {url}")
 
     print("🟢 SEFS is running. Monitoring folder for live changes...")
 
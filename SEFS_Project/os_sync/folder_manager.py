@@ -1,32 +1,244 @@
 import os
 import shutil
-from core.config import ROOT_FOLDER
+import threading
+import time
+from core.config import ROOT_FOLDER, MOVE_BATCH_SIZE, MOVE_EVENT_GRACE
+from core.db_api import (
+    transaction,
+    get_file_paths,
+    rename_file_records,
+    add_semantic_folders,
+    get_semantic_folders,
+    remove_semantic_folders
+)
 from engine.naming_engine import generate_cluster_name
 
 
-def create_semantic_folders(cluster_assignments):
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+# ---------------- OWN MOVES ----------------
+
+# Paths SEFS is moving, with the time their watchdog events stop being ours
+_moving_from = {}
+_moving_to = {}
+_moves_lock = threading.Lock()
+_next_purge = [0.0]
+
+
+def expect_moves(moves, grace=MOVE_EVENT_GRACE):
     """
-    Organize files into semantically named folders.
+    Mark (old_path, new_path) moves as SEFS's own, before making them.
     """
+    expiry = time.monotonic() + grace
+    with _moves_lock:
+        for old_path, new_path in moves:
+            _moving_from[_key(old_path)] = expiry
+            _moving_to[_key(new_path)] = expiry
 
-    print("📂 Organizing semantic folders...")
 
-    for cluster_id, files in cluster_assignments.items():
+def forget_moves(moves):
+    """
+    Drop the expectations of (old_path, new_path) moves that were not made
+    after all: no watchdog event will come to consume them.
+    """
+    with _moves_lock:
+        for old_path, new_path in moves:
+            _moving_from.pop(_key(old_path), None)
+            _moving_to.pop(_key(new_path), None)
+
+
+def is_own_move(src=None, dest=None, consume=True):
+    """
+    True when a watchdog event was caused by an expected move: src is the
+    path a file left (deleted / moved from), dest the path it arrived at
+    (created / modified / moved to). Matching expectations are consumed
+    unless consume is False.
+    """
+    now = time.monotonic()
+
+    with _moves_lock:
+        if now >= _next_purge[0]:
+            for pending in (_moving_from, _moving_to):
+                for path in [path for path, expiry in pending.items() if expiry < now]:
+                    del pending[path]
+            _next_purge[0] = now + 1.0
+
+        if src is not None and _key(src) not in _moving_from:
+            return False
+        if dest is not None and _key(dest) not in _moving_to:
+            return False
+
+        if consume:
+            if src is not None:
+                _moving_from.pop(_key(src), None)
+            if dest is not None:
+                _moving_to.pop(_key(dest), None)
+        return True
+
+
+# ---------------- PLANNING ----------------
+
+def _free_path(folder, filename, taken):
+    """
+    folder/filename, or "name (2).ext" and so on when that is already used.
+    """
+    stem, ext = os.path.splitext(filename)
+    candidate = os.path.join(folder, filename)
+    n = 2
+    while os.path.exists(candidate) or _key(candidate) in taken:
+        candidate = os.path.join(folder, f"{stem} ({n}){ext}")
+        n += 1
+    return candidate
+
+
+def plan_moves(cluster_assignments):
+    """
+    Diff the desired layout against current paths.
+    cluster_assignments is {file_id: cluster_id}; returns [(old_path, new_path)]
+    for the files that are not already in their cluster's folder.
+    """
+    paths = get_file_paths(cluster_assignments)
+    folders = {}
+    taken = set()
+    moves = []
+
+    for file_id, cluster_id in cluster_assignments.items():
+        old_path = paths.get(file_id)
+        if old_path is None:
+            continue
+
+        if cluster_id not in folders:
+            folders[cluster_id] = os.path.join(ROOT_FOLDER, generate_cluster_name(cluster_id))
+        folder = folders[cluster_id]
+
+        if _key(os.path.dirname(old_path)) == _key(folder):
+            continue
+
+        new_path = _free_path(folder, os.path.basename(old_path), taken)
+        taken.add(_key(new_path))
+        moves.append((old_path, new_path))
 
-        folder_name = generate_cluster_name(cluster_id)
-        cluster_path = os.path.join(ROOT_FOLDER, folder_name)
+    return moves
 
-        os.makedirs(cluster_path, exist_ok=True)
 
-        for file_path in files:
-            try:
-                filename = os.path.basename(file_path)
-                new_path = os.path.join(cluster_path, filename)
+# ---------------- MOVING ----------------
+
+def _move(old_path, new_path):
+    """
+    Atomic os.rename when both paths are on one device; shutil.move
+    (copy + delete) across devices.
+    """
+    folder = os.path.dirname(new_path)
+    os.makedirs(folder, exist_ok=True)
+
+    if os.path.exists(new_path):
+        raise FileExistsError(f"destination exists: {new_path}")
+
+    if os.stat(old_path).st_dev == os.stat(folder).st_dev:
+        os.rename(old_path, new_path)
+    else:
+        shutil.move(old_path, new_path)
+
+
+def _remove_empty_folders(folders, created=()):
+    """
+    Remove the semantic folders among folders that are now empty: those
+    recorded by an earlier sync or created (keys in created) by this one.
+    Directories the user made are left alone, empty or not.
+    """
+    managed = get_semantic_folders({_key(folder) for folder in folders}) | set(created)
+    removed = []
+
+    for folder in sorted(folders, key=len, reverse=True):
+        key = _key(folder)
+        if key not in managed or key == _key(ROOT_FOLDER):
+            continue
+        try:
+            os.rmdir(folder)
+        except OSError:
+            continue
+        removed.append(key)
+
+    remove_semantic_folders(removed)
+
+
+def apply_moves(moves, batch_size=MOVE_BATCH_SIZE):
+    """
+    Move files batch_size at a time. A batch's renames and the re-keying of
+    its database records share one transaction, so event workers never see
+    a moved file under its old path; if the database update fails, the
+    batch's files are moved back. Returns the number of files moved.
+    """
+    moved = 0
+    emptied = set()
+    created = set()
+
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        expect_moves(batch)
+        done = []
+
+        try:
+            with transaction():
+                for old_path, new_path in batch:
+                    folder = os.path.dirname(new_path)
+                    if not os.path.isdir(folder):
+                        created.add(_key(folder))
+                    try:
+                        _move(old_path, new_path)
+                        done.append((old_path, new_path))
+                    except OSError as e:
+                        print("Move error:", e)
+
+                rename_file_records(done)
+                add_semantic_folders({_key(os.path.dirname(new_path)) for _, new_path in done})
+
+        except Exception as e:
+            print(f"[ERROR] Folder sync failed, moving {len(done)} files back: {e}")
+            undo = [(new_path, old_path) for old_path, new_path in reversed(done)]
+            expect_moves(undo)
+            not_made = []
+            for new_path, old_path in undo:
+                try:
+                    _move(new_path, old_path)
+                except OSError as undo_error:
+                    print("Move error:", undo_error)
+                    not_made.append((new_path, old_path))
+
+            # Moves that never happened (and undo moves that failed) leave
+            # expectations no event will consume; a later user event on
+            # those paths must not be mistaken for ours
+            made = set(done)
+            forget_moves([move for move in batch if move not in made] + not_made)
+            emptied.update(os.path.dirname(new_path) for _, new_path in done)
+            continue
+
+        made = set(done)
+        forget_moves([move for move in batch if move not in made])
+        moved += len(done)
+        emptied.update(os.path.dirname(old_path) for old_path, _ in done)
+
+    _remove_empty_folders(emptied, created)
+    return moved
+
+
+def create_semantic_folders(cluster_assignments):
+    """
+    Organize files into semantically named folders.
+    cluster_assignments is {file_id: cluster_id}, as returned by
+    cluster_files and take_changed_assignments; only files outside their
+    cluster's folder are moved.
+    """
+
+    print("📂 Organizing semantic folders...")
 
-                if os.path.abspath(file_path) != os.path.abspath(new_path):
-                    shutil.move(file_path, new_path)
+    moves = plan_moves(cluster_assignments)
+    if not moves:
+        print("✅ Semantic folders already in sync")
+        return
 
-            except Exception as e:
-                print("Move error:", e)
+    moved = apply_moves(moves)
 
-    print("✅ Semantic folders updated")
+    print(f"✅ Semantic folders updated ({moved} files moved)")
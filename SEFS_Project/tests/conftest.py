@@ -0,0 +1,57 @@
+# tests/conftest.py
+"""
+SEFS modules read core.config when they are imported, so the database,
+vector files and embedding backend are redirected to a scratch directory
+here, before any test imports them. Embeddings use the "hashing" backend:
+deterministic and no model download.
+
+Run from SEFS_Project:
+    python -m pytest -q
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import core.config as config
+
+
+DATA_DIR = tempfile.mkdtemp(prefix="sefs-tests-")
+
+config.ROOT_FOLDER = os.path.join(DATA_DIR, "root")
+config.DATABASE_PATH = os.path.join(DATA_DIR, "sefs_metadata.db")
+config.VECTOR_STORE_DIR = os.path.join(DATA_DIR, "vectors")
+config.ANN_INDEX_PATH = os.path.join(DATA_DIR, "ann.npz")
+config.ONNX_MODEL_DIR = os.path.join(DATA_DIR, "onnx")
+config.EMBED_SOCKET_PATH = os.path.join(DATA_DIR, "embed.sock")
+config.GRAPH_OUTPUT_DIR = os.path.join(DATA_DIR, "graph")
+config.GALAXY_OUTPUT_DIR = os.path.join(DATA_DIR, "graph", "galaxy")
+
+config.EMBEDDING_BACKEND = "hashing"
+config.EMBEDDING_MODEL_ID = f"hashing-{config.HASHING_DIM}"
+config.EMBED_SERVICE = False
+config.MODEL_WARMUP = False
+
+os.makedirs(config.ROOT_FOLDER)
+
+
+@pytest.fixture(scope="session")
+def db():
+    """
+    The scratch database, initialized once per run. Tests share it, so each
+    one works on its own files.
+    """
+    from core.database import initialize_database, close_connections
+
+    initialize_database()
+    yield config.DATABASE_PATH
+    close_connections()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
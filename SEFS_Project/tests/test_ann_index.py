@@ -0,0 +1,96 @@
+# tests/test_ann_index.py
+
+import numpy as np
+import pytest
+from core.ann_index import IVFIndex
+from core.embedding_store import EmbeddingSnapshot
+from engine.similarity_engine import linear_top_k
+
+
+TOP_K = 10
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(40, 32))
+    vectors = centers[rng.integers(0, 40, 4000)] + rng.normal(scale=0.5, size=(4000, 32))
+    file_ids = [f"f{i}" for i in range(len(vectors))]
+    return EmbeddingSnapshot(1, vectors.astype(np.float32), file_ids, file_ids)
+
+
+@pytest.fixture(scope="module")
+def index(corpus):
+    index = IVFIndex(nprobe=8, rerank_factor=4)
+    index.train(corpus, chunk_rows=1000)
+    return index
+
+
+def fetch_from(corpus):
+    rows = {fid: i for i, fid in enumerate(corpus.file_ids)}
+    return lambda file_ids: {fid: corpus.matrix[rows[fid]] for fid in file_ids}
+
+
+def queries(count=25):
+    rng = np.random.default_rng(11)
+    return rng.normal(size=(count, 32)).astype(np.float32)
+
+
+def recall_at_k(index, corpus, **search_args):
+    found = 0
+    for query in queries():
+        exact = {fid for fid, _ in linear_top_k(corpus, query, TOP_K)}
+        approx = {fid for fid, _ in index.search(query, TOP_K, **search_args)}
+        found += len(exact & approx)
+    return found / (TOP_K * len(queries()))
+
+
+def test_recall_against_linear_scan(index, corpus):
+    assert len(index) == len(corpus)
+    assert recall_at_k(index, corpus, fetch_vectors=fetch_from(corpus)) >= 0.9
+
+
+def test_probing_every_list_is_exact(index, corpus):
+    for query in queries(5):
+        exact = linear_top_k(corpus, query, TOP_K)
+        approx = index.search(query, TOP_K, nprobe=len(index.lists), fetch_vectors=fetch_from(corpus))
+
+        assert [fid for fid, _ in approx] == [fid for fid, _ in exact]
+        assert [s for _, s in approx] == pytest.approx([s for _, s in exact], abs=1e-5)
+
+
+def test_remove_and_add(corpus):
+    index = IVFIndex(nprobe=4)
+    index.train(corpus)
+    query = corpus.matrix[0]
+
+    index.remove("f0")
+    assert "f0" not in {fid for fid, _ in index.search(query, TOP_K)}
+
+    index.add("f0", query)
+    assert index.search(query, 1)[0][0] == "f0"
+    assert len(index) == len(corpus)
+
+
+def test_save_and_load(index, corpus, tmp_path):
+    path = str(tmp_path / "ann.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path, nprobe=index.nprobe, rerank_factor=index.rerank_factor)
+
+    assert len(loaded) == len(index)
+    for query in queries(5):
+        assert loaded.search(query, TOP_K) == index.search(query, TOP_K)
+
+
+def test_rekey_moves_entry_to_new_id(corpus):
+    small = EmbeddingSnapshot(1, corpus.matrix[:200], corpus.file_ids[:200], corpus.file_ids[:200])
+    index = IVFIndex(nprobe=len(small), rerank_factor=4)
+    index.train(small)
+
+    index.rekey("f5", "moved5")
+    index.rekey("f6", "f7")
+
+    assert len(index) == 199
+    assert index.search(small.matrix[5], 1)[0][0] == "moved5"
+    assert index.search(small.matrix[6], 1)[0][0] == "f7"
+    assert "f5" not in index._where and "f6" not in index._where
@@ -0,0 +1,106 @@
+# tests/test_clustering_engine.py
+
+import numpy as np
+import pytest
+import core.db_api as db_api
+import engine.clustering_engine as clustering_engine
+import engine.event_engine as event_engine
+from core.db_api import transaction
+from engine.semantic_engine import generate_embedding, build_semantic_space
+from engine.similarity_engine import SemanticAdjacency, build_csr
+
+
+def snapshot_state():
+    state = clustering_engine._state
+    with state.lock:
+        return (
+            {cid: np.array(total) for cid, total in state.sums.items()},
+            dict(state.sizes),
+            dict(state.labels),
+            dict(state.changed),
+            state.ops_since_full
+        )
+
+
+def assert_state_equal(before, after):
+    sums_before, *rest_before = before
+    sums_after, *rest_after = after
+    assert rest_after == rest_before
+    assert sums_after.keys() == sums_before.keys()
+    for cluster_id, total in sums_before.items():
+        assert np.array_equal(sums_after[cluster_id], total)
+
+
+@pytest.fixture
+def indexed_file(db, tmp_path):
+    path = tmp_path / "orbit.txt"
+    path.write_text("orbit rocket launch satellite")
+    event_engine.process_file(str(path), rebuild=False)
+    return db_api.generate_file_id(str(path))
+
+
+def test_update_is_undone_on_rollback(indexed_file):
+    before = snapshot_state()
+    clusters_before = db_api.get_cluster_centroids()
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            clustering_engine.update_file_cluster(indexed_file, generate_embedding("bread flour oven recipe"))
+            raise RuntimeError("later statement failed")
+
+    assert_state_equal(before, snapshot_state())
+    assert db_api.get_file_cluster(indexed_file) is not None
+    assert len(db_api.get_cluster_centroids()) == len(clusters_before)
+
+
+def test_removal_is_undone_on_rollback(indexed_file):
+    cluster_id = db_api.get_file_cluster(indexed_file)
+    before = snapshot_state()
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            clustering_engine.remove_file_from_cluster(indexed_file)
+            raise RuntimeError("delete failed")
+
+    assert_state_equal(before, snapshot_state())
+    assert db_api.get_file_cluster(indexed_file) == cluster_id
+
+
+def test_committed_update_is_kept(indexed_file):
+    old_cluster = db_api.get_file_cluster(indexed_file)
+    sizes_before = dict(clustering_engine._state.sizes)
+
+    with transaction():
+        cluster_id = clustering_engine.update_file_cluster(indexed_file, generate_embedding("bread flour oven recipe"))
+        db_api.assign_file_to_cluster(indexed_file, cluster_id)
+
+    assert cluster_id != old_cluster
+    assert clustering_engine._state.sizes.get(cluster_id) == sizes_before.get(cluster_id, 0) + 1
+    assert clustering_engine._state.changed[indexed_file] == cluster_id
+
+
+def test_graph_components_follow_close_edges():
+    rows, cols = np.array([0, 1, 3]), np.array([1, 2, 4])
+    sims = np.array([0.9, 0.7, 0.4], dtype=np.float32)
+    indptr, indices, data = build_csr(5, rows, cols, sims)
+    adjacency = SemanticAdjacency(["a", "b", "c", "d", "e"], indptr, indices, data)
+
+    labels = clustering_engine._graph_components(adjacency, distance_threshold=0.5)
+
+    # d-e is too far apart (distance 0.6) to join
+    assert labels[0] == labels[1] == labels[2]
+    assert len({labels[0], labels[3], labels[4]}) == 3
+
+
+def test_large_graph_is_clustered_without_a_dense_matrix(indexed_file, monkeypatch):
+    def no_dense(adjacency):
+        raise AssertionError("dense matrix built")
+
+    monkeypatch.setattr(clustering_engine, "DENSE_CLUSTERING_MAX_FILES", 1)
+    monkeypatch.setattr(clustering_engine, "semantic_graph_to_matrix", no_dense)
+    adjacency = build_semantic_space()
+
+    assignments = clustering_engine.cluster_files(adjacency)
+
+    assert set(assignments) == set(adjacency.file_ids)
+    assert db_api.get_file_cluster(indexed_file) == assignments[indexed_file]
@@ -0,0 +1,103 @@
+# tests/test_db_api.py
+
+import numpy as np
+import pytest
+from core.config import HASHING_DIM
+import core.db_api as db_api
+from core.db_api import transaction
+
+
+@pytest.fixture
+def mmap_files(db, tmp_path, monkeypatch):
+    """
+    Three registered files, with the memory-mapped vector backend active.
+    Returns their file ids and paths.
+    """
+    monkeypatch.setattr(db_api, "VECTOR_BACKEND", "mmap")
+
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"document number {i}")
+        paths.append(str(path))
+
+    return [db_api.register_or_update_file(path) for path in paths], paths
+
+
+def test_mmap_writes_replace_in_chunks(mmap_files):
+    file_ids, paths = mmap_files
+    rng = np.random.default_rng(5)
+    first = rng.normal(size=(3, HASHING_DIM)).astype(np.float32)
+    second = rng.normal(size=(3, HASHING_DIM)).astype(np.float32)
+
+    db_api.store_embeddings_bulk(zip(file_ids, first))
+    # Chunks smaller than the batch: every replaced row must still be found
+    with transaction():
+        db_api._store_embeddings_mmap(list(zip(file_ids, second)), batch_size=2)
+
+    snapshot = db_api.get_embedding_snapshot()
+    rows = [i for i, file_id in enumerate(snapshot.file_ids) if file_id in file_ids]
+
+    assert sorted(snapshot.file_ids[i] for i in rows) == sorted(file_ids)
+    for i in rows:
+        k = file_ids.index(snapshot.file_ids[i])
+        assert snapshot.paths[i] == paths[k]
+        assert np.allclose(snapshot.matrix[i], second[k], atol=1e-2)
+
+
+def test_get_all_embeddings_reads_the_mmap_store(mmap_files):
+    file_ids, paths = mmap_files
+    vectors = np.eye(3, HASHING_DIM, dtype=np.float32)
+    db_api.store_embeddings_bulk(zip(file_ids, vectors))
+
+    found = {row["file_id"]: row for row in db_api.get_all_embeddings()}
+
+    for file_id, path, vector in zip(file_ids, paths, vectors):
+        assert found[file_id]["path"] == path
+        assert np.allclose(found[file_id]["embedding"], vector, atol=1e-2)
+
+
+@pytest.fixture
+def ann_index(db, tmp_path, monkeypatch):
+    """
+    Force an ANN index over the shared corpus; counts training runs.
+    """
+    path = tmp_path / "first.txt"
+    path.write_text("a file so the corpus is not empty")
+    file_id = db_api.register_or_update_file(str(path))
+    db_api.store_semantic_data(file_id, np.ones(HASHING_DIM, dtype=np.float32))
+
+    trained = []
+    train = db_api.IVFIndex.train
+
+    def counting_train(self, *args, **kwargs):
+        trained.append(self)
+        return train(self, *args, **kwargs)
+
+    monkeypatch.setattr(db_api.IVFIndex, "train", counting_train)
+    monkeypatch.setattr(db_api, "ANN_MIN_VECTORS", 1)
+    monkeypatch.setattr(db_api, "ANN_INDEX_PATH", str(tmp_path / "ann.npz"))
+    monkeypatch.setattr(db_api, "_ann_index", None)
+
+    db_api.get_ann_index()
+    yield file_id, trained
+    monkeypatch.setattr(db_api, "_ann_index", None)
+
+
+def test_saved_ann_index_is_reused_while_current(ann_index):
+    _, trained = ann_index
+    db_api._ann_index = None
+
+    assert db_api.get_ann_index() is not None
+    assert len(trained) == 1
+
+
+def test_stale_ann_index_is_rebuilt(ann_index):
+    file_id, trained = ann_index
+
+    # Same count, different vector; the process "crashes" before saving the index
+    db_api.store_semantic_data(file_id, np.full(HASHING_DIM, -1.0, dtype=np.float32))
+    db_api._ann_index = None
+
+    db_api.get_ann_index()
+    assert len(trained) == 2
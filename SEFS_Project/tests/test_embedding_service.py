@@ -0,0 +1,45 @@
+# tests/test_embedding_service.py
+
+import os
+import socket
+import tempfile
+import threading
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def service():
+    from engine.embedding_service import create_server
+
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="sefs-embed-"), "embed.sock")
+    server = create_server(socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+    os.remove(socket_path)
+    os.rmdir(os.path.dirname(socket_path))
+
+
+def test_texts_are_embedded_remotely(service):
+    from engine.embedding_service import RemoteBackend
+    from engine.semantic_engine import generate_embedding
+
+    vectors = RemoteBackend(service).encode(["orbit rocket launch"])
+
+    assert np.allclose(vectors[0], generate_embedding("orbit rocket launch"))
+
+
+def test_text_without_embedding_raises_instead_of_zeros(service):
+    from engine.embedding_service import RemoteBackend
+
+    backend = RemoteBackend(service)
+
+    with pytest.raises(RuntimeError, match="1 of 2 texts"):
+        backend.encode(["orbit rocket launch", "   "])
+
+    # The connection stays usable for the next request
+    assert backend.encode(["bread flour"]).shape == (1, backend.dim)
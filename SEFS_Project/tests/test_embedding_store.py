@@ -0,0 +1,75 @@
+# tests/test_embedding_store.py
+
+import numpy as np
+from core.embedding_store import EmbeddingStore
+
+
+def make_store(n, dim=4):
+    rows = [(f"id{i}", f"/files/{i}.txt", np.full(dim, i, dtype=np.float32)) for i in range(n)]
+    store = EmbeddingStore(lambda: rows)
+    store.snapshot()
+    return store
+
+
+def contents(snapshot):
+    return {file_id: int(row[0]) for file_id, row in zip(snapshot.file_ids, snapshot.matrix)}
+
+
+def test_remove_many_keeps_rows_aligned():
+    store = make_store(6)
+
+    store.remove_many(["id5", "id1", "id4", "missing"])
+
+    snapshot = store.snapshot()
+    assert contents(snapshot) == {"id0": 0, "id2": 2, "id3": 3}
+    assert sorted(snapshot.paths) == ["/files/0.txt", "/files/2.txt", "/files/3.txt"]
+
+
+def test_old_snapshot_is_not_changed():
+    store = make_store(4)
+    old = store.snapshot()
+
+    store.remove_many(["id0"])
+    store.upsert_many([("id1", "/files/1.txt", np.full(4, 9, dtype=np.float32))])
+
+    assert contents(old) == {"id0": 0, "id1": 1, "id2": 2, "id3": 3}
+    assert contents(store.snapshot()) == {"id1": 9, "id2": 2, "id3": 3}
+
+
+def test_matrix_is_copied_only_when_shared():
+    store = make_store(4)
+    store.remove_many(["id0"])
+    matrix = store._matrix
+
+    # Nobody has taken the published snapshot yet: edit the buffers in place
+    store.remove_many(["id1", "id2"])
+    store.upsert_many([("id3", "/files/3.txt", np.zeros(4, dtype=np.float32))])
+    assert store._matrix is matrix
+
+    store.snapshot()
+    store.remove_many(["id3"])
+    assert store._matrix is not matrix
+
+
+def test_rekey_many_relabels_in_place():
+    store = make_store(4)
+    old = store.snapshot()
+    matrix = store._matrix
+
+    store.rekey_many([("id0", "new0", "/moved/0.txt"), ("missing", "new9", "/moved/9.txt")])
+
+    snapshot = store.snapshot()
+    assert store._matrix is matrix
+    assert contents(snapshot) == {"new0": 0, "id1": 1, "id2": 2, "id3": 3}
+    assert "/moved/0.txt" in snapshot.paths
+    assert contents(old) == {"id0": 0, "id1": 1, "id2": 2, "id3": 3}
+
+
+def test_rekey_many_drops_replaced_destination():
+    store = make_store(4)
+
+    # id1 lands on id2's id; id3's destination never had a vector
+    store.rekey_many([("id1", "id2", "/files/2.txt"), ("missing", "id3", "/files/3.txt")])
+
+    assert contents(store.snapshot()) == {"id0": 0, "id2": 1}
+    assert len(store) == 2
@@ -0,0 +1,89 @@
+# tests/test_event_engine.py
+
+import os
+import numpy as np
+import pytest
+from core.config import HASHING_DIM
+import core.db_api as db_api
+import engine.event_engine as event_engine
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    """
+    Paths check_file hashes during the test.
+    """
+    calls = []
+
+    def compute_file_hash(path, algorithm=None):
+        calls.append(path)
+        return db_api.compute_file_hash(path, algorithm)
+
+    monkeypatch.setattr(event_engine, "compute_file_hash", compute_file_hash)
+    return calls
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_processed_file_is_not_hashed_again(db, tmp_path, hash_calls):
+    path = write(tmp_path / "notes.txt", "quarterly budget review and forecast")
+    event_engine.process_file(path, rebuild=False)
+    hash_calls.clear()
+
+    file_hash, embedding, needs_text = event_engine.check_file(path)
+
+    assert hash_calls == []
+    assert file_hash == db_api.compute_file_hash(path)
+    assert embedding is None and not needs_text
+    assert path not in event_engine._checked_signatures
+
+
+def test_registered_file_is_not_hashed_again(db, tmp_path, hash_calls):
+    # Registration without a known hash takes the stat signature itself
+    path = write(tmp_path / "plain.txt", "a file registered directly")
+    db_api.save_file_embedding(path, np.ones(HASHING_DIM, dtype=np.float32), None)
+
+    file_hash, _, needs_text = event_engine.check_file(path)
+
+    assert hash_calls == []
+    assert file_hash == db_api.compute_file_hash(path)
+    assert not needs_text
+
+
+def test_changed_file_is_hashed(db, tmp_path, hash_calls):
+    path = write(tmp_path / "draft.txt", "first version of the draft")
+    event_engine.process_file(path, rebuild=False)
+    hash_calls.clear()
+
+    write(path, "second, longer version of the same draft")
+    _, _, needs_text = event_engine.check_file(path)
+
+    assert hash_calls == [path]
+    assert needs_text
+    event_engine._checked_signatures.pop(path, None)
+
+
+def test_touched_file_is_hashed_once(db, tmp_path, hash_calls):
+    path = write(tmp_path / "touched.txt", "content that does not change")
+    event_engine.process_file(path, rebuild=False)
+    hash_calls.clear()
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    # Same content: the new signature is stored, so the next check is stat-only
+    assert event_engine.check_file(path)[2] is False
+    assert event_engine.check_file(path)[2] is False
+    assert hash_calls == [path]
+
+
+def test_unreadable_file_is_a_failure(db, tmp_path, monkeypatch):
+    path = write(tmp_path / "locked.txt", "cannot be read")
+    monkeypatch.setattr(event_engine, "compute_file_hash", lambda path, algorithm=None: None)
+
+    assert event_engine.check_file(path) == (None, None, False)
+    assert path not in event_engine._checked_signatures
@@ -0,0 +1,105 @@
+# tests/test_event_queue.py
+
+import time
+import threading
+import pytest
+from engine.event_queue import CoalescingEventQueue
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def queue():
+    queue = CoalescingEventQueue(debounce=0.2, workers=2)
+    queue.start()
+    yield queue
+    queue.stop()
+
+
+def test_waits_for_the_debounce_window(queue):
+    ran = []
+    queue.submit("a.txt", lambda: ran.append(time.monotonic()))
+    submitted = time.monotonic()
+
+    time.sleep(0.1)
+    assert ran == []
+
+    assert wait_until(lambda: ran)
+    assert ran[0] - submitted >= 0.2
+
+
+def test_burst_runs_only_the_last_task(queue):
+    ran = []
+    for i in range(5):
+        queue.submit("a.txt", lambda i=i: ran.append(i))
+        time.sleep(0.02)
+
+    assert wait_until(lambda: queue.processed == 1)
+    time.sleep(0.3)
+    assert ran == [4]
+    assert queue.coalesced == 4
+
+
+def test_resubmitting_restarts_the_window(queue):
+    ran = []
+    start = time.monotonic()
+    for _ in range(4):
+        queue.submit("a.txt", lambda: ran.append(time.monotonic()))
+        time.sleep(0.05)
+
+    assert wait_until(lambda: ran)
+    # Last submit at ~0.15 s, so nothing can run before ~0.35 s
+    assert ran[0] - start >= 0.3
+    assert len(ran) == 1
+
+
+def test_keys_are_independent(queue):
+    ran = []
+    queue.submit("a.txt", lambda: ran.append("a"))
+    queue.submit("b.txt", lambda: ran.append("b"))
+
+    assert wait_until(lambda: queue.processed == 2)
+    assert sorted(ran) == ["a", "b"]
+    assert queue.coalesced == 0
+
+
+def test_one_key_never_runs_twice_at_once(queue):
+    running = []
+    overlaps = []
+    release = threading.Event()
+
+    def task():
+        running.append(1)
+        if len(running) > 1:
+            overlaps.append(1)
+        release.wait(2)
+        running.pop()
+
+    queue.submit("a.txt", task, debounce=0)
+    assert wait_until(lambda: running)
+
+    # Submitted while the first run is in progress: waits for it
+    queue.submit("a.txt", task, debounce=0)
+    time.sleep(0.2)
+    assert queue.processed == 0
+    release.set()
+
+    assert wait_until(lambda: queue.processed == 2)
+    assert overlaps == []
+
+
+def test_failed_task_is_counted(queue):
+    def task():
+        raise RuntimeError("boom")
+
+    queue.submit("a.txt", task, debounce=0)
+    assert wait_until(lambda: queue.processed == 1)
+    assert queue.failed == 1
+    assert queue.depth() == 0
@@ -0,0 +1,156 @@
+# tests/test_folder_manager.py
+
+import os
+import sqlite3
+import tempfile
+import pytest
+import core.db_api as db_api
+import engine.event_engine as event_engine
+import os_sync.folder_manager as folder_manager
+from core.config import ROOT_FOLDER
+from os_sync.folder_manager import plan_moves, apply_moves
+
+
+TEXTS = [
+    "orbit rocket launch satellite",
+    "rocket engine launch fuel",
+    "bread flour oven recipe",
+    "flour sugar oven baking",
+]
+
+
+@pytest.fixture
+def inbox(db):
+    """
+    Four ingested files in a fresh folder under ROOT_FOLDER.
+    Returns their paths.
+    """
+    folder = tempfile.mkdtemp(prefix="inbox-", dir=ROOT_FOLDER)
+    paths = []
+    for i, text in enumerate(TEXTS):
+        path = os.path.join(folder, f"note{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        event_engine.process_file(path, rebuild=False)
+        paths.append(path)
+    return paths
+
+
+def assignments(paths):
+    return db_api.get_file_clusters([db_api.generate_file_id(path) for path in paths])
+
+
+def indexed_ids():
+    ids = set()
+    for file_ids, _ in db_api.open_embedding_reader().iter_chunks():
+        ids.update(file_ids)
+    return ids
+
+
+def test_plan_moves_only_misplaced_files(inbox):
+    moves = plan_moves(assignments(inbox))
+
+    assert sorted(old for old, _ in moves) == sorted(inbox)
+    for old_path, new_path in moves:
+        assert os.path.dirname(os.path.dirname(new_path)) == ROOT_FOLDER
+        assert os.path.basename(new_path) == os.path.basename(old_path)
+
+    assert apply_moves(moves) == len(inbox)
+    assert plan_moves(assignments([new for _, new in moves])) == []
+
+
+def test_apply_moves_rekeys_records(inbox):
+    moves = plan_moves(assignments(inbox))
+
+    assert apply_moves(moves) == len(inbox)
+
+    for old_path, new_path in moves:
+        assert os.path.exists(new_path) and not os.path.exists(old_path)
+        new_id = db_api.generate_file_id(new_path)
+        assert db_api.get_file_path_by_id(new_id) == new_path
+        assert db_api.get_file_path_by_id(db_api.generate_file_id(old_path)) is None
+        assert new_id in indexed_ids()
+
+    # The inbox is the user's own folder: it stays, even when emptied
+    assert os.path.isdir(os.path.dirname(inbox[0]))
+
+
+def test_only_semantic_folders_are_removed(db):
+    cluster_folder = tempfile.mkdtemp(prefix="cluster-", dir=ROOT_FOLDER)
+    user_folder = tempfile.mkdtemp(prefix="mine-", dir=ROOT_FOLDER)
+    db_api.add_semantic_folders([folder_manager._key(cluster_folder)])
+
+    folder_manager._remove_empty_folders({cluster_folder, user_folder})
+
+    assert not os.path.exists(cluster_folder)
+    assert os.path.isdir(user_folder)
+    assert db_api.get_semantic_folders([folder_manager._key(cluster_folder)]) == set()
+
+
+def test_apply_moves_rolls_back_on_database_failure(inbox, monkeypatch):
+    moves = plan_moves(assignments(inbox))
+    folders_before = set(os.listdir(ROOT_FOLDER))
+    old_ids = {db_api.generate_file_id(old) for old, _ in moves}
+
+    def failing_rename(batch):
+        # Writes happen, then the transaction fails before commit
+        db_api.rename_file_records(batch)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(folder_manager, "rename_file_records", failing_rename)
+
+    assert apply_moves(moves) == 0
+
+    for old_path, new_path in moves:
+        assert os.path.exists(old_path) and not os.path.exists(new_path)
+        assert db_api.get_file_path_by_id(db_api.generate_file_id(old_path)) == old_path
+        assert db_api.get_file_path_by_id(db_api.generate_file_id(new_path)) is None
+
+    ids = indexed_ids()
+    assert old_ids <= ids
+    assert not {db_api.generate_file_id(new) for _, new in moves} & ids
+
+    # Cluster folders created for the failed batch are removed again
+    assert set(os.listdir(ROOT_FOLDER)) == folders_before
+
+
+def test_only_the_failed_batch_is_rolled_back(inbox, monkeypatch):
+    moves = plan_moves(assignments(inbox))
+    calls = []
+
+    def fail_second_batch(batch):
+        calls.append(batch)
+        db_api.rename_file_records(batch)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(folder_manager, "rename_file_records", fail_second_batch)
+
+    assert apply_moves(moves, batch_size=2) == 2
+
+    committed, rolled_back = moves[:2], moves[2:]
+    for old_path, new_path in committed:
+        assert os.path.exists(new_path)
+        assert db_api.get_file_path_by_id(db_api.generate_file_id(new_path)) == new_path
+    for old_path, new_path in rolled_back:
+        assert os.path.exists(old_path) and not os.path.exists(new_path)
+        assert db_api.get_file_path_by_id(db_api.generate_file_id(old_path)) == old_path
+
+
+def test_expectations_of_moves_not_made_are_cleared(inbox, monkeypatch):
+    moves = plan_moves(assignments(inbox))
+    missing, _ = moves[0]
+    os.remove(missing)
+
+    def failing_rename(batch):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(folder_manager, "rename_file_records", failing_rename)
+
+    assert apply_moves(moves) == 0
+
+    # The failed move produces no events: a real user event there is not ours
+    assert not folder_manager.is_own_move(src=missing, consume=False)
+    assert not folder_manager.is_own_move(dest=moves[0][1], consume=False)
+    # Moves made and undone still expect their events
+    assert folder_manager.is_own_move(src=moves[1][0], dest=moves[1][1])
@@ -0,0 +1,33 @@
+# tests/test_graph_publisher.py
+
+import socket
+import urllib.request
+import pytest
+import engine.graph_publisher as graph_publisher
+
+
+@pytest.fixture
+def busy_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+@pytest.fixture
+def no_server(monkeypatch):
+    monkeypatch.setattr(graph_publisher, "_server", None)
+    yield
+    if graph_publisher._server is not None:
+        graph_publisher._server.shutdown()
+        graph_publisher._server.server_close()
+
+
+def test_busy_port_falls_back_to_a_free_one(tmp_path, busy_port, no_server):
+    url = graph_publisher.serve_graph(output_dir=str(tmp_path), port=busy_port)
+
+    assert url is not None
+    assert f":{busy_port}/" not in url
+    with urllib.request.urlopen(url, timeout=5) as response:
+        assert response.status == 200
@@ -0,0 +1,153 @@
+# tests/test_ingest_pipeline.py
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import Future
+import pytest
+import engine.content_engine as content_engine
+from engine.content_engine import extract_text_from_pdf, ExtractionTimeout
+from engine.ingest_pipeline import IngestPipeline
+
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc"), reason="reads process state from /proc")
+
+
+def is_alive(pid):
+    """
+    False once the process has exited (a zombie waiting to be reaped counts as exited).
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def wait_for_pid(path, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "stuck task never started"
+        time.sleep(0.05)
+    with open(path) as f:
+        return int(f.read())
+
+
+def hang_forever(pid_path):
+    with open(pid_path + ".tmp", "w") as f:
+        f.write(str(os.getpid()))
+    os.replace(pid_path + ".tmp", pid_path)
+    while True:
+        time.sleep(1)
+
+
+def extract_or_hang(path):
+    """
+    Extract worker for the pipeline: files named stuck*.txt never return.
+    """
+    if os.path.basename(path).startswith("stuck"):
+        hang_forever(path + ".pid")
+    with open(path, encoding="utf-8") as f:
+        return f.read(), {"terms": {}, "summary": "", "length": 0}
+
+
+def embedded(text):
+    future = Future()
+    future.set_result(([float(len(text))], []))
+    return future
+
+
+def test_stuck_extraction_is_killed(tmp_path):
+    paths = []
+    for name in ["a.txt", "stuck.txt", "b.txt", "c.txt", "d.txt"]:
+        path = tmp_path / name
+        path.write_text(f"contents of {name}")
+        paths.append(str(path))
+
+    written, errors = [], []
+    pipeline = IngestPipeline(
+        paths,
+        check=lambda path: (path, None, True),
+        extract=extract_or_hang,
+        embed=embedded,
+        write=lambda entries, new: written.extend(path for path, _, _ in entries),
+        on_error=lambda path, file_hash, error: errors.append((path, error)),
+        hash_workers=2,
+        extract_workers=2,
+        extract_timeout=1.0
+    )
+
+    started = time.monotonic()
+    pipeline.run()
+
+    assert time.monotonic() - started < 15
+    stuck = str(tmp_path / "stuck.txt")
+    assert [path for path, _ in errors] == [stuck]
+    assert isinstance(errors[0][1], TimeoutError)
+    assert sorted(written) == sorted(path for path in paths if path != stuck)
+    assert pipeline.failed == 1
+
+    pid = wait_for_pid(stuck + ".pid")
+    deadline = time.monotonic() + 5
+    while is_alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_alive(pid)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the patched page reader only reaches child processes through fork"
+)
+def test_stuck_pdf_page_is_killed(tmp_path, monkeypatch):
+    from PyPDF2 import PdfWriter
+
+    path = str(tmp_path / "scan.pdf")
+    writer = PdfWriter()
+    writer.add_blank_page(72, 72)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    pid_path = str(tmp_path / "page.pid")
+    monkeypatch.setattr(content_engine, "PDF_TIMEOUT", 1)
+    monkeypatch.setattr(content_engine, "iter_pdf_pages", lambda *args: hang_forever(pid_path))
+
+    started = time.monotonic()
+    with pytest.raises(ExtractionTimeout):
+        extract_text_from_pdf(path)
+    assert time.monotonic() - started < 5
+
+    pid = wait_for_pid(pid_path)
+    assert pid != os.getpid()
+    assert not is_alive(pid)
+
+
+def extract_text_file(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read(), {"terms": {}, "summary": "", "length": 0}
+
+
+def test_unreadable_files_are_not_followers(tmp_path):
+    # check() found no hash for the unreadable files; they must not be
+    # grouped together as copies of one "None" content
+    paths = []
+    for name in ["gone1.txt", "gone2.txt", "gone3.txt", "ok.txt"]:
+        path = tmp_path / name
+        path.write_text(f"contents of {name}")
+        paths.append(str(path))
+    readable = str(tmp_path / "ok.txt")
+
+    written = []
+    pipeline = IngestPipeline(
+        paths,
+        check=lambda path: (path if path == readable else None, None, True),
+        extract=extract_text_file,
+        embed=embedded,
+        write=lambda entries, new: written.extend(path for path, _, _ in entries),
+        hash_workers=2,
+        extract_workers=1
+    )
+    pipeline.run()
+
+    assert written == [readable]
+    assert pipeline.failed == 3
+    assert pipeline._followers == {}
@@ -0,0 +1,88 @@
+# tests/test_search_engine.py
+
+import pytest
+import core.db_api as db_api
+import engine.event_engine as event_engine
+import engine.search_engine as search_engine
+from engine.semantic_engine import generate_embedding
+from engine.search_engine import (
+    search_passages,
+    semantic_search,
+    document_hits,
+    reciprocal_rank_fusion
+)
+
+
+@pytest.fixture(scope="module")
+def corpus(db, tmp_path_factory):
+    """
+    One file holds a rare identifier; the others talk about the same topic
+    in plain words, so vector similarity alone has no reason to prefer it.
+    """
+    if not db_api._text_index_ready():
+        pytest.skip("SQLite was built without FTS5")
+
+    folder = tmp_path_factory.mktemp("search")
+    texts = {
+        "incident.txt": "the upload worker failed with ERR_QX7_TIMEOUT after retrying twice",
+        "timeouts.txt": "upload worker timeout errors and retry behaviour explained",
+        "retries.txt": "how the worker retries failed uploads after a timeout error",
+        "errors.txt": "list of worker error codes and upload timeout failures",
+        "budget.txt": "quarterly budget forecast and spending review",
+        "invoice_8842.txt": "payment terms and totals for the march order",
+    }
+
+    paths = {}
+    for name, text in texts.items():
+        path = str(folder / name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        event_engine.process_file(path, rebuild=False)
+        paths[name] = path
+
+    return paths
+
+
+@pytest.fixture
+def vague_queries(monkeypatch):
+    """
+    Embed every query the way a model that has never seen an identifier
+    would: as the generic topic of the decoy files. Only the lexical side
+    can then find the exact match.
+    """
+    generic = generate_embedding("upload worker timeout errors")
+    monkeypatch.setattr(search_engine, "generate_embedding", lambda text: generic)
+
+    search_engine._query_embeddings.clear()
+    search_engine._results.clear()
+    yield generic
+    search_engine._query_embeddings.clear()
+    search_engine._results.clear()
+
+
+def test_exact_identifier_ranks_first(corpus, vague_queries):
+    incident = db_api.generate_file_id(corpus["incident.txt"])
+    assert document_hits(vague_queries, top_k=1)[0][0] != incident
+
+    hits = search_passages("ERR_QX7_TIMEOUT", top_k=3)
+
+    assert hits[0][0] == incident
+
+
+def test_file_name_match_ranks_first(corpus, vague_queries):
+    results = semantic_search("invoice_8842", top_k=3)
+
+    assert results[0][0] == corpus["invoice_8842.txt"]
+
+
+def test_vector_candidates_fill_in_without_lexical_matches(corpus):
+    # No indexed word matches, so every hit comes from the vector ranking
+    assert db_api.lexical_search("zyxwv") == []
+    assert len(search_passages("zyxwv", top_k=3)) == 3
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+
+    # c: 1/63 + 1/61 just beats b: 2/62; a and d are in one list each
+    assert fused == ["c", "b", "a", "d"]
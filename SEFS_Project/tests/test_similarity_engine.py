@@ -0,0 +1,87 @@
+# tests/test_similarity_engine.py
+
+import numpy as np
+import pytest
+from core.embedding_store import EmbeddingSnapshot
+from engine.similarity_engine import thresholded_neighbors, thresholded_neighbors_chunked
+
+
+def baseline_neighbors(file_ids, embeddings, threshold):
+    """
+    The pairwise loop build_semantic_space used before the tiled engine.
+    """
+    adjacency = {}
+    n = len(file_ids)
+
+    for i in range(n):
+        adjacency.setdefault(file_ids[i], [])
+        for j in range(i + 1, n):
+            denom = np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[j])
+            sim = 0.0 if denom == 0 else float(np.dot(embeddings[i], embeddings[j]) / denom)
+            if sim >= threshold:
+                adjacency[file_ids[i]].append((file_ids[j], sim))
+                adjacency.setdefault(file_ids[j], []).append((file_ids[i], sim))
+
+    return adjacency
+
+
+def as_edges(adjacency):
+    return {
+        file_id: dict(neighbors)
+        for file_id, neighbors in adjacency.items()
+    }
+
+
+@pytest.fixture
+def corpus():
+    # Three loose topics, so the graph has both dense and empty regions
+    rng = np.random.default_rng(7)
+    topics = rng.normal(size=(3, 16))
+    embeddings = np.array([topics[i % 3] + rng.normal(scale=0.6, size=16) for i in range(40)])
+    embeddings[5] = 0.0     # a zero vector never gets an edge
+    file_ids = [f"f{i}" for i in range(40)]
+    return file_ids, embeddings.astype(np.float32)
+
+
+@pytest.mark.parametrize("tile_size", [1, 7, 16, 1024])
+def test_thresholded_neighbors_matches_baseline(corpus, tile_size):
+    file_ids, embeddings = corpus
+    expected = as_edges(baseline_neighbors(file_ids, embeddings, 0.6))
+
+    adjacency = thresholded_neighbors(file_ids, embeddings, 0.6, tile_size=tile_size)
+
+    edges = as_edges(adjacency)
+    assert edges.keys() == expected.keys()
+    for file_id, neighbors in expected.items():
+        assert edges[file_id].keys() == neighbors.keys()
+        for neighbor, sim in neighbors.items():
+            assert edges[file_id][neighbor] == pytest.approx(sim, abs=1e-5)
+    assert adjacency.edge_count == sum(len(n) for n in expected.values()) // 2
+    assert adjacency["f5"] == []
+
+
+def test_chunked_matches_in_memory(corpus):
+    file_ids, embeddings = corpus
+    reader = EmbeddingSnapshot(1, embeddings, file_ids, file_ids)
+
+    chunked = thresholded_neighbors_chunked(reader, 0.6, tile_size=9)
+    in_memory = thresholded_neighbors(file_ids, embeddings, 0.6)
+
+    assert chunked.file_ids == in_memory.file_ids
+    assert np.array_equal(chunked.indptr, in_memory.indptr)
+    assert np.array_equal(chunked.indices, in_memory.indices)
+    assert np.allclose(chunked.data, in_memory.data)
+
+
+def test_csr_is_symmetric(corpus):
+    file_ids, embeddings = corpus
+    dense = thresholded_neighbors(file_ids, embeddings, 0.6, tile_size=8).to_dense()
+
+    assert np.allclose(dense, dense.T)
+    assert not dense.diagonal().any()
+
+
+def test_empty_input():
+    adjacency = thresholded_neighbors([], np.zeros((0, 4)))
+    assert len(adjacency) == 0
+    assert adjacency.edge_count == 0
@@ -0,0 +1,121 @@
+# tests/test_vector_format.py
+
+import pickle
+import sqlite3
+import numpy as np
+import pytest
+from core.vector_format import (
+    encode_vector,
+    decode_vector,
+    count_legacy_vectors,
+    migrate_database
+)
+
+
+def create_legacy_database(path, embeddings, centroids):
+    """
+    A database in the original schema, with vectors stored as pickles.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE SEMANTICS (
+        file_id TEXT PRIMARY KEY, embedding BLOB, cluster_id TEXT,
+        keywords TEXT, summary TEXT, updated_at REAL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE CLUSTERS (
+        cluster_id TEXT PRIMARY KEY, label TEXT, centroid BLOB, created_at REAL
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO SEMANTICS (file_id, embedding) VALUES (?, ?)",
+        [(file_id, pickle.dumps(vector)) for file_id, vector in embeddings.items()]
+    )
+    conn.executemany(
+        "INSERT INTO CLUSTERS (cluster_id, label, centroid) VALUES (?, ?, ?)",
+        [
+            (cluster_id, cluster_id, None if vector is None else pickle.dumps(vector))
+            for cluster_id, vector in centroids.items()
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def read_vectors(path, table, key, column):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f"SELECT {key}, {column}, dim, dtype FROM {table}").fetchall()
+    conn.close()
+    return {row_key: (decode_vector(blob, dim, dtype), dtype) for row_key, blob, dim, dtype in rows}
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    rng = np.random.default_rng(5)
+    embeddings = {f"f{i}": rng.normal(size=24).astype(np.float32) for i in range(7)}
+    embeddings["f-float64"] = rng.normal(size=24)
+    embeddings["f-none"] = None
+    centroids = {"c1": rng.normal(size=24).astype(np.float32), "c-empty": None}
+
+    path = str(tmp_path / "legacy.db")
+    create_legacy_database(path, embeddings, centroids)
+    return path, embeddings, centroids
+
+
+def test_migration_round_trip(legacy):
+    path, embeddings, centroids = legacy
+
+    # Every pickled BLOB is converted; NULL centroids are not vectors
+    assert migrate_database(path, batch_size=3) == len(embeddings) + 1
+
+    migrated = read_vectors(path, "SEMANTICS", "file_id", "embedding")
+    for file_id, vector in embeddings.items():
+        stored, dtype = migrated[file_id]
+        if vector is None:
+            assert stored is None and dtype is None
+        else:
+            assert dtype == "float32"
+            assert np.array_equal(stored, np.asarray(vector, dtype=np.float32))
+
+    clusters = read_vectors(path, "CLUSTERS", "cluster_id", "centroid")
+    assert np.array_equal(clusters["c1"][0], centroids["c1"])
+    assert clusters["c-empty"] == (None, None)
+
+    conn = sqlite3.connect(path)
+    assert count_legacy_vectors(conn) == 0
+    conn.close()
+
+
+def test_migration_is_idempotent(legacy):
+    path, _, _ = legacy
+    migrate_database(path)
+    before = read_vectors(path, "SEMANTICS", "file_id", "embedding")
+
+    assert migrate_database(path) == 0
+
+    after = read_vectors(path, "SEMANTICS", "file_id", "embedding")
+    for file_id, (vector, dtype) in before.items():
+        assert after[file_id][1] == dtype
+        assert (vector is None and after[file_id][0] is None) or np.array_equal(after[file_id][0], vector)
+
+
+def test_migration_to_float16(legacy):
+    path, embeddings, _ = legacy
+    migrate_database(path, dtype="float16")
+
+    migrated = read_vectors(path, "SEMANTICS", "file_id", "embedding")
+    stored, dtype = migrated["f0"]
+    assert dtype == "float16"
+    assert np.allclose(stored, embeddings["f0"], atol=1e-2)
+
+
+def test_encoding_is_little_endian_and_checked():
+    blob, dim, dtype = encode_vector(np.arange(4, dtype=">f4"))
+    assert blob == np.arange(4, dtype="<f4").tobytes()
+    assert np.array_equal(decode_vector(blob, dim, dtype), np.arange(4))
+
+    with pytest.raises(ValueError):
+        decode_vector(blob, 5, dtype)
+    with pytest.raises(ValueError):
+        encode_vector(np.zeros(4), "int8")
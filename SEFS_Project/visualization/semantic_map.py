@@ -3,7 +3,7 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel
-from core.db_api import get_all_embeddings, get_file_path_by_id
+from core.db_api import get_file_paths
 from engine.semantic_engine import build_semantic_space
 
 class SemanticMapWindow(QMainWindow):
@@ -34,11 +34,12 @@ class SemanticMapWindow(QMainWindow):
 
         # Build semantic graph
         adjacency = build_semantic_space(threshold=self.threshold)
+        paths = get_file_paths(adjacency.file_ids)
         G = nx.Graph()
 
         # Add nodes and edges
         for file_id, neighbors in adjacency.items():
-            file_path = get_file_path_by_id(file_id)
+            file_path = paths.get(file_id)
             G.add_node(file_id, label=file_path)
             for neighbor_id, sim in neighbors:
                 G.add_edge(file_id, neighbor_id, weight=sim)